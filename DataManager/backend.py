@@ -0,0 +1,71 @@
+import importlib
+import sys
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from DataManager.project_manager import ProjectManager
+    from Prompter.prompter import Prompter
+
+# Modules of the transcription and question answering backend, imported on first use.
+BACKEND_MODULES = ('DataManager.project_manager', 'Prompter.prompter')
+
+# Third-party packages that take most of the import time. Nothing on the way to the main window may import them.
+HEAVY_PACKAGES = ('langchain', 'langchain_core', 'langchain_community', 'langchain_openai', 'langchain_text_splitters',
+                  'faster_whisper', 'ctranslate2', 'faiss', 'yt_dlp', 'av', 'librosa', 'openai', 'tiktoken')
+
+_preload_thread = None
+
+
+def open_project(app_path: str, project_name: str) -> 'ProjectManager':
+    """Loads a project, importing the backend first if nothing did yet.
+
+    Args:
+        app_path (str): The app path.
+        project_name (str): The project name, sanitized.
+    """
+
+    from DataManager.project_manager import ProjectManager
+    return ProjectManager(app_path, project_name)
+
+
+def open_prompter(pm: 'ProjectManager', **kwargs) -> 'Prompter':
+    """Creates the `Prompter` of a project, with the answer cache options of the app configuration.
+
+    Args:
+        pm (ProjectManager): The project.
+        **kwargs: More arguments for `Prompter`, like `mode`.
+    """
+
+    from Prompter.answer_cache import get_default_answer_cache
+    from Prompter.prompter import Prompter
+    return Prompter(pm.db_path, pm.project_name, answer_cache=get_default_answer_cache(pm.app_data.get('answer_cache')), **kwargs)
+
+
+def preload() -> threading.Thread:
+    """Imports the backend in a daemon thread, so it's usually loaded by the time a project is opened.
+    Opening one earlier just waits for the imports to finish.
+
+    Returns:
+        threading.Thread: The importing thread, shared by every call.
+    """
+
+    global _preload_thread
+    if _preload_thread is None:
+        def run() -> None:
+            for module in BACKEND_MODULES:
+                try:
+                    importlib.import_module(module)
+                except ImportError as e:
+                    # Reported again, where it matters, when the module is used.
+                    print(f"Couldn't preload {module}: {e}")
+
+        _preload_thread = threading.Thread(target=run, name='backend-preload', daemon=True)
+        _preload_thread.start()
+    return _preload_thread
+
+
+def loaded_heavy_packages() -> list[str]:
+    """Returns the heavy packages imported so far in this process."""
+
+    return [name for name in HEAVY_PACKAGES if name in sys.modules]
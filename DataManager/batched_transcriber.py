@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+import zlib
+import numpy as np
+from faster_whisper.tokenizer import Tokenizer
+from DataManager.instrumentation import metrics
+from DataManager.preprocessing import SAMPLE_RATE, compact_silences, load_mono_16k
+
+# Whisper always encodes 30s windows.
+WINDOW_SECONDS = 30
+
+# Same fallback as `WhisperModel.transcribe`: a window whose text fails the checks is decoded again, hotter.
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+
+def compression_ratio(text: str) -> float:
+    """Returns how much a text shrinks with zlib. Repetition loops make it high."""
+
+    data = text.encode('utf-8')
+    return len(data) / len(zlib.compress(data)) if data else 0.0
+
+
+class BatchedTranscriber():
+    """Transcribes many short clips by packing their 30s windows, from several files, into the same encoder/decoder batch.
+
+    A `transcribe` call per clip pays the encoder and decoder setup for a single window. Here each batch holds up to
+    `batch_size` windows, the language is detected once per file on its first window (or never, when `language` is
+    fixed), and the decoded texts are put back together per file.
+
+    Each window goes through the same checks as in `WhisperModel.transcribe`: windows that are probably silence are
+    dropped, and windows whose text looks like a repetition loop or has a low log probability are decoded again at
+    the next temperature, together with the other windows of the batch that failed.
+    """
+
+    def __init__(self, model, batch_size: int = 8, beam_size: int = 5, language: str | None = None, preprocess: bool = False,
+                 temperatures: tuple[float, ...] = TEMPERATURES, best_of: int = 5, compression_ratio_threshold: float | None = 2.4,
+                 log_prob_threshold: float | None = -1.0, no_speech_threshold: float | None = 0.6):
+        """
+        Args:
+            model (WhisperModel): The model.
+            batch_size (int): Number of windows encoded and decoded together.
+            beam_size (int): Beam size of the decoder, at temperature 0.
+            language (str | None): Language of every clip. If None, it's detected per file.
+            preprocess (bool): If True, silences are compacted before the windows are cut.
+            temperatures (tuple[float, ...]): Temperatures tried in turn while a window fails the checks.
+            best_of (int): Number of candidates sampled at temperatures above 0.
+            compression_ratio_threshold (float | None): A text that compresses more than this is decoded again.
+            log_prob_threshold (float | None): A text with a lower average log probability is decoded again.
+            no_speech_threshold (float | None): A window with a higher no-speech probability, and a text under
+                `log_prob_threshold`, is taken as silence and left out.
+        """
+
+        self.model = model
+        self.batch_size = batch_size
+        self.beam_size = beam_size
+        self.temperatures = temperatures
+        self.best_of = best_of
+        self.compression_ratio_threshold = compression_ratio_threshold
+        self.log_prob_threshold = log_prob_threshold
+        self.no_speech_threshold = no_speech_threshold
+        self.language = language if model.model.is_multilingual else 'en'
+        self.preprocess = preprocess
+        # (path, error) of the files the last `transcribe_files` couldn't decode.
+        self.last_failed: list[tuple[str, str]] = []
+        self._tokenizers = {}
+
+    def _tokenizer(self, language: str) -> Tokenizer:
+        if language not in self._tokenizers:
+            self._tokenizers[language] = Tokenizer(self.model.hf_tokenizer, self.model.model.is_multilingual, task='transcribe', language=language)
+        return self._tokenizers[language]
+
+    def _features(self, window: np.ndarray) -> np.ndarray:
+        features = self.model.feature_extractor(window)
+        frames = self.model.feature_extractor.nb_max_frames
+        if features.shape[-1] < frames:
+            features = np.pad(features, ((0, 0), (0, frames - features.shape[-1])))
+        return features[:, :frames]
+
+    def _generate(self, encoder_output, prompts: list[list[int]], temperature: float) -> list[tuple[list[int], float, float]]:
+        """Decodes a batch at one temperature.
+
+        Returns:
+            list[tuple[list[int], float, float]]: The tokens, average log probability and no-speech probability of each window.
+        """
+
+        if temperature > 0:
+            options = {'beam_size': 1, 'num_hypotheses': self.best_of, 'sampling_topk': 0, 'sampling_temperature': temperature}
+        else:
+            options = {'beam_size': self.beam_size}
+        generated = self.model.model.generate(encoder_output, prompts, max_length=448, return_scores=True, return_no_speech_prob=True,
+                                              suppress_blank=True, suppress_tokens=[-1], without_timestamps=True, **options)
+        decoded = []
+        for result in generated:
+            tokens = result.sequences_ids[0]
+            # Scores are normalized by length, as `WhisperModel` does with its default length penalty of 1.
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+            decoded.append((tokens, avg_logprob, result.no_speech_prob))
+        return decoded
+
+    def _needs_fallback(self, text: str, avg_logprob: float, no_speech_prob: float) -> bool:
+        if self._is_silence(avg_logprob, no_speech_prob):
+            return False
+        if self.compression_ratio_threshold is not None and compression_ratio(text) > self.compression_ratio_threshold:
+            return True
+        return self.log_prob_threshold is not None and avg_logprob < self.log_prob_threshold
+
+    def _is_silence(self, avg_logprob: float, no_speech_prob: float) -> bool:
+        return (self.no_speech_threshold is not None and no_speech_prob > self.no_speech_threshold
+                and (self.log_prob_threshold is None or avg_logprob < self.log_prob_threshold))
+
+    def _decode_batch(self, features: np.ndarray, prompts: list[list[int]], tokenizers: list[Tokenizer], encoder_output) -> list[str]:
+        """Decodes a batch, trying the next temperature for the windows that fail the checks, like `WhisperModel.transcribe`.
+
+        Returns:
+            list[str]: The text of each window. Empty for the windows taken as silence.
+        """
+
+        best = [None] * len(prompts)
+        failing = list(range(len(prompts)))
+        for attempt, temperature in enumerate(self.temperatures):
+            if attempt > 0:
+                # Only the failed windows are decoded again, in a smaller batch.
+                encoder_output = self.model.encode(features[failing])
+                metrics.count('batch_fallbacks', len(failing))
+            decoded = self._generate(encoder_output, [prompts[i] for i in failing], temperature)
+
+            still_failing = []
+            for i, (tokens, avg_logprob, no_speech_prob) in zip(failing, decoded):
+                text = tokenizers[i].decode(tokens)
+                needs_fallback = self._needs_fallback(text, avg_logprob, no_speech_prob)
+                candidate = (not needs_fallback, avg_logprob, text, no_speech_prob)
+                # When every temperature fails, the attempt with the best log probability is kept.
+                if best[i] is None or candidate[:2] > best[i][:2]:
+                    best[i] = candidate
+                if needs_fallback:
+                    still_failing.append(i)
+            failing = still_failing
+            if not failing:
+                break
+
+        return ['' if self._is_silence(avg_logprob, no_speech_prob) else text for _, avg_logprob, text, no_speech_prob in best]
+
+    def transcribe_files(self, paths: list[str], cancel: threading.Event | None = None) -> dict[str, dict]:
+        """Transcribes the files in batches.
+
+        Args:
+            paths (list[str]): Paths of the audio files. Meant for clips of a few seconds up to a couple of minutes.
+            cancel (threading.Event | None): When set, no new batch is started, and only the files whose windows
+                were all transcribed are returned.
+
+        Returns:
+            dict[str, dict]: For each path, its `text`, `language`, `duration` and share of the `processing_time`.
+                Files that can't be decoded are left out, and listed in `last_failed` with their error.
+        """
+
+        start = time.perf_counter()
+        window_samples = WINDOW_SECONDS * SAMPLE_RATE
+        windows = []
+        results = {}
+        self.last_failed = []
+        for path in paths:
+            try:
+                audio = load_mono_16k(path)
+            except Exception as e:
+                print(f"Error decoding {os.path.basename(path)}: {e}")
+                self.last_failed.append((path, str(e)))
+                continue
+            duration = len(audio) / SAMPLE_RATE
+            if self.preprocess:
+                audio, _ = compact_silences(audio)
+
+            results[path] = {'texts': [], 'language': self.language, 'duration': duration, 'windows': 0}
+            for i, offset in enumerate(range(0, len(audio), window_samples)):
+                windows.append((path, i, audio[offset:offset + window_samples]))
+                results[path]['windows'] += 1
+
+        with metrics.span('transcribe', files=[os.path.basename(path) for path in paths], batch_size=self.batch_size):
+            for batch_start in range(0, len(windows), self.batch_size):
+                if cancel is not None and cancel.is_set():
+                    break
+                batch = windows[batch_start:batch_start + self.batch_size]
+                features = np.stack([self._features(window) for _, _, window in batch])
+                encoder_output = self.model.encode(features)
+
+                # Files have their language detected on their first window, which always comes before the others.
+                if any(results[path]['language'] is None and i == 0 for path, i, _ in batch):
+                    detected = self.model.model.detect_language(encoder_output)
+                    for (path, i, _), probabilities in zip(batch, detected):
+                        if i == 0 and results[path]['language'] is None:
+                            results[path]['language'] = probabilities[0][0][2:-2]
+
+                tokenizers = [self._tokenizer(results[path]['language']) for path, _, _ in batch]
+                prompts = [list(tokenizer.sot_sequence) + [tokenizer.no_timestamps] for tokenizer in tokenizers]
+                for (path, _, _), text in zip(batch, self._decode_batch(features, prompts, tokenizers, encoder_output)):
+                    results[path]['texts'].append(text)
+
+        results = {path: result for path, result in results.items() if len(result['texts']) == result['windows']}
+        elapsed = time.perf_counter() - start
+        total_duration = sum(result['duration'] for result in results.values()) or 1.0
+        metrics.count('audio_seconds', sum(result['duration'] for result in results.values()))
+        return {
+            path: {
+                'text': ''.join(f" {text.strip()}" for text in result['texts'] if text.strip()),
+                'language': result['language'],
+                'duration': result['duration'],
+                'processing_time': elapsed * result['duration'] / total_duration,
+            }
+            for path, result in results.items()
+        }
@@ -0,0 +1,201 @@
+"""Finds the fastest compute_type and cpu_threads for each model on this machine and saves them in app_config.json.
+
+Each combination is timed on a single transcription of real speech: the `--audio` file, or else the start of a
+recording from the projects. The threads found are the ones each transcription gets, also when several run at once.
+
+Usage:
+    python -m DataManager.calibration --models tiny base medium
+    python -m DataManager.calibration --models small --compute-types int8 float32 --threads 4 8 16
+    python -m DataManager.calibration --audio interview.m4a --seconds 60
+"""
+
+import argparse
+import fnmatch
+import multiprocessing
+import os
+import platform
+import queue
+import time
+from datetime import datetime
+import numpy as np
+from DataManager.media import AUDIO_EXTENSIONS, decode_to_pcm
+from DataManager.storage_manager import StorageManager
+
+SAMPLE_RATE = 16000
+
+
+def synthetic_speech(seconds: float, seed: int = 0) -> np.ndarray:
+    """Generates speech-like audio: bursts of filtered noise with pauses, at 16 kHz. Good enough to time the encoder,
+    but whisper mostly decodes no text from it, so it's only used to calibrate when there's no real speech."""
+
+    rng = np.random.default_rng(seed)
+    samples = int(seconds * SAMPLE_RATE)
+    noise = rng.standard_normal(samples)
+    envelope = (np.sin(np.linspace(0, seconds * 2 * np.pi * 1.5, samples)) > -0.3).astype(float)
+    audio = np.convolve(noise * envelope, np.ones(8) / 8, mode='same') * 0.2
+    return np.clip(audio, -1, 1).astype(np.float32)
+
+
+def load_speech_clip(sm: StorageManager, seconds: float, path: str | None = None) -> tuple[np.ndarray, str] | None:
+    """Loads the first `seconds` of a recording, to time the model on real speech.
+
+    Args:
+        sm (StorageManager): The app storage, whose projects are searched when no `path` is given.
+        seconds (float): Length of the clip.
+        path (str | None): The recording. Defaults to the first one of the projects that is long enough.
+
+    Returns:
+        tuple[np.ndarray, str] | None: The 16 kHz samples and the path they came from. None if there's no recording.
+    """
+
+    if path is not None:
+        return decode_to_pcm(path, max_seconds=seconds), path
+
+    for project in sm.get_projects():
+        audio_path = os.path.join(sm.projects_path, project, 'audios')
+        if not os.path.isdir(audio_path):
+            continue
+        for filename in sorted(os.listdir(audio_path)):
+            if not any(fnmatch.fnmatch(filename, extension) for extension in AUDIO_EXTENSIONS):
+                continue
+            try:
+                audio = decode_to_pcm(os.path.join(audio_path, filename), max_seconds=seconds)
+            except Exception as e:
+                print(f"Skipping {filename}: {e}")
+                continue
+            # Shorter clips are mostly the model setup, like the warm-up call.
+            if len(audio) >= min(seconds, 10) * SAMPLE_RATE:
+                return audio, os.path.join(audio_path, filename)
+    return None
+
+
+def peak_rss_mb() -> float | None:
+    """Returns the peak resident memory of the current process, in megabytes, if the platform tells it."""
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak / (1024 * 1024) if platform.system() == 'Darwin' else peak / 1024
+
+
+def _measure(model: str, compute_type: str, cpu_threads: int, models_path: str, audio: np.ndarray, results: multiprocessing.Queue) -> None:
+    try:
+        from faster_whisper import WhisperModel
+
+        start = time.perf_counter()
+        whisper = WhisperModel(model_size_or_path=model, compute_type=compute_type, cpu_threads=cpu_threads, download_root=models_path)
+        load_time = time.perf_counter() - start
+
+        # The first call warms up the caches and detects the language, the second one is measured.
+        segments, info = whisper.transcribe(audio[:5 * SAMPLE_RATE])
+        list(segments)
+
+        start = time.perf_counter()
+        segments, _ = whisper.transcribe(audio, language=info.language, beam_size=5)
+        list(segments)
+        elapsed = time.perf_counter() - start
+
+        results.put({'load_time': load_time, 'rtf': elapsed / (len(audio) / SAMPLE_RATE), 'peak_rss_mb': peak_rss_mb()})
+    except Exception as e:
+        results.put({'error': str(e)})
+
+
+def measure(model: str, compute_type: str, cpu_threads: int, models_path: str, audio: np.ndarray) -> dict:
+    """Times one combination in a fresh process, so its peak memory isn't mixed with the other runs.
+
+    Returns:
+        dict: The `rtf` (processing time divided by audio time), `load_time` and `peak_rss_mb`, or an `error`,
+            also when the process dies without a result, like when it runs out of memory.
+    """
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(model, compute_type, cpu_threads, models_path, audio, results))
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=1.0)
+            break
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        # It may have put its result right before exiting.
+        try:
+            result = results.get(timeout=1.0)
+        except queue.Empty:
+            reason = f"killed by signal {-process.exitcode}" if process.exitcode < 0 else f"exit code {process.exitcode}"
+            result = {'error': f"the measuring process died ({reason})"}
+        break
+    process.join()
+    return {'model': model, 'compute_type': compute_type, 'cpu_threads': cpu_threads, **result}
+
+
+def calibrate(models: list[str], compute_types: list[str], thread_counts: list[int], models_path: str, seconds: float = 30.0,
+              audio: np.ndarray | None = None) -> dict[str, dict]:
+    """Measures every combination and picks the one with the lowest real-time factor for each model.
+
+    Args:
+        audio (np.ndarray | None): 16 kHz speech the model is timed on. Defaults to `synthetic_speech` of `seconds`,
+            which doesn't rank the compute types like real decoding does.
+
+    Returns:
+        dict[str, dict]: The best setting of each model, with its measurements.
+    """
+
+    if audio is None:
+        audio = synthetic_speech(seconds)
+    best = {}
+    for model in models:
+        for compute_type in compute_types:
+            for cpu_threads in thread_counts:
+                result = measure(model, compute_type, cpu_threads, models_path, audio)
+                if 'error' in result:
+                    print(f"{model} {compute_type} x{cpu_threads}: not supported ({result['error']})")
+                    continue
+
+                print(f"{model} {compute_type} x{cpu_threads}: RTF {result['rtf']:.3f}, peak {result['peak_rss_mb'] or 0:.0f} MB")
+                if model not in best or result['rtf'] < best[model]['rtf']:
+                    best[model] = result
+    return best
+
+
+def main() -> None:
+    cpu_count = os.cpu_count() or 4
+    sm = StorageManager()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', nargs='+', default=[sm.app_data['user_config']['model']])
+    parser.add_argument('--compute-types', nargs='+', default=[ct for ct in sm.app_data['compute_types'] if ct in ('default', 'int8', 'int8_float32', 'int16', 'float32')])
+    parser.add_argument('--threads', nargs='+', type=int, default=sorted({max(1, cpu_count // 4), max(1, cpu_count // 2), cpu_count}))
+    parser.add_argument('--seconds', type=float, default=30.0, help='Length of the clip the model is timed on.')
+    parser.add_argument('--audio', help='Recording to time the model on. Defaults to one from the projects.')
+    args = parser.parse_args()
+
+    clip = load_speech_clip(sm, args.seconds, args.audio)
+    if clip is None:
+        print('No recording found in the projects, calibrating on synthetic audio. Pass --audio for results closer to real transcriptions.')
+        audio = None
+    else:
+        audio, path = clip
+        print(f"Calibrating on {len(audio) / SAMPLE_RATE:.0f}s of {path}")
+
+    best = calibrate(args.models, args.compute_types, args.threads, sm.models_path, args.seconds, audio)
+    for model, result in best.items():
+        # The threads of one transcription, which is what each worker gets (see `DataManager.settings.get_model_settings`).
+        setting = {
+            'compute_type': result['compute_type'],
+            'cpu_threads': result['cpu_threads'],
+            'rtf': result['rtf'],
+            'peak_rss_mb': result['peak_rss_mb'],
+            'calibrated_at': datetime.now().strftime("%Y-%m-%d"),
+        }
+        sm.update_app_settings(['tuned', model], setting)
+        print(f"Best for {model}: {setting['compute_type']} with {setting['cpu_threads']} threads per transcription (RTF {setting['rtf']:.3f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# Project fields kept in the catalog, as in `project_settings.json`.
+PROJECT_FIELDS = ('name', 'description', 'transformer', 'llm', 'database', 'path', 'created_at')
+
+# File fields that can be set with `record_file`.
+FILE_FIELDS = ('source_url', 'media_id', 'duration', 'language', 'model', 'compute_type', 'processing_seconds',
+               'audio_hash', 'transcript', 'transcript_hash', 'status')
+
+
+class Catalog():
+    """Index of every project and media file, in `~/.HandySpeechBot/catalog.sqlite`.
+
+    The project folders and their `project_settings.json` stay the source of the settings, but listing, filtering
+    and showing projects is done here, with indexed queries, instead of scanning folders and parsing JSON. Each file
+    row has what the pipeline knows about it (source, duration, language, model, processing time and hashes), and
+    triggers keep the `file_count` and `total_seconds` of its project up to date in the same transaction.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Path of the SQLite file.
+        """
+
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA foreign_keys=ON')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS projects (
+                name TEXT PRIMARY KEY,
+                description TEXT NOT NULL DEFAULT '',
+                transformer TEXT NOT NULL DEFAULT '',
+                llm TEXT NOT NULL DEFAULT '',
+                database TEXT NOT NULL DEFAULT '',
+                path TEXT NOT NULL DEFAULT '',
+                created_at TEXT NOT NULL DEFAULT '',
+                file_count INTEGER NOT NULL DEFAULT 0,
+                total_seconds REAL NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL DEFAULT 0);
+            CREATE INDEX IF NOT EXISTS projects_name_nocase ON projects (name COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS projects_updated_at ON projects (updated_at);
+
+            CREATE TABLE IF NOT EXISTS files (
+                project TEXT NOT NULL REFERENCES projects (name) ON DELETE CASCADE,
+                filename TEXT NOT NULL,
+                source_url TEXT NOT NULL DEFAULT '',
+                media_id TEXT NOT NULL DEFAULT '',
+                duration REAL,
+                language TEXT NOT NULL DEFAULT '',
+                model TEXT NOT NULL DEFAULT '',
+                compute_type TEXT NOT NULL DEFAULT '',
+                processing_seconds REAL,
+                audio_hash TEXT NOT NULL DEFAULT '',
+                transcript TEXT NOT NULL DEFAULT '',
+                transcript_hash TEXT NOT NULL DEFAULT '',
+                status TEXT NOT NULL DEFAULT 'added',
+                added_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (project, filename));
+            CREATE INDEX IF NOT EXISTS files_project_name_nocase ON files (project, filename COLLATE NOCASE);
+
+            CREATE TRIGGER IF NOT EXISTS files_insert AFTER INSERT ON files BEGIN
+                UPDATE projects SET file_count = file_count + 1, total_seconds = total_seconds + COALESCE(NEW.duration, 0), updated_at = NEW.updated_at
+                WHERE name = NEW.project;
+            END;
+            CREATE TRIGGER IF NOT EXISTS files_delete AFTER DELETE ON files BEGIN
+                UPDATE projects SET file_count = file_count - 1, total_seconds = total_seconds - COALESCE(OLD.duration, 0)
+                WHERE name = OLD.project;
+            END;
+            CREATE TRIGGER IF NOT EXISTS files_update AFTER UPDATE OF duration ON files BEGIN
+                UPDATE projects SET total_seconds = total_seconds - COALESCE(OLD.duration, 0) + COALESCE(NEW.duration, 0), updated_at = NEW.updated_at
+                WHERE name = NEW.project;
+            END;
+        """)
+        self._conn.commit()
+
+    @contextmanager
+    def transaction(self) -> Iterator['Catalog']:
+        """Groups several changes in one transaction, committed at the end, or rolled back if anything failed.
+        Transactions can be nested: only the outermost one commits.
+        """
+
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._conn.rollback()
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._conn.commit()
+
+    def sync(self, projects_path: str) -> dict:
+        """Adds the project folders missing from the catalog, reading their `project_settings.json` and the files
+        of their `manifest.json`, and removes the projects whose folder is gone. Only needed for folders made or
+        removed outside the app, or made before the catalog.
+
+        Returns:
+            dict: Number of projects `added` and `removed`.
+        """
+
+        folders = {item for item in os.listdir(projects_path) if os.path.isdir(os.path.join(projects_path, item))}
+        with self.transaction():
+            known = {row['name'] for row in self._conn.execute('SELECT name FROM projects')}
+            added = 0
+            for name in folders - known:
+                settings_path = os.path.join(projects_path, name, 'project_settings.json')
+                settings = {}
+                if os.path.isfile(settings_path):
+                    with open(settings_path, 'r', encoding='utf-8') as f:
+                        settings = json.load(f)
+                self.add_project({**settings, 'name': name, 'path': os.path.join(projects_path, name)})
+                manifest_path = os.path.join(projects_path, name, 'manifest.json')
+                if os.path.isfile(manifest_path):
+                    with open(manifest_path, 'r', encoding='utf-8') as f:
+                        self.backfill_files(name, json.load(f))
+                added += 1
+            for name in known - folders:
+                self.remove_project(name)
+        return {'added': added, 'removed': len(known - folders)}
+
+    def add_project(self, settings: dict) -> None:
+        """Adds a project, or updates it if it's already in the catalog.
+
+        Args:
+            settings (dict): The project settings, as in `project_settings.json`. Only `PROJECT_FIELDS` are kept.
+        """
+
+        values = [str(settings.get(field) or '') for field in PROJECT_FIELDS]
+        with self.transaction():
+            self._conn.execute(f"INSERT INTO projects ({', '.join(PROJECT_FIELDS)}, updated_at) VALUES ({', '.join('?' * len(PROJECT_FIELDS))}, ?) "
+                               f"ON CONFLICT (name) DO UPDATE SET {', '.join(f'{field} = excluded.{field}' for field in PROJECT_FIELDS[1:])}, updated_at = excluded.updated_at",
+                               (*values, time.time()))
+
+    def remove_project(self, name: str) -> None:
+        """Removes a project and its files."""
+
+        with self.transaction():
+            self._conn.execute('DELETE FROM projects WHERE name = ?', (name,))
+
+    def project_exists(self, name: str) -> bool:
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM projects WHERE name = ?', (name,)).fetchone() is not None
+
+    def get_project(self, name: str) -> dict | None:
+        """Returns the catalog row of a project, with its `file_count` and `total_seconds`, or None if it's unknown."""
+
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM projects WHERE name = ?', (name,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list_projects(self, search: str = '', offset: int = 0, limit: int = -1) -> list[dict]:
+        """Returns the projects sorted by name, case-insensitively.
+
+        Args:
+            search (str): Only the projects with this text in their name or description.
+            offset (int): Number of projects skipped, for paging.
+            limit (int): Maximum number of projects. -1 for all of them.
+        """
+
+        where, params = self._search_clause(search, ('name', 'description'))
+        with self._lock:
+            rows = self._conn.execute(f'SELECT * FROM projects {where} ORDER BY name COLLATE NOCASE LIMIT ? OFFSET ?', (*params, limit, offset)).fetchall()
+        return [dict(row) for row in rows]
+
+    def recent_projects(self, limit: int = 10) -> list[str]:
+        """Returns the names of the projects that changed last, newest first."""
+
+        with self._lock:
+            return [row['name'] for row in self._conn.execute('SELECT name FROM projects ORDER BY updated_at DESC LIMIT ?', (limit,))]
+
+    def count_projects(self, search: str = '') -> int:
+        where, params = self._search_clause(search, ('name', 'description'))
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM projects {where}', params).fetchone()[0]
+
+    def record_file(self, project: str, filename: str, **fields) -> None:
+        """Adds a file to a project, or updates the fields given if it's already there.
+
+        Args:
+            project (str): The project name, sanitized.
+            filename (str): Name of the file in the project `audios` folder, or `<title>.stream` for streamed media.
+            **fields: Any of `FILE_FIELDS`.
+        """
+
+        unknown = set(fields) - set(FILE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown file fields: {', '.join(sorted(unknown))}")
+
+        now = time.time()
+        names = list(fields)
+        updates = ', '.join(f'{name} = excluded.{name}' for name in (*names, 'updated_at'))
+        with self.transaction():
+            self._conn.execute(f"INSERT INTO files (project, filename, {''.join(f'{name}, ' for name in names)}added_at, updated_at) "
+                               f"VALUES (?, ?, {''.join('?, ' for _ in names)}?, ?) ON CONFLICT (project, filename) DO UPDATE SET {updates}",
+                               (project, filename, *fields.values(), now, now))
+
+    def backfill_files(self, project: str, manifest_entries: dict) -> int:
+        """Fills in the files of a project from the entries of its manifest. Files transcribed before the catalog
+        existed have no row, or only the bare one of a file found in `audios`. Their duration and language are
+        unknown until they are transcribed again.
+
+        Args:
+            project (str): The project name, sanitized.
+            manifest_entries (dict): The `Manifest.entries` of the project.
+
+        Returns:
+            int: The number of files filled in.
+        """
+
+        with self.transaction():
+            statuses = {row['filename']: row['status'] for row in self._conn.execute('SELECT filename, status FROM files WHERE project = ?', (project,))}
+            filled = [filename for filename in manifest_entries if statuses.get(filename, 'added') == 'added']
+            for filename in filled:
+                entry = manifest_entries[filename]
+                self.record_file(project, filename, source_url=entry.get('url', ''), media_id=entry.get('media_id', ''), audio_hash=entry.get('hash', ''),
+                                 model=entry.get('model', ''), compute_type=entry.get('compute_type', ''), transcript=entry.get('transcript', ''),
+                                 transcript_hash=entry.get('transcript_hash', ''), status='transcribed')
+        return len(filled)
+
+    def remove_files(self, project: str, filenames: list[str]) -> None:
+        with self.transaction():
+            self._conn.executemany('DELETE FROM files WHERE project = ? AND filename = ?', [(project, filename) for filename in filenames])
+
+    def prune_files(self, project: str, existing_filenames: list[str]) -> int:
+        """Removes the files of a project that are not in `existing_filenames`.
+
+        Returns:
+            int: The number of files removed.
+        """
+
+        existing = set(existing_filenames)
+        with self.transaction():
+            removed = [row['filename'] for row in self._conn.execute('SELECT filename FROM files WHERE project = ?', (project,)) if row['filename'] not in existing]
+            self.remove_files(project, removed)
+        return len(removed)
+
+    def get_file(self, project: str, filename: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM files WHERE project = ? AND filename = ?', (project, filename)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list_files(self, project: str, search: str = '', offset: int = 0, limit: int = -1) -> list[dict]:
+        """Returns the files of a project sorted by name, case-insensitively.
+
+        Args:
+            project (str): The project name, sanitized.
+            search (str): Only the files with this text in their name or source URL.
+            offset (int): Number of files skipped, for paging.
+            limit (int): Maximum number of files. -1 for all of them.
+        """
+
+        where, params = self._search_clause(search, ('filename', 'source_url'))
+        where = f"WHERE project = ? {where.replace('WHERE', 'AND', 1)}"
+        with self._lock:
+            rows = self._conn.execute(f'SELECT * FROM files {where} ORDER BY filename COLLATE NOCASE LIMIT ? OFFSET ?', (project, *params, limit, offset)).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_files(self, project: str, search: str = '') -> int:
+        if not search:
+            # Kept by the triggers, so no need to count the rows.
+            project_row = self.get_project(project)
+            return project_row['file_count'] if project_row else 0
+
+        where, params = self._search_clause(search, ('filename', 'source_url'))
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM files WHERE project = ? {where.replace('WHERE', 'AND', 1)}", (project, *params)).fetchone()[0]
+
+    def _search_clause(self, search: str, columns: tuple[str, ...]) -> tuple[str, tuple]:
+        if not search:
+            return '', ()
+        pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        return 'WHERE (' + ' OR '.join(f"{column} LIKE ? ESCAPE '\\'" for column in columns) + ')', (pattern,) * len(columns)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+_catalogs: dict[str, Catalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(app_path: str) -> Catalog:
+    """Returns the catalog of an app folder, shared by everything in the process that uses it."""
+
+    with _catalogs_lock:
+        if app_path not in _catalogs:
+            _catalogs[app_path] = Catalog(os.path.join(app_path, 'catalog.sqlite'))
+        return _catalogs[app_path]
@@ -0,0 +1,192 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+import yt_dlp as yt
+
+
+@dataclass
+class DownloadProgress:
+    """State of one download job, as given to the progress callback."""
+
+    job_id: str
+    url: str
+    title: str = ''
+    status: str = 'queued'  # queued, downloading, finished, skipped or error
+    downloaded_bytes: int = 0
+    total_bytes: int | None = None
+    speed: float | None = None
+    eta: int | None = None
+    filename: str = ''
+    error: str = ''
+
+    @property
+    def fraction(self) -> float | None:
+        if not self.total_bytes:
+            return None
+        return self.downloaded_bytes / self.total_bytes
+
+
+def remove_from_archive(archive_path: str, media_ids: list[str]) -> int:
+    """Removes media from a yt_dlp download archive, so they can be downloaded again.
+
+    Args:
+        archive_path (str): The archive, with one `<extractor> <id>` line per downloaded media.
+        media_ids (list[str]): The extractor IDs to remove.
+
+    Returns:
+        int: The number of lines removed.
+    """
+
+    if not os.path.isfile(archive_path):
+        return 0
+
+    ids = set(media_ids)
+    with open(archive_path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    kept = [line for line in lines if not line.strip() or line.split()[-1] not in ids]
+    if len(kept) != len(lines):
+        tmp_path = f"{archive_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(kept)
+        os.replace(tmp_path, archive_path)
+    return len(lines) - len(kept)
+
+
+class DownloadManager():
+    """Downloads online media with a bounded number of concurrent jobs.
+
+    Playlists and channels are expanded into one job per video without fetching any media. Videos whose extractor ID
+    is already in the project are skipped before a single byte is downloaded, and interrupted downloads resume from
+    their `.part` file.
+    """
+
+    def __init__(self, ydl_opts: dict, archive_path: str, max_concurrent: int = 4,
+                 is_known: Callable[[str], bool] | None = None, on_progress: Callable[[DownloadProgress], None] | None = None):
+        """
+        Args:
+            ydl_opts (dict): Base yt_dlp options, like the output template and format.
+            archive_path (str): yt_dlp download archive, where the IDs of finished downloads are recorded.
+            max_concurrent (int): Maximum number of downloads at the same time.
+            is_known (Callable[[str], bool] | None): Tells if a media ID is already in the project some other way.
+            on_progress (Callable[[DownloadProgress], None] | None): Called from the download threads on every update.
+        """
+
+        self.ydl_opts = dict(ydl_opts)
+        self.ydl_opts.update({
+            'noplaylist': True,
+            'quiet': True,
+            'noprogress': True,
+            'continuedl': True,
+            'retries': 10,
+            'fragment_retries': 10,
+            'download_archive': archive_path,
+        })
+        self.archive_path = archive_path
+        self.max_concurrent = max_concurrent
+        self.is_known = is_known
+        self.on_progress = on_progress
+        self._lock = threading.Lock()
+
+    def expand(self, url: str) -> list[dict]:
+        """Lists the videos behind a URL, following playlists and channel tabs, without downloading them.
+
+        Args:
+            url (str): A video, playlist or channel URL.
+
+        Returns:
+            list[dict]: One entry per video, with at least `id` and `url`.
+        """
+
+        with yt.YoutubeDL({'extract_flat': 'in_playlist', 'quiet': True}) as ydl:
+            info = ydl.extract_info(url, download=False)
+        return self._flatten(info)
+
+    def _flatten(self, info: dict) -> list[dict]:
+        if info.get('_type') not in ('playlist', 'multi_video'):
+            return [{'id': info.get('id'), 'url': info.get('webpage_url') or info.get('url'), 'title': info.get('title', ''), 'ie_key': info.get('extractor_key')}]
+
+        videos = []
+        for entry in info.get('entries') or []:
+            if entry is None:
+                continue
+            ie_key = entry.get('ie_key') or ''
+            if entry.get('_type') == 'url' and ('Tab' in ie_key or 'Playlist' in ie_key):
+                videos.extend(self.expand(entry['url']))
+            elif entry.get('_type') in ('playlist', 'multi_video'):
+                videos.extend(self._flatten(entry))
+            else:
+                videos.append({'id': entry.get('id'), 'url': entry.get('url') or entry.get('webpage_url'), 'title': entry.get('title', ''), 'ie_key': ie_key})
+        return videos
+
+    def _archived_ids(self) -> set[str]:
+        if not os.path.isfile(self.archive_path):
+            return set()
+        with open(self.archive_path, 'r', encoding='utf-8') as f:
+            return {line.split()[-1] for line in f if line.strip()}
+
+    def _notify(self, progress: DownloadProgress) -> None:
+        if self.on_progress:
+            with self._lock:
+                self.on_progress(progress)
+
+    def _download(self, progress: DownloadProgress) -> DownloadProgress:
+        def hook(d: dict) -> None:
+            progress.status = 'downloading' if d['status'] == 'downloading' else progress.status
+            progress.downloaded_bytes = d.get('downloaded_bytes') or 0
+            progress.total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+            progress.speed = d.get('speed')
+            progress.eta = d.get('eta')
+            progress.filename = d.get('filename', progress.filename)
+            self._notify(progress)
+
+        try:
+            with yt.YoutubeDL({**self.ydl_opts, 'progress_hooks': [hook]}) as ydl:
+                info = ydl.extract_info(progress.url, download=True)
+                if info is None:
+                    # The archive already had it, yt_dlp stopped before downloading.
+                    progress.status = 'skipped'
+                else:
+                    progress.title = info.get('title', progress.title)
+                    progress.filename = ydl.prepare_filename(info)
+                    progress.status = 'finished'
+        except (yt.utils.DownloadError, yt.utils.PostProcessingError, OSError) as e:
+            # One failed video, or a failed conversion or write, doesn't stop the others.
+            progress.status = 'error'
+            progress.error = str(e)
+
+        self._notify(progress)
+        return progress
+
+    def download(self, url: str) -> list[DownloadProgress]:
+        """Downloads every video behind `url`, `max_concurrent` at a time. Blocks until all jobs are done.
+
+        Args:
+            url (str): A video, playlist or channel URL.
+
+        Returns:
+            list[DownloadProgress]: The final state of each job. Failed jobs have status `error` and the message in `error`.
+        """
+
+        try:
+            videos = self.expand(url)
+        except yt.utils.DownloadError as e:
+            failed = DownloadProgress(job_id=url, url=url, status='error', error=str(e))
+            self._notify(failed)
+            return [failed]
+
+        archived = self._archived_ids()
+        jobs = []
+        for video in videos:
+            progress = DownloadProgress(job_id=video['id'] or video['url'], url=video['url'], title=video['title'])
+            if video['id'] in archived or (self.is_known and video['id'] and self.is_known(video['id'])):
+                progress.status = 'skipped'
+            jobs.append(progress)
+            self._notify(progress)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+            results = list(executor.map(self._download, [job for job in jobs if job.status == 'queued']))
+
+        skipped = [job for job in jobs if job.status == 'skipped']
+        return skipped + results
@@ -0,0 +1,190 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache():
+    """Disk-backed cache of embeddings, keyed by (embedding model, hash of the chunk text).
+
+    It lives in a SQLite file shared by every project, so the same chunk is never embedded twice,
+    whether it comes from a rebuild, a re-chunk, or another project. When the stored vectors go over
+    `max_bytes`, the least recently used ones are removed.
+
+    The size of the stored vectors is kept in the one-row `embeddings_size` table by triggers, so it's right
+    for every process using the file and checking it doesn't read the whole cache.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            path (str): Path of the SQLite file, usually `~/.HandySpeechBot/embeddings.sqlite`.
+            max_bytes (int): Maximum size of the stored vectors.
+        """
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                                  model TEXT NOT NULL,
+                                  hash TEXT NOT NULL,
+                                  vector BLOB NOT NULL,
+                                  last_used REAL NOT NULL,
+                                  PRIMARY KEY (model, hash))""")
+        self._conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+        self._conn.commit()
+
+        # In one transaction, so no other process writes between the first count and the triggers.
+        self._conn.execute('BEGIN IMMEDIATE')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS embeddings_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)')
+        self._conn.execute("""CREATE TRIGGER IF NOT EXISTS embeddings_size_insert AFTER INSERT ON embeddings
+                              BEGIN UPDATE embeddings_size SET bytes = bytes + LENGTH(NEW.vector); END""")
+        self._conn.execute("""CREATE TRIGGER IF NOT EXISTS embeddings_size_update AFTER UPDATE OF vector ON embeddings
+                              BEGIN UPDATE embeddings_size SET bytes = bytes + LENGTH(NEW.vector) - LENGTH(OLD.vector); END""")
+        self._conn.execute("""CREATE TRIGGER IF NOT EXISTS embeddings_size_delete AFTER DELETE ON embeddings
+                              BEGIN UPDATE embeddings_size SET bytes = bytes - LENGTH(OLD.vector); END""")
+        # Caches created before the size was tracked are counted once.
+        self._conn.execute('INSERT OR IGNORE INTO embeddings_size (id, bytes) SELECT 0, COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings')
+        self._conn.commit()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """Looks up the vectors of `texts`, in the same order. Missing ones are None.
+
+        Args:
+            model (str): Name of the embedding model.
+            texts (list[str]): The chunks.
+
+        Returns:
+            list[list[float] | None]: The cached vectors.
+        """
+
+        hashes = [self.text_hash(text) for text in texts]
+        found = {}
+        with self._lock:
+            # SQLite limits the number of parameters per query, so the lookup is done in slices.
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                rows = self._conn.execute(f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(part))})", [model, *part])
+                found.update({row[0]: array('f', row[1]).tolist() for row in rows})
+
+            if found:
+                now = time.time()
+                self._conn.executemany('UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?', [(now, model, h) for h in found])
+                self._conn.commit()
+
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+
+        return [found.get(h) for h in hashes]
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]) -> None:
+        """Stores the vectors of `texts`, then evicts the least recently used vectors if the cache is over its limit.
+
+        Args:
+            model (str): Name of the embedding model.
+            texts (list[str]): The chunks.
+            vectors (list[list[float]]): Their vectors, in the same order.
+        """
+
+        now = time.time()
+        rows = [(model, self.text_hash(text), array('f', vector).tobytes(), now) for text, vector in zip(texts, vectors)]
+        with self._lock:
+            # An upsert rather than a replace, so the size triggers see the old vector as updated, not deleted.
+            self._conn.executemany("""INSERT INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)
+                                      ON CONFLICT (model, hash) DO UPDATE SET vector = excluded.vector, last_used = excluded.last_used""", rows)
+            self._conn.commit()
+            self._evict()
+
+    def size(self) -> int:
+        """Returns the size of the stored vectors, in bytes."""
+
+        with self._lock:
+            return self._size()
+
+    def stats(self) -> dict:
+        """Returns the `hits`, `misses` and `hit_rate` since the cache was opened."""
+
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM embeddings')
+            self._conn.commit()
+
+    def _size(self) -> int:
+        return self._conn.execute('SELECT bytes FROM embeddings_size').fetchone()[0]
+
+    def _evict(self) -> None:
+        size = self._size()
+        if size <= self.max_bytes:
+            return
+
+        # Removes the oldest rows until the cache is back to 90% of its limit, so it doesn't evict on every insert.
+        target = size - int(self.max_bytes * 0.9)
+        removed = 0
+        rows = self._conn.execute('SELECT model, hash, LENGTH(vector) FROM embeddings ORDER BY last_used')
+        to_delete = []
+        for model, text_hash, length in rows:
+            if removed >= target:
+                break
+            to_delete.append((model, text_hash))
+            removed += length
+
+        self._conn.executemany('DELETE FROM embeddings WHERE model = ? AND hash = ?', to_delete)
+        self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embedding model, so only the chunks missing from the `EmbeddingCache` are sent to it."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str | None = None):
+        """
+        Args:
+            embeddings (Embeddings): The embedding model.
+            cache (EmbeddingCache): The shared cache.
+            model_name (str | None): Name used in the cache key. Defaults to the `model` attribute of `embeddings`.
+        """
+
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name or getattr(embeddings, 'model', type(embeddings).__name__)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = self.cache.get_many(self.model_name, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Identical chunks in the same call are embedded once.
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            new_vectors = self.embeddings.embed_documents(unique)
+            self.cache.put_many(self.model_name, unique, new_vectors)
+            by_text = dict(zip(unique, new_vectors))
+            for i in missing:
+                vectors[i] = by_text[texts[i]]
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+
+_default_cache = None
+
+
+def get_default_cache() -> EmbeddingCache:
+    """Returns the cache shared by every project, in `~/.HandySpeechBot/embeddings.sqlite`."""
+
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EmbeddingCache(os.path.join(os.path.expanduser("~"), ".HandySpeechBot", "embeddings.sqlite"))
+    return _default_cache
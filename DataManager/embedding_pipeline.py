@@ -0,0 +1,214 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from langchain_core.embeddings import Embeddings
+from DataManager.embedding_cache import EmbeddingCache
+from DataManager.instrumentation import metrics
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the number of tokens of a text, using the usual ~4 characters per token."""
+
+    return max(1, len(text) // 4)
+
+
+def make_batches(texts: list[str], batch_tokens: int, max_batch_size: int = 2048) -> list[list[int]]:
+    """Groups the texts into batches of at most `batch_tokens` estimated tokens.
+
+    Args:
+        texts (list[str]): The chunks.
+        batch_tokens (int): Token budget of each batch. A single chunk bigger than it gets a batch of its own.
+        max_batch_size (int): Maximum number of chunks per batch.
+
+    Returns:
+        list[list[int]]: The indices of the texts in each batch.
+    """
+
+    batches = []
+    current = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > batch_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+class RateLimiter():
+    """Token buckets limiting the requests per minute and the tokens per minute sent to the embedding API.
+
+    The buckets are guarded by a thread lock, not an asyncio one, so a single limiter can be shared by every
+    pipeline and event loop of the process (see `get_rate_limiter`).
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    async def acquire(self, tokens: int) -> None:
+        """Waits until one request of `tokens` tokens fits in both limits, then takes it from the buckets."""
+
+        # A batch bigger than the whole minute budget waits for a full bucket instead of forever.
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+
+                wait_requests = (1 - self._requests) * 60 / self.requests_per_minute
+                wait_tokens = (tokens - self._tokens) * 60 / self.tokens_per_minute
+            await asyncio.sleep(max(wait_requests, wait_tokens, 0.01))
+
+
+_rate_limiters: dict[tuple[int, int], RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(requests_per_minute: int, tokens_per_minute: int) -> RateLimiter:
+    """Returns the rate limiter of the process for these limits, so every pipeline sending to the same API
+    shares its budget, instead of each call starting with full buckets."""
+
+    with _rate_limiters_lock:
+        key = (requests_per_minute, tokens_per_minute)
+        if key not in _rate_limiters:
+            _rate_limiters[key] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return _rate_limiters[key]
+
+
+class EmbeddingPipeline():
+    """Embeds chunks in batches sent concurrently, under a rate limit, retrying each failed batch on its own.
+
+    Cached vectors are returned right away, and each batch is handed to `on_batch` as soon as it finishes,
+    so the caller can add it to the index while the other batches are still running.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache | None = None, model_name: str | None = None,
+                 batch_tokens: int = 8000, concurrency: int = 4, requests_per_minute: int = 3000,
+                 tokens_per_minute: int = 1000000, max_retries: int = 5, backoff: float = 1.0):
+        """
+        Args:
+            embeddings (Embeddings): The embedding model. Anything with `aembed_documents`, including an in-process stub.
+            cache (EmbeddingCache | None): Where vectors are looked up before, and stored after, being embedded.
+            model_name (str | None): Name used in the cache key. Defaults to the `model` attribute of `embeddings`.
+            batch_tokens (int): Token budget of each request.
+            concurrency (int): Maximum number of requests in flight.
+            requests_per_minute (int): Request rate limit, shared with the other pipelines of the process that have the same limits.
+            tokens_per_minute (int): Token rate limit, shared the same way.
+            max_retries (int): How many times a failed batch is retried before giving up.
+            backoff (float): Initial wait before a retry, in seconds. It doubles on every attempt.
+        """
+
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name or getattr(embeddings, 'model', type(embeddings).__name__)
+        self.batch_tokens = batch_tokens
+        self.concurrency = concurrency
+        self.limiter = get_rate_limiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.last_stats = {}
+
+    async def _embed_batch(self, texts: list[str], limiter: RateLimiter, semaphore: asyncio.Semaphore, stats: dict) -> list[list[float]]:
+        tokens = sum(estimate_tokens(text) for text in texts)
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await limiter.acquire(tokens)
+                try:
+                    return await self.embeddings.aembed_documents(texts)
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        raise
+                    stats['retries'] += 1
+                    delay = self.backoff * (2 ** attempt) * random.uniform(0.8, 1.2)
+                    print(f"Embedding batch of {len(texts)} chunks failed ({e}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+    async def aembed(self, texts: list[str], on_batch: Callable[[list[int], list[list[float]]], None] | None = None) -> list[list[float]]:
+        """Embeds the texts. See `embed`."""
+
+        start = time.perf_counter()
+        stats = {'chunks': len(texts), 'cached': 0, 'batches': 0, 'retries': 0}
+        vectors = [None] * len(texts)
+
+        missing = list(range(len(texts)))
+        if self.cache is not None:
+            cached = self.cache.get_many(self.model_name, texts)
+            hits = [i for i, vector in enumerate(cached) if vector is not None]
+            for i in hits:
+                vectors[i] = cached[i]
+            missing = [i for i, vector in enumerate(cached) if vector is None]
+            stats['cached'] = len(hits)
+            if hits and on_batch:
+                on_batch(hits, [vectors[i] for i in hits])
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        missing_texts = [texts[i] for i in missing]
+        batches = [[missing[i] for i in batch] for batch in make_batches(missing_texts, self.batch_tokens)]
+        stats['batches'] = len(batches)
+        metrics.count('embedding_cache_hits', stats['cached'])
+        metrics.count('embedding_cache_misses', len(missing))
+        metrics.count('tokens', sum(estimate_tokens(text) for text in missing_texts))
+
+        async def run(batch: list[int]) -> tuple[list[int], list[list[float]]]:
+            return batch, await self._embed_batch([texts[i] for i in batch], self.limiter, semaphore, stats)
+
+        with metrics.span('embed', chunks=len(missing), batches=len(batches)):
+            for finished in asyncio.as_completed([run(batch) for batch in batches]):
+                batch, batch_vectors = await finished
+                for i, vector in zip(batch, batch_vectors):
+                    vectors[i] = vector
+                if self.cache is not None:
+                    self.cache.put_many(self.model_name, [texts[i] for i in batch], batch_vectors)
+                if on_batch:
+                    on_batch(batch, batch_vectors)
+
+        stats['seconds'] = time.perf_counter() - start
+        stats['chunks_per_second'] = len(texts) / stats['seconds'] if stats['seconds'] else 0.0
+        self.last_stats = stats
+        print(f"Embedded {stats['chunks']} chunks ({stats['cached']} cached) in {stats['batches']} batches, {stats['chunks_per_second']:.1f} chunks/s")
+        return vectors
+
+    def embed(self, texts: list[str], on_batch: Callable[[list[int], list[list[float]]], None] | None = None) -> list[list[float]]:
+        """Embeds the texts, blocking until every batch is done. Prefer `aembed` from inside an event loop: called
+        from one, this blocks it, since the batches have to run in a loop of their own, in another thread.
+
+        Args:
+            texts (list[str]): The chunks.
+            on_batch (Callable[[list[int], list[list[float]]], None] | None): Called with the indices of the texts
+                and their vectors as each batch finishes. Cached vectors come first, in one call.
+
+        Returns:
+            list[list[float]]: The vectors, in the same order as `texts`.
+        """
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.aembed(texts, on_batch))
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.aembed(texts, on_batch)).result()
@@ -0,0 +1,201 @@
+import json
+import os
+import platform
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, NamedTuple
+
+# Stages of the pipeline that are timed with `Metrics.span`.
+STAGES = ('download', 'decode', 'transcribe', 'chunk', 'embed', 'index', 'query')
+
+
+class Span(NamedTuple):
+    name: str
+    seconds: float
+    labels: dict
+    finished_at: float
+
+
+def current_memory_mb() -> float | None:
+    """Returns the resident memory of the current process, in megabytes, or None if the platform doesn't tell it."""
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Only the peak is available here. Linux reports kilobytes, macOS reports bytes.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == 'Darwin' else peak / 1024
+
+
+class Metrics():
+    """Collects how long each stage of the pipeline takes, a few counters and the peak memory.
+
+    Stages are timed with `span` and counted with `count`. Listeners added with `subscribe` get every finished
+    span and counter update, from whatever thread produced it, so a GUI must hand them to its own thread.
+    """
+
+    def __init__(self, max_spans: int = 10000):
+        """
+        Args:
+            max_spans (int): How many of the most recent spans are kept. The per-stage totals include every span.
+        """
+
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.spans = deque(maxlen=max_spans)
+        self.totals = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+        self.counters = defaultdict(float)
+        self.peak_memory_mb = 0.0
+
+    def subscribe(self, listener: Callable[[str, str, float, dict], None]) -> None:
+        """Adds a listener, called as `listener(kind, name, value, labels)`. `kind` is 'span', with the seconds
+        as the value, or 'counter', with the amount added."""
+
+        with self._lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[str, str, float, dict], None]) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _notify(self, kind: str, name: str, value: float, labels: dict) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(kind, name, value, labels)
+            except Exception as e:
+                print(f"Metrics listener failed: {e}")
+
+    @contextmanager
+    def span(self, name: str, **labels) -> Iterator[dict]:
+        """Times the code inside the `with` block as one occurrence of the stage `name`.
+
+        Args:
+            name (str): The stage, one of `STAGES`.
+            **labels: Details stored with the span, like the `file`. The yielded dict can be updated inside the block.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.spans.append(Span(name, seconds, labels, time.time()))
+                total = self.totals[name]
+                total['count'] += 1
+                total['seconds'] += seconds
+                total['max_seconds'] = max(total['max_seconds'], seconds)
+            self._notify('span', name, seconds, labels)
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        """Adds `value` to the counter `name`, like `audio_seconds`, `tokens`, `chunks` or `embedding_cache_hits`."""
+
+        with self._lock:
+            self.counters[name] += value
+        self._notify('counter', name, value, labels)
+
+    def sample_memory(self) -> float | None:
+        """Reads the current memory use and keeps the peak."""
+
+        memory = current_memory_mb()
+        if memory is not None:
+            with self._lock:
+                self.peak_memory_mb = max(self.peak_memory_mb, memory)
+        return memory
+
+    def snapshot(self) -> dict:
+        """Returns the per-stage totals, counters and peak memory."""
+
+        self.sample_memory()
+        with self._lock:
+            return {
+                'stages': {name: dict(total) for name, total in self.totals.items()},
+                'counters': dict(self.counters),
+                'peak_memory_mb': self.peak_memory_mb,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.spans.clear()
+            self.totals.clear()
+            self.counters.clear()
+            self.peak_memory_mb = 0.0
+
+    def to_prometheus(self, prefix: str = 'handyspeechbot') -> str:
+        """Formats the snapshot in the Prometheus text exposition format."""
+
+        snapshot = self.snapshot()
+        lines = [f"# TYPE {prefix}_stage_seconds_total counter"]
+        lines += [f'{prefix}_stage_seconds_total{{stage="{name}"}} {total["seconds"]}' for name, total in snapshot['stages'].items()]
+        lines.append(f"# TYPE {prefix}_stage_runs_total counter")
+        lines += [f'{prefix}_stage_runs_total{{stage="{name}"}} {total["count"]}' for name, total in snapshot['stages'].items()]
+        lines.append(f"# TYPE {prefix}_stage_max_seconds gauge")
+        lines += [f'{prefix}_stage_max_seconds{{stage="{name}"}} {total["max_seconds"]}' for name, total in snapshot['stages'].items()]
+        for name, value in snapshot['counters'].items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        lines.append(f"# TYPE {prefix}_peak_memory_megabytes gauge")
+        lines.append(f"{prefix}_peak_memory_megabytes {snapshot['peak_memory_mb']}")
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str) -> None:
+        """Writes the metrics to `path`: Prometheus text if it ends with `.prom` or `.txt`, JSON otherwise."""
+
+        if path.endswith(('.prom', '.txt')):
+            content = self.to_prometheus()
+        else:
+            report = self.snapshot()
+            with self._lock:
+                report['spans'] = [span._asdict() for span in self.spans]
+            content = json.dumps(report, indent=4)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+class MemorySampler():
+    """Samples the process memory in the background while it's used as a context manager, so short peaks,
+    like a model load, are caught in `Metrics.peak_memory_mb`."""
+
+    def __init__(self, metrics: Metrics, interval: float = 0.5):
+        self.metrics = metrics
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> 'MemorySampler':
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.metrics.sample_memory()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.metrics.sample_memory()
+            self._stop.wait(self.interval)
+
+
+metrics = Metrics()
@@ -0,0 +1,309 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable
+
+# Lower runs first. A question the user is waiting for goes before a bulk re-index.
+DEFAULT_PRIORITIES = {'query': 0, 'download': 10, 'transcribe': 20, 'index': 30}
+
+# How many jobs of each stage run at the same time.
+DEFAULT_CONCURRENCY = {'query': 2, 'download': 2, 'transcribe': 1, 'index': 1}
+
+# Jobs only worth running while the user waits for them. They aren't resumed after a restart.
+TRANSIENT_KINDS = ('query',)
+
+# Finished jobs are kept in the queue file this long, in seconds, for reference.
+FINISHED_RETENTION = 24 * 3600
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    """A unit of background work, as stored in the queue and given to the event callback."""
+
+    job_id: str
+    kind: str
+    payload: dict = field(default_factory=dict)
+    priority: int = 50
+    status: str = 'queued'  # queued, running, done, failed or cancelled
+    progress: float | None = None
+    message: str = ''
+    error: str = ''
+    result: object = None
+    created_at: float = 0.0
+    finished_at: float | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed', 'cancelled')
+
+
+class JobContext():
+    """Given to a job handler, to report progress and notice cancellation."""
+
+    def __init__(self, scheduler: 'JobScheduler', job: Job):
+        self.job = job
+        self.cancel_event = threading.Event()
+        self._scheduler = scheduler
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def submit(self, kind: str, payload: dict | None = None, priority: int | None = None) -> Job:
+        """Queues a follow-up job, like transcribing what a download brought. See `JobScheduler.submit`."""
+
+        return self._scheduler.submit(kind, payload, priority)
+
+    def check(self) -> None:
+        """Raises `JobCancelled` if the job was cancelled. Handlers call it between steps."""
+
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def report(self, progress: float | None = None, message: str = '') -> None:
+        """Updates the progress of the job, from 0 to 1, and sends it to the event callback."""
+
+        self.job.progress = progress
+        self.job.message = message
+        self._scheduler._emit(self.job)
+
+
+# The scheduler running the queue of each project folder. A new one takes over from the one before it.
+_schedulers: dict[str, 'JobScheduler'] = {}
+_schedulers_lock = threading.Lock()
+
+
+class JobScheduler():
+    """Runs the slow work of a project (downloads, transcription, indexing, questions) in background threads.
+
+    Jobs wait in a queue stored in `jobs.sqlite` in the project folder, and run by priority, then by age, with at most
+    `concurrency[kind]` jobs of each kind at the same time. Jobs that were running when the app closed or crashed are
+    queued again on `start`, so they resume: the manifest and the index make redoing them skip the finished work.
+    Only one scheduler of the process runs the queue of a project: a new one, like the one of a project window opened
+    again, shuts down the one before it and waits for its jobs to stop before reading the queue, so they never run twice.
+    Every change of a job is sent to `on_event`, from the worker threads, so a GUI must hand it to its own thread.
+    """
+
+    def __init__(self, project_path: str, handlers: dict[str, Callable[[Job, JobContext], object]],
+                 concurrency: dict[str, int] | None = None, on_event: Callable[[Job], None] | None = None):
+        """
+        Args:
+            project_path (str): The project folder, where the queue is stored.
+            handlers (dict[str, Callable[[Job, JobContext], object]]): The function that runs each kind of job.
+                Its return value becomes the job `result`, which isn't stored.
+            concurrency (dict[str, int] | None): Maximum number of running jobs of each kind. Defaults to `DEFAULT_CONCURRENCY`.
+            on_event (Callable[[Job], None] | None): Called whenever a job is queued, starts, reports progress or finishes.
+        """
+
+        self.handlers = handlers
+        self._key = os.path.realpath(project_path)
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self.on_event = on_event
+        self._jobs: dict[str, Job] = {}
+        self._running: dict[str, JobContext] = {}
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._dispatcher = None
+        self._conn = sqlite3.connect(os.path.join(project_path, 'jobs.sqlite'), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                                  job_id TEXT PRIMARY KEY,
+                                  kind TEXT NOT NULL,
+                                  payload TEXT NOT NULL,
+                                  priority INTEGER NOT NULL,
+                                  status TEXT NOT NULL,
+                                  error TEXT NOT NULL DEFAULT '',
+                                  created_at REAL NOT NULL,
+                                  finished_at REAL)""")
+        self._conn.commit()
+
+    def _save(self, job: Job) -> None:
+        self._conn.execute('INSERT OR REPLACE INTO jobs (job_id, kind, payload, priority, status, error, created_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                           (job.job_id, job.kind, json.dumps(job.payload), job.priority, job.status, job.error, job.created_at, job.finished_at))
+        self._conn.commit()
+
+    def _emit(self, job: Job) -> None:
+        if self.on_event:
+            try:
+                self.on_event(job)
+            except Exception as e:
+                print(f"Job event callback failed: {e}")
+
+    def start(self) -> None:
+        """Starts running the jobs in the background. The unfinished ones are loaded first, queuing again the ones that
+        were interrupted, once the previous scheduler of the project, if any, stopped its jobs."""
+
+        with _schedulers_lock:
+            previous = _schedulers.get(self._key)
+            _schedulers[self._key] = self
+
+        with self._condition:
+            self._stopping = False
+            self._dispatcher = threading.Thread(target=self._dispatch, args=(previous,), daemon=True)
+            self._dispatcher.start()
+
+    def _load(self) -> None:
+        with self._condition:
+            self._conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ?", (time.time() - FINISHED_RETENTION,))
+            rows = self._conn.execute("SELECT job_id, kind, payload, priority, status, created_at FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+            for job_id, kind, payload, priority, status, created_at in rows:
+                # Submitted to this scheduler while the previous one was stopping.
+                if job_id in self._jobs:
+                    continue
+                job = Job(job_id, kind, json.loads(payload), priority, 'queued', created_at=created_at)
+                if kind in TRANSIENT_KINDS or kind not in self.handlers:
+                    job.status = 'cancelled'
+                    job.finished_at = time.time()
+                    self._save(job)
+                    continue
+                if status == 'running':
+                    print(f"Resuming interrupted {kind} job {job_id}")
+                    self._save(job)
+                self._jobs[job_id] = job
+            self._conn.commit()
+            self._condition.notify_all()
+
+    def submit(self, kind: str, payload: dict | None = None, priority: int | None = None) -> Job:
+        """Queues a job. If the same job is already waiting, that one is returned instead, since running it twice
+        would do the same work: one 'transcribe' job handles every new file.
+
+        Args:
+            kind (str): Which handler runs it, like 'download', 'transcribe', 'index' or 'query'.
+            payload (dict | None): Arguments for the handler. Must be JSON serializable, as it's stored.
+            priority (int | None): Lower runs first. Defaults to `DEFAULT_PRIORITIES[kind]`.
+
+        Returns:
+            Job: The queued job.
+        """
+
+        if kind not in self.handlers:
+            raise ValueError(f"No handler for {kind} jobs")
+
+        payload = payload or {}
+        job = Job(uuid.uuid4().hex[:12], kind, payload, DEFAULT_PRIORITIES.get(kind, 50) if priority is None else priority, created_at=time.time())
+        with self._condition:
+            for queued in self._jobs.values():
+                if queued.status == 'queued' and queued.kind == kind and queued.payload == payload:
+                    return queued
+            self._jobs[job.job_id] = job
+            self._save(job)
+            self._condition.notify_all()
+        self._emit(job)
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a job. A queued job never runs. A running job is asked to stop, and stops when its handler
+        next calls `JobContext.check`.
+
+        Returns:
+            bool: True if the job was queued or running. False otherwise.
+        """
+
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+
+            if job_id in self._running:
+                self._running[job_id].cancel_event.set()
+                return True
+
+            job.status = 'cancelled'
+            job.finished_at = time.time()
+            self._save(job)
+            del self._jobs[job_id]
+        self._emit(job)
+        return True
+
+    def jobs(self) -> list[Job]:
+        """Returns the queued and running jobs, in the order they will run."""
+
+        with self._condition:
+            return sorted(self._jobs.values(), key=lambda job: (job.status != 'running', job.priority, job.created_at))
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops starting jobs and asks the running ones to stop. Jobs that didn't finish run again on the next `start`.
+
+        With `wait`, it returns once every job stopped and the queue file is closed, so it can be deleted.
+        """
+
+        with self._condition:
+            self._stopping = True
+            running = list(self._running.values())
+            self._condition.notify_all()
+
+        for context in running:
+            context.cancel_event.set()
+        if wait and self._dispatcher is not None:
+            self._dispatcher.join()
+            with self._condition:
+                while self._running:
+                    self._condition.wait()
+                self._conn.close()
+            with _schedulers_lock:
+                if _schedulers.get(self._key) is self:
+                    del _schedulers[self._key]
+
+    def _next_job(self) -> Job | None:
+        """The first queued job, by priority and age, whose kind has a free slot."""
+
+        running_kinds = [context.job.kind for context in self._running.values()]
+        queued = [job for job in self._jobs.values() if job.status == 'queued' and running_kinds.count(job.kind) < self.concurrency.get(job.kind, 1)]
+        return min(queued, key=lambda job: (job.priority, job.created_at), default=None)
+
+    def _dispatch(self, previous: 'JobScheduler | None') -> None:
+        if previous is not None and previous is not self:
+            # Its jobs still show as running in the queue until they stop, and would be resumed here while they run.
+            previous.shutdown(wait=True)
+        self._load()
+
+        while True:
+            with self._condition:
+                job = None
+                while not self._stopping and (job := self._next_job()) is None:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+
+                job.status = 'running'
+                context = JobContext(self, job)
+                self._running[job.job_id] = context
+                self._save(job)
+
+            self._emit(job)
+            threading.Thread(target=self._run, args=(context,), daemon=True).start()
+
+    def _run(self, context: JobContext) -> None:
+        job = context.job
+        try:
+            job.result = self.handlers[job.kind](job, context)
+            job.status = 'done'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            print(f"{job.kind} job {job.job_id} failed: {e}")
+
+        with self._condition:
+            del self._running[job.job_id]
+            if self._stopping and job.status == 'cancelled':
+                # Stopped by a shutdown, not by the user, so it runs again on the next start.
+                job.status = 'queued'
+                self._save(job)
+                self._condition.notify_all()
+                return
+
+            job.finished_at = time.time()
+            self._save(job)
+            self._jobs.pop(job.job_id, None)
+            self._condition.notify_all()
+        self._emit(job)
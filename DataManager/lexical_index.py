@@ -0,0 +1,147 @@
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import NamedTuple
+
+# Words in more than this share of the chunks are left out of queries. BM25 gives them an IDF of about zero
+# anyway, and matching them would mean scoring most of the index.
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+
+class LexicalMatch(NamedTuple):
+    id: str
+    source: str
+    chunk: int
+    text: str
+    score: float
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits text into lowercase words without diacritics, as the FTS5 `unicode61` tokenizer of the index does."""
+
+    text = unicodedata.normalize('NFKD', text.lower())
+    return re.findall(r'[^\W_]+', ''.join(c for c in text if not unicodedata.combining(c)))
+
+
+class LexicalIndex():
+    """BM25 inverted index of the transcript chunks, in `<index_name>_bm25.sqlite` next to the FAISS index.
+
+    It's a SQLite FTS5 table, so it's compact, updated in place a source at a time, and a query is answered
+    from the index without loading it. Chunks have the same IDs as in the FAISS index (`<source>::<position>`),
+    so results of both can be fused. The document frequency of every word is kept too, so the words common
+    to most chunks are dropped from queries before they reach FTS5. Changes become visible to other readers on `commit`.
+    """
+
+    def __init__(self, db_path: str, index_name: str):
+        """
+        Args:
+            db_path (str): The project `databases` folder.
+            index_name (str): Name of the index files.
+        """
+
+        self.path = os.path.join(db_path, f"{index_name}_bm25.sqlite")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # Diacritics are removed, so "medico" matches "médico" in the transcripts.
+        self._conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+                                  text,
+                                  id UNINDEXED,
+                                  source UNINDEXED,
+                                  chunk UNINDEXED,
+                                  tokenize = 'unicode61 remove_diacritics 2')""")
+        self._conn.execute('CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID')
+        self._conn.execute("INSERT OR IGNORE INTO stats (key, value) VALUES ('chunks', 0)")
+        self._conn.commit()
+
+    def _update_terms(self, texts: list[str], change: int) -> None:
+        counts = {}
+        for text in texts:
+            for term in set(tokenize(text)):
+                counts[term] = counts.get(term, 0) + change
+        self._conn.executemany('INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT (term) DO UPDATE SET df = df + excluded.df', counts.items())
+        self._conn.execute("UPDATE stats SET value = value + ? WHERE key = 'chunks'", (change * len(texts),))
+
+    def add(self, source: str, items: list[tuple[int, str]]) -> None:
+        """Adds (position, chunk) items of a source."""
+
+        rows = [(chunk, f"{source}::{position}", source, position) for position, chunk in items]
+        with self._lock:
+            self._conn.executemany('INSERT INTO chunks (text, id, source, chunk) VALUES (?, ?, ?, ?)', rows)
+            self._update_terms([chunk for _, chunk in items], 1)
+
+    def remove_source(self, source: str) -> int:
+        """Removes every chunk of a transcript.
+
+        Returns:
+            int: The number of chunks removed.
+        """
+
+        with self._lock:
+            texts = [row[0] for row in self._conn.execute('SELECT text FROM chunks WHERE source = ?', (source,))]
+            if not texts:
+                return 0
+            self._conn.execute('DELETE FROM chunks WHERE source = ?', (source,))
+            self._update_terms(texts, -1)
+            self._conn.execute('DELETE FROM terms WHERE df <= 0')
+            return len(texts)
+
+    def commit(self) -> None:
+        with self._lock:
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT value FROM stats WHERE key = 'chunks'").fetchone()[0]
+
+    def _query_terms(self, text: str) -> tuple[list[str], bool]:
+        """Picks the words of `text` worth matching: the ones in the index and not in most of the chunks.
+
+        Returns:
+            tuple[list[str], bool]: The words, and whether they are selective. If every word is in most of the chunks,
+                only the rarest one is returned, and it's not selective: ranking by it would be meaningless.
+        """
+
+        words = list(dict.fromkeys(tokenize(text)))
+        if not words:
+            return [], False
+
+        total = self._conn.execute("SELECT value FROM stats WHERE key = 'chunks'").fetchone()[0]
+        frequencies = dict(self._conn.execute(f"SELECT term, df FROM terms WHERE term IN ({','.join('?' * len(words))})", words).fetchall())
+        present = [word for word in words if frequencies.get(word, 0) > 0]
+        selective = [word for word in present if frequencies[word] <= total * MAX_DOCUMENT_FREQUENCY]
+        if selective or not present:
+            return selective, True
+        return [min(present, key=frequencies.get)], False
+
+    def search(self, query: str, k: int = 4) -> list[LexicalMatch]:
+        """Finds the chunks that best match the words of `query`, by BM25.
+
+        Args:
+            query (str): Free text, like a question.
+            k (int): Maximum number of chunks returned.
+
+        Returns:
+            list[LexicalMatch]: The matches, best first. Lower scores are better, as in SQLite's `bm25`.
+        """
+
+        with self._lock:
+            terms, selective = self._query_terms(query)
+            if not terms:
+                return []
+
+            # Quoted, so punctuation and FTS5 operators in the question can't break the query syntax.
+            match_query = ' OR '.join(f'"{term}"' for term in terms)
+            # A word in most of the chunks scores them all about the same, so any of them will do.
+            order = 'ORDER BY bm25(chunks)' if selective else ''
+            rows = self._conn.execute(f'SELECT id, source, chunk, text, bm25(chunks) FROM chunks WHERE chunks MATCH ? {order} LIMIT ?',
+                                      (match_query, k)).fetchall()
+        return [LexicalMatch(row[0], row[1], int(row[2]), row[3], row[4]) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,287 @@
+import queue
+import threading
+import time
+import wave
+from typing import Callable, Iterator
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+class RingBuffer():
+    """Fixed-size buffer of the most recent PCM samples, addressed by the absolute sample position in the stream."""
+
+    def __init__(self, seconds: float):
+        self.capacity = int(seconds * SAMPLE_RATE)
+        self.data = np.zeros(self.capacity, dtype=np.float32)
+        self.position = 0
+
+    def write(self, frame: np.ndarray) -> None:
+        frame = frame[-self.capacity:]
+        start = self.position % self.capacity
+        end = start + len(frame)
+        if end <= self.capacity:
+            self.data[start:end] = frame
+        else:
+            split = self.capacity - start
+            self.data[start:] = frame[:split]
+            self.data[:end - self.capacity] = frame[split:]
+        self.position += len(frame)
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """Returns the samples between the absolute positions `start` and `end`. Samples already overwritten are skipped."""
+
+        start = max(start, self.position - self.capacity, 0)
+        end = min(end, self.position)
+        if end <= start:
+            return np.zeros(0, dtype=np.float32)
+
+        indices = np.arange(start, end) % self.capacity
+        return self.data[indices]
+
+
+def to_mono_16k(samples: np.ndarray, sample_rate: int, channels: int) -> np.ndarray:
+    """Downmixes interleaved samples to mono and resamples them to 16 kHz, with linear interpolation."""
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    if sample_rate != SAMPLE_RATE:
+        length = int(len(samples) * SAMPLE_RATE / sample_rate)
+        samples = np.interp(np.linspace(0, len(samples) - 1, length), np.arange(len(samples)), samples)
+    return samples.astype(np.float32)
+
+
+class WavFileSource():
+    """Replays a 16-bit PCM WAV file as if it was a live stream, so live transcription can be tested without a microphone.
+
+    Frames are yielded with the time they would have arrived from a real device. If the consumer falls behind,
+    the following frames are yielded without waiting, like a device driver buffer would deliver them.
+    """
+
+    def __init__(self, path: str, frame_ms: int = 30, realtime: bool = True):
+        self.path = path
+        self.frame_ms = frame_ms
+        self.realtime = realtime
+        self._stopped = threading.Event()
+
+    def frames(self) -> Iterator[tuple[np.ndarray, float]]:
+        with wave.open(self.path, 'rb') as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError('Only 16-bit PCM WAV files are supported.')
+
+            sample_rate = wav.getframerate()
+            channels = wav.getnchannels()
+            frames_per_read = int(sample_rate * self.frame_ms / 1000)
+            start = time.monotonic()
+            read = 0
+
+            while not self._stopped.is_set():
+                data = wav.readframes(frames_per_read)
+                if not data:
+                    break
+
+                arrival = start + (read + len(data) // (2 * channels)) / sample_rate
+                read += len(data) // (2 * channels)
+                if self.realtime:
+                    delay = arrival - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                else:
+                    arrival = time.monotonic()
+
+                samples = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+                yield to_mono_16k(samples, sample_rate, channels), arrival
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+class MicrophoneSource():
+    """Captures 16 kHz mono audio from the default input device. Requires the optional `sounddevice` package."""
+
+    def __init__(self, frame_ms: int = 30, device: int | str | None = None):
+        self.frame_ms = frame_ms
+        self.device = device
+        self._stopped = threading.Event()
+
+    def frames(self) -> Iterator[tuple[np.ndarray, float]]:
+        try:
+            import sounddevice
+        except ImportError:
+            raise ImportError('Recording from a microphone requires the `sounddevice` package. Install it with `pip install sounddevice`.')
+
+        frames = queue.Queue()
+
+        def callback(indata, frame_count, time_info, status):
+            frames.put((indata[:, 0].copy(), time.monotonic()))
+
+        blocksize = int(SAMPLE_RATE * self.frame_ms / 1000)
+        with sounddevice.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype='float32', blocksize=blocksize, device=self.device, callback=callback):
+            while not self._stopped.is_set():
+                try:
+                    yield frames.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+class EnergyVAD():
+    """Voice activity detection by frame energy, against an adaptive estimate of the background noise."""
+
+    def __init__(self, threshold_ratio: float = 3.0, min_speech_ms: int = 90, min_silence_ms: int = 500, frame_ms: int = 30):
+        self.threshold_ratio = threshold_ratio
+        self.speech_frames = max(1, min_speech_ms // frame_ms)
+        self.silence_frames = max(1, min_silence_ms // frame_ms)
+        self.noise_floor = 1e-3
+        self.in_speech = False
+        # Whether the last frame was above the threshold. An utterance ends `min_silence_ms` after its last voiced frame.
+        self.voiced = False
+        self._voiced = 0
+        self._silent = 0
+
+    def update(self, frame: np.ndarray) -> str | None:
+        """Updates the detector with a new frame.
+
+        Returns:
+            str | None: 'start' when an utterance begins, 'end' when it ends, None otherwise.
+        """
+
+        energy = float(np.sqrt(np.mean(np.square(frame)))) if len(frame) else 0.0
+        voiced = energy > self.noise_floor * self.threshold_ratio
+        self.voiced = voiced
+        if not voiced:
+            # Follows the background level slowly, so a noisy room doesn't count as speech.
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * max(energy, 1e-4)
+
+        if not self.in_speech:
+            self._voiced = self._voiced + 1 if voiced else 0
+            if self._voiced >= self.speech_frames:
+                self.in_speech = True
+                self._silent = 0
+                return 'start'
+        else:
+            self._silent = 0 if voiced else self._silent + 1
+            if self._silent >= self.silence_frames:
+                self.in_speech = False
+                self._voiced = 0
+                return 'end'
+        return None
+
+
+class LiveTranscriber():
+    """Transcribes a live stream utterance by utterance.
+
+    While an utterance is in progress, a fast partial hypothesis is emitted every `partial_interval` seconds.
+    When the VAD detects its end, or it reaches `max_utterance_seconds`, the utterance is decoded again with the
+    full beam and emitted as final, replacing the partials. The latency of each final, from the moment the last
+    voiced frame of the utterance arrived, is recorded and compared against `latency_target`. It includes the
+    silence the VAD waits for before it ends an utterance, since the speaker waits for it too.
+    """
+
+    def __init__(self, model, on_partial: Callable[[str], None] | None = None, on_final: Callable[[str, float, float], None] | None = None,
+                 language: str | None = None, partial_interval: float = 1.0, max_utterance_seconds: float = 15.0,
+                 latency_target: float = 1.5, frame_ms: int = 30):
+        """
+        Args:
+            model (WhisperModel | None): The model. A small one, like `base` or `small`, is needed for real time on a CPU.
+                It can be set later, before `run`.
+            on_partial (Callable[[str], None] | None): Called with the partial text of the current utterance.
+            on_final (Callable[[str, float, float], None] | None): Called with the final text and its start and end, in stream seconds.
+            language (str | None): Language of the speech. If None, it's detected on the first utterance and kept.
+            partial_interval (float): Seconds between partial hypotheses.
+            max_utterance_seconds (float): An utterance longer than this is finalized even without a pause.
+            latency_target (float): Target latency of the final results, in seconds.
+            frame_ms (int): Duration of the frames given by the source.
+        """
+
+        self.model = model
+        self.on_partial = on_partial
+        self.on_final = on_final
+        self.language = language
+        self.partial_interval = partial_interval
+        self.max_utterance_samples = int(max_utterance_seconds * SAMPLE_RATE)
+        self.latency_target = latency_target
+        self.frame_ms = frame_ms
+        self.latencies = []
+        self._source = None
+        self._stopped = False
+
+    def _transcribe(self, audio: np.ndarray, beam_size: int) -> str:
+        segments, info = self.model.transcribe(audio, language=self.language, beam_size=beam_size, without_timestamps=True, condition_on_previous_text=False)
+        text = ''.join(segment.text for segment in segments).strip()
+        if self.language is None:
+            self.language = info.language
+        return text
+
+    def run(self, source) -> None:
+        """Transcribes the source until it ends or `stop` is called. Blocks, so it's usually called from a thread.
+
+        Args:
+            source (WavFileSource | MicrophoneSource): Where the frames come from.
+        """
+
+        self._source = source
+        # Stopped before it started, like while the model was loading.
+        if self._stopped:
+            source.stop()
+        buffer = RingBuffer(self.max_utterance_samples / SAMPLE_RATE + 5)
+        # Keeps a little audio from before the VAD triggered, so the first syllable isn't cut.
+        pre_roll = int(0.3 * SAMPLE_RATE)
+        vad = EnergyVAD(frame_ms=self.frame_ms)
+        utterance_start = None
+        last_partial = 0.0
+        # Arrival of the last voiced frame, where the speaker stopped talking.
+        speech_end = None
+
+        for frame, arrival in source.frames():
+            buffer.write(frame)
+            event = vad.update(frame)
+            if vad.voiced:
+                speech_end = arrival
+
+            if event == 'start':
+                utterance_start = max(0, buffer.position - len(frame) * vad.speech_frames - pre_roll)
+                last_partial = time.monotonic()
+            elif utterance_start is not None:
+                length = buffer.position - utterance_start
+                if event == 'end' or length >= self.max_utterance_samples:
+                    self._finalize(buffer, utterance_start, buffer.position, speech_end if event == 'end' else arrival)
+                    utterance_start = buffer.position if event != 'end' else None
+                elif self.on_partial and time.monotonic() - last_partial >= self.partial_interval:
+                    self.on_partial(self._transcribe(buffer.read(utterance_start, buffer.position), beam_size=1))
+                    last_partial = time.monotonic()
+
+        if utterance_start is not None:
+            self._finalize(buffer, utterance_start, buffer.position, time.monotonic())
+
+    def _finalize(self, buffer: RingBuffer, start: int, end: int, arrival: float) -> None:
+        text = self._transcribe(buffer.read(start, end), beam_size=5)
+        latency = time.monotonic() - arrival
+        self.latencies.append(latency)
+        if latency > self.latency_target:
+            print(f"Live transcription latency {latency:.2f}s is over the {self.latency_target:.2f}s target")
+        if text and self.on_final:
+            self.on_final(text, start / SAMPLE_RATE, end / SAMPLE_RATE)
+
+    def stop(self) -> None:
+        self._stopped = True
+        if self._source is not None:
+            self._source.stop()
+
+    def latency_report(self) -> dict:
+        """Returns the p50, p95 and max latency of the final results, and the fraction within the target."""
+
+        if not self.latencies:
+            return {'utterances': 0}
+
+        latencies = np.array(self.latencies)
+        return {
+            'utterances': len(latencies),
+            'p50': float(np.percentile(latencies, 50)),
+            'p95': float(np.percentile(latencies, 95)),
+            'max': float(latencies.max()),
+            'target': self.latency_target,
+            'within_target': float(np.mean(latencies <= self.latency_target)),
+        }
@@ -0,0 +1,176 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+import numpy as np
+from faster_whisper import decode_audio
+from DataManager.instrumentation import metrics
+from DataManager.preprocessing import preprocess_audio
+
+SAMPLE_RATE = 16000
+
+
+class StitchedSegment(NamedTuple):
+    start: float
+    end: float
+    text: str
+
+
+def frame_energy(audio: np.ndarray, frame_size: int) -> np.ndarray:
+    """Calculates the RMS energy of consecutive frames of the audio.
+
+    Args:
+        audio (np.ndarray): Mono audio samples.
+        frame_size (int): Number of samples per frame.
+
+    Returns:
+        np.ndarray: One energy value per complete frame.
+    """
+
+    n_frames = len(audio) // frame_size
+    frames = audio[:n_frames * frame_size].reshape(n_frames, frame_size)
+    return np.sqrt(np.mean(np.square(frames), axis=1))
+
+
+def find_cut_points(audio: np.ndarray, window_seconds: float, search_seconds: float = 20.0) -> list[int]:
+    """Finds where to cut the audio into windows of about `window_seconds`, preferring the quietest moment
+    within `search_seconds` of each ideal cut, so words are rarely split in half.
+
+    Args:
+        audio (np.ndarray): Mono audio samples at 16 kHz.
+        window_seconds (float): Target length of each window.
+        search_seconds (float): How far from the ideal cut a silence is looked for.
+
+    Returns:
+        list[int]: Sample positions of the cuts, starting with 0 and ending with the audio length.
+    """
+
+    frame_size = int(0.03 * SAMPLE_RATE)
+    energy = frame_energy(audio, frame_size)
+    # Smooths over ~0.3s so a pause between words wins over a single quiet frame.
+    energy = np.convolve(energy, np.ones(10) / 10, mode='same')
+
+    target = int(window_seconds * SAMPLE_RATE)
+    search = min(int(search_seconds * SAMPLE_RATE), target // 2)
+    cuts = [0]
+    while len(audio) - cuts[-1] > target + search:
+        ideal = cuts[-1] + target
+        low = max(cuts[-1] + search, ideal - search) // frame_size
+        high = min(len(energy), (ideal + search) // frame_size)
+        quietest = low + int(np.argmin(energy[low:high]))
+        cuts.append(quietest * frame_size + frame_size // 2)
+
+    cuts.append(len(audio))
+    return cuts
+
+
+def merge_overlap_text(previous: str, current: str, max_words: int = 12) -> str:
+    """Removes from the start of `current` the words that repeat the end of `previous`.
+
+    Args:
+        previous (str): Text of the last kept segment.
+        current (str): Text of the segment that follows it.
+        max_words (int): Longest overlap looked for, in words.
+
+    Returns:
+        str: `current` without the repeated words.
+    """
+
+    previous_words = previous.split()
+    current_words = current.split()
+    normalize = lambda words: [word.strip('.,!?;:').lower() for word in words]
+
+    for size in range(min(max_words, len(previous_words), len(current_words)), 0, -1):
+        if normalize(previous_words[-size:]) == normalize(current_words[:size]):
+            return ' ' + ' '.join(current_words[size:]) if size < len(current_words) else ''
+    return current
+
+
+def transcribe_window(model, audio: np.ndarray, offset: float, language: str) -> list[StitchedSegment]:
+    """Transcribes one window, returning its segments with absolute timestamps."""
+
+    segments, _ = model.transcribe(audio, language=language)
+    return [StitchedSegment(segment.start + offset, segment.end + offset, segment.text) for segment in segments]
+
+
+def transcribe_long_audio(model, audio: np.ndarray, workers: int, window_seconds: float = 300.0, overlap_seconds: float = 2.0) -> tuple[list[StitchedSegment], str]:
+    """Splits a long recording at silences, transcribes the windows concurrently and stitches them back.
+
+    Each window is extended by `overlap_seconds` on both sides, so a word near a cut is heard whole by one of them.
+    A segment is kept only by the window that owns its midpoint, and any words still repeated across the cut are removed.
+
+    Args:
+        model (WhisperModel): Model loaded with `num_workers` equal to `workers`.
+        audio (np.ndarray): Mono audio samples at 16 kHz.
+        workers (int): How many windows are transcribed at the same time.
+        window_seconds (float): Target length of each window.
+        overlap_seconds (float): How much each window is extended past its cuts.
+
+    Returns:
+        tuple[list[StitchedSegment], str]: The merged segments, in order, and the detected language.
+    """
+
+    # Detects the language once, so every window is decoded the same way.
+    _, info = model.transcribe(audio[:30 * SAMPLE_RATE])
+    language = info.language
+
+    cuts = find_cut_points(audio, window_seconds)
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+    windows = []
+    for cut_start, cut_end in zip(cuts, cuts[1:]):
+        start = max(0, cut_start - overlap)
+        end = min(len(audio), cut_end + overlap)
+        windows.append((start, cut_start, cut_end, end))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(transcribe_window, model, audio[start:end], start / SAMPLE_RATE, language) for start, _, _, end in windows]
+        results = [future.result() for future in futures]
+
+    merged = []
+    for (_, cut_start, cut_end, _), segments in zip(windows, results):
+        owned_start, owned_end = cut_start / SAMPLE_RATE, cut_end / SAMPLE_RATE
+        for segment in segments:
+            middle = (segment.start + segment.end) / 2
+            if not owned_start <= middle < owned_end:
+                continue
+
+            text = segment.text
+            if merged and segment.start < owned_start + overlap_seconds:
+                text = merge_overlap_text(merged[-1].text, text)
+            if text.strip():
+                merged.append(StitchedSegment(segment.start, segment.end, text))
+
+    return merged, language
+
+
+def transcribe_long_file(model, audio_path: str, text_path: str, workers: int, window_seconds: float = 300.0, overlap_seconds: float = 2.0, preprocess: bool = False) -> dict:
+    """Transcribes a long audio file with `transcribe_long_audio` and writes the transcript to `text_path`.
+    With `preprocess`, silences are compacted first and the segment times mapped back to the original file.
+
+    Returns:
+        dict: The file `language`, audio `duration` and the `processing_time`, all in seconds.
+    """
+
+    start = time.perf_counter()
+    filename = os.path.basename(audio_path)
+    with metrics.span('transcribe', file=filename):
+        if preprocess:
+            audio, timestamp_map = preprocess_audio(audio_path)
+            segments, language = transcribe_long_audio(model, audio, workers, window_seconds, overlap_seconds)
+            segments = [StitchedSegment(timestamp_map.to_original(s.start), timestamp_map.to_original(s.end), s.text) for s in segments]
+            duration = timestamp_map.original_duration
+        else:
+            with metrics.span('decode', file=filename):
+                audio = decode_audio(audio_path, sampling_rate=SAMPLE_RATE)
+            segments, language = transcribe_long_audio(model, audio, workers, window_seconds, overlap_seconds)
+            duration = len(audio) / SAMPLE_RATE
+
+        with open(text_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(segment.text for segment in segments))
+    metrics.count('audio_seconds', duration)
+
+    return {
+        'language': language,
+        'duration': duration,
+        'processing_time': time.perf_counter() - start,
+    }
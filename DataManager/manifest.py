@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """Calculates the SHA-256 of a file, reading it in blocks.
+
+    Args:
+        path (str): Path of the file.
+        block_size (int): How many bytes are read at a time.
+
+    Returns:
+        str: The hex digest of the file content.
+    """
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest():
+    """Records which audio files of a project were transcribed, and how.
+
+    Every entry is keyed by the audio filename and stores the content hash, size and mtime of the audio,
+    the model and compute type used, and the name, hash, size and mtime of the resulting transcript.
+    """
+
+    def __init__(self, project_path: str):
+        """Loads the manifest of a project. If it doesn't exist yet, it starts empty.
+
+        Args:
+            project_path (str): The root folder of the project.
+        """
+
+        self.path = os.path.join(project_path, 'manifest.json')
+        self.entries = {}
+        self.load()
+
+    def load(self) -> None:
+        """Loads the manifest file from disk."""
+
+        if os.path.isfile(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def save(self) -> None:
+        """Writes the manifest to disk. It writes to a temporary file first, so a crash never leaves it half written."""
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def needs_transcription(self, audio_path: str, transcript_path: str, model: str, compute_type: str) -> bool:
+        """Checks if an audio file is new, changed, or was transcribed with other settings.
+
+        The audio and the transcript are only hashed when their size is the same but their mtime changed,
+        so unchanged files cost a `stat` each.
+
+        Args:
+            audio_path (str): Path of the audio file.
+            transcript_path (str): Path where its transcript is written.
+            model (str): Model that would be used now.
+            compute_type (str): Compute type that would be used now.
+
+        Returns:
+            bool: True if the file has to be transcribed. False otherwise.
+        """
+
+        entry = self.entries.get(os.path.basename(audio_path))
+        if entry is None:
+            return True
+
+        if entry['model'] != model or entry['compute_type'] != compute_type:
+            return True
+
+        if not os.path.isfile(transcript_path):
+            return True
+
+        transcript_stat = os.stat(transcript_path)
+        if 'transcript_size' in entry and transcript_stat.st_size != entry['transcript_size']:
+            return True
+
+        changed = False
+        if transcript_stat.st_mtime != entry.get('transcript_mtime'):
+            # Also the first check of an entry recorded before transcripts had their size and mtime.
+            if file_hash(transcript_path) != entry['transcript_hash']:
+                return True
+            entry['transcript_size'] = transcript_stat.st_size
+            entry['transcript_mtime'] = transcript_stat.st_mtime
+            changed = True
+
+        stat = os.stat(audio_path)
+        if stat.st_size != entry['size']:
+            return True
+
+        if stat.st_mtime != entry['mtime']:
+            if file_hash(audio_path) != entry['hash']:
+                return True
+            # Same content, just touched. Remember the new mtime so the next check is a stat again.
+            entry['mtime'] = stat.st_mtime
+            changed = True
+
+        if changed:
+            self.save()
+        return False
+
+    def update(self, audio_path: str, transcript_path: str, model: str, compute_type: str) -> None:
+        """Records that an audio file was transcribed and saves the manifest.
+
+        Args:
+            audio_path (str): Path of the audio file.
+            transcript_path (str): Path of its transcript.
+            model (str): Model used.
+            compute_type (str): Compute type used.
+        """
+
+        stat = os.stat(audio_path)
+        transcript_stat = os.stat(transcript_path)
+        self.entries[os.path.basename(audio_path)] = {
+            'hash': file_hash(audio_path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'model': model,
+            'compute_type': compute_type,
+            'transcript': os.path.basename(transcript_path),
+            'transcript_hash': file_hash(transcript_path),
+            'transcript_size': transcript_stat.st_size,
+            'transcript_mtime': transcript_stat.st_mtime,
+        }
+        self.save()
+
+    def update_stream(self, name: str, transcript_path: str, model: str, compute_type: str, url: str, media_id: str) -> None:
+        """Records an online media that was transcribed straight from its stream, without a local audio file.
+
+        Args:
+            name (str): Entry name, like `<title>.stream`.
+            transcript_path (str): Path of its transcript.
+            model (str): Model used.
+            compute_type (str): Compute type used.
+            url (str): The page the media came from.
+            media_id (str): The extractor ID of the media, like the YouTube video ID.
+        """
+
+        self.entries[name] = {
+            'url': url,
+            'media_id': media_id,
+            'model': model,
+            'compute_type': compute_type,
+            'transcript': os.path.basename(transcript_path),
+            'transcript_hash': file_hash(transcript_path),
+            'transcript_size': os.path.getsize(transcript_path),
+            'transcript_mtime': os.path.getmtime(transcript_path),
+        }
+        self.save()
+
+    def has_media(self, media_id: str) -> bool:
+        """Checks if an online media with this extractor ID was already added to the project."""
+
+        return any(entry.get('media_id') == media_id for entry in self.entries.values())
+
+    def remove(self, audio_filename: str) -> None:
+        """Removes an audio file from the manifest and saves it.
+
+        Args:
+            audio_filename (str): The filename of the audio file.
+        """
+
+        if self.entries.pop(audio_filename, None) is not None:
+            self.save()
+
+    def prune(self, existing_filenames: list[str]) -> None:
+        """Removes the entries of audio files that are not in the project anymore.
+
+        Args:
+            existing_filenames (list[str]): The audio filenames still in the project.
+        """
+
+        existing = set(existing_filenames)
+        # Streamed media has no local file, so only its transcript tells if it's still in the project.
+        removed = [name for name, entry in self.entries.items() if name not in existing and 'url' not in entry]
+        for name in removed:
+            del self.entries[name]
+
+        if removed:
+            self.save()
@@ -0,0 +1,65 @@
+import av
+import numpy as np
+from DataManager.instrumentation import metrics
+
+SAMPLE_RATE = 16000
+
+# Containers kept as they are downloaded, without re-encoding.
+AUDIO_EXTENSIONS = ['*.m4a', '*.mp3', '*.wav', '*.flac', '*.mp4', '*.wma', '*.aac', '*.ogg', '*.opus', '*.webm', '*.mka']
+
+
+def decode_to_pcm(source: str, headers: dict | None = None, max_seconds: float | None = None) -> np.ndarray:
+    """Decodes the first audio stream of a file or URL straight to 16 kHz mono samples, in memory.
+
+    A URL is read over the network as it's decoded, so nothing is written to disk and nothing is re-encoded.
+
+    Args:
+        source (str): Path or URL of the media.
+        headers (dict | None): HTTP headers sent with the request, like the ones yt_dlp gives for a format.
+        max_seconds (float | None): Stops decoding after this much audio. The whole stream if None.
+
+    Returns:
+        np.ndarray: The samples, as float32 between -1 and 1.
+    """
+
+    options = {}
+    if headers:
+        options['headers'] = ''.join(f"{key}: {value}\r\n" for key, value in headers.items())
+
+    resampler = av.audio.resampler.AudioResampler(format='s16', layout='mono', rate=SAMPLE_RATE)
+    max_samples = int(max_seconds * SAMPLE_RATE) if max_seconds is not None else None
+    chunks = []
+    samples = 0
+    with metrics.span('decode', source=source), av.open(source, mode='r', options=options, metadata_errors='ignore') as container:
+        stream = container.streams.audio[0]
+        for frame in container.decode(stream):
+            frame.pts = None
+            for resampled in resampler.resample(frame):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+                samples += len(chunks[-1])
+            if max_samples is not None and samples >= max_samples:
+                break
+
+        for resampled in resampler.resample(None):
+            chunks.append(resampled.to_ndarray().reshape(-1))
+
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+
+    # Kept as int16 while decoding, which is half the memory of float32 for long recordings.
+    return np.concatenate(chunks)[:max_samples].astype(np.float32) / 32768.0
+
+
+def select_audio_stream(info: dict) -> tuple[str, dict]:
+    """Gets the URL and HTTP headers of the audio format yt_dlp selected for a video.
+
+    Args:
+        info (dict): The result of `YoutubeDL.extract_info` with `download=False`.
+
+    Returns:
+        tuple[str, dict]: The stream URL and its headers.
+    """
+
+    formats = info.get('requested_formats') or [info]
+    audio_format = next((f for f in formats if f.get('acodec') not in (None, 'none')), formats[0])
+    return audio_format['url'], audio_format.get('http_headers', {})
@@ -0,0 +1,179 @@
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from faster_whisper import WhisperModel
+
+# Approximate number of parameters, in millions, for each whisper size.
+MODEL_PARAMETERS = {
+    "tiny": 39,
+    "base": 74,
+    "small": 244,
+    "medium": 769,
+    "large": 1550,
+    "distil-large": 756,
+}
+
+# Bytes used per parameter once CTranslate2 converts the weights.
+COMPUTE_TYPE_BYTES = {
+    "default": 4,
+    "int8": 1,
+    "int8_float32": 1,
+    "int8_float16": 1,
+    "int8_bfloat16": 1,
+    "int16": 2,
+    "float16": 2,
+    "bfloat16": 2,
+    "float32": 4,
+}
+
+
+def estimate_model_memory(model: str, compute_type: str) -> int:
+    """Estimates how much memory a loaded model takes, in megabytes.
+
+    Args:
+        model (str): Model size, like `medium`, `large-v3` or `small.en`.
+        compute_type (str): CTranslate2 compute type.
+
+    Returns:
+        int: The estimated size in megabytes.
+    """
+
+    base_name = model.split(".")[0]
+    params = MODEL_PARAMETERS.get(base_name)
+    if params is None:
+        params = next((value for key, value in MODEL_PARAMETERS.items() if base_name.startswith(key)), MODEL_PARAMETERS["large"])
+
+    return params * COMPUTE_TYPE_BYTES.get(compute_type, 4)
+
+
+class ModelRegistry():
+    """Keeps loaded `WhisperModel` instances so every project in the process shares them. faster_whisper is only
+    imported when the first model is loaded.
+
+    Models are keyed by (model, compute_type, cpu_threads, download_root, num_workers) and evicted in
+    least-recently-used order when the estimated memory of the loaded models goes over `max_memory_mb`.
+    """
+
+    def __init__(self, max_memory_mb: int = 8192):
+        self.max_memory_mb = max_memory_mb
+        self._models: OrderedDict[tuple, 'WhisperModel'] = OrderedDict()
+        self._sizes: dict[tuple, int] = {}
+        self._lock = threading.RLock()
+        self._key_locks: dict[tuple, threading.Lock] = {}
+
+    def get(self, model: str, compute_type: str, cpu_threads: int, download_root: str, num_workers: int = 1) -> 'WhisperModel':
+        """Returns a loaded model, loading it only if no other caller did it before.
+
+        Args:
+            model (str): Model size or path.
+            compute_type (str): CTranslate2 compute type.
+            cpu_threads (int): Number of threads used by the model.
+            download_root (str): Folder where the models are downloaded to.
+            num_workers (int): How many transcriptions the model can run at the same time, each one using `cpu_threads`.
+
+        Returns:
+            WhisperModel: The shared model instance.
+        """
+
+        key = (model, compute_type, cpu_threads, download_root, num_workers)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given key, the others wait for it instead of loading a copy.
+        with key_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key]
+
+            size = estimate_model_memory(model, compute_type)
+            with self._lock:
+                self._evict(size)
+
+            # Imported here, as it brings CTranslate2 and takes longer than showing the app.
+            from faster_whisper import WhisperModel
+
+            print(f"Loading model {model} ({compute_type}, {num_workers} x {cpu_threads} threads)")
+            whisper = WhisperModel(model_size_or_path=model,
+                                   compute_type=compute_type,
+                                   cpu_threads=cpu_threads,
+                                   num_workers=num_workers,
+                                   download_root=download_root)
+
+            with self._lock:
+                self._models[key] = whisper
+                self._sizes[key] = size
+                self._key_locks.pop(key, None)
+            return whisper
+
+    def warm_up(self, model: str, compute_type: str, cpu_threads: int, download_root: str, background: bool = True,
+                num_workers: int = 1) -> threading.Thread | None:
+        """Loads a model ahead of time, so the first transcription doesn't pay for it.
+
+        Args:
+            model (str): Model size or path.
+            compute_type (str): CTranslate2 compute type.
+            cpu_threads (int): Number of threads used by the model.
+            download_root (str): Folder where the models are downloaded to.
+            background (bool): If True, loads the model in a daemon thread and returns it.
+            num_workers (int): How many transcriptions the model can run at the same time, each one using `cpu_threads`.
+
+        Returns:
+            threading.Thread | None: The loading thread, if `background` is True.
+        """
+
+        if not background:
+            self.get(model, compute_type, cpu_threads, download_root, num_workers)
+            return None
+
+        thread = threading.Thread(target=self.get, args=(model, compute_type, cpu_threads, download_root, num_workers), daemon=True)
+        thread.start()
+        return thread
+
+    def unload(self, model: str, compute_type: str, cpu_threads: int, download_root: str, num_workers: int = 1) -> bool:
+        """Removes a model from the registry.
+
+        Returns:
+            bool: True if the model was loaded. False otherwise.
+        """
+
+        key = (model, compute_type, cpu_threads, download_root, num_workers)
+        with self._lock:
+            self._sizes.pop(key, None)
+            return self._models.pop(key, None) is not None
+
+    def unload_all(self) -> None:
+        """Removes every model from the registry."""
+
+        with self._lock:
+            self._models.clear()
+            self._sizes.clear()
+
+    def loaded_models(self) -> list[tuple]:
+        """Returns the keys of the loaded models, from least to most recently used."""
+
+        with self._lock:
+            return list(self._models.keys())
+
+    def memory_usage(self) -> int:
+        """Returns the estimated memory used by the loaded models, in megabytes."""
+
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def _evict(self, needed_mb: int) -> None:
+        """Unloads the least recently used models until `needed_mb` fits under the memory cap.
+        A model bigger than the cap is still loaded, after evicting everything else."""
+
+        while self._models and self.memory_usage() + needed_mb > self.max_memory_mb:
+            key, _ = self._models.popitem(last=False)
+            self._sizes.pop(key, None)
+            print(f"Unloading model {key[0]} ({key[1]}) to free memory")
+
+
+model_registry = ModelRegistry()
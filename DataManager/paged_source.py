@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from typing import Callable
+
+
+class PagedSource():
+    """Rows of a paged query, like `Catalog.list_files`, fetched a page at a time the first time one of them is asked for.
+
+    Meant to back virtual list controls: only the pages on screen, and a few around them, are kept, so the list
+    costs the same with ten rows or a hundred thousand. `refresh` fetches the visible rows again and tells which
+    ones changed, so a control can redraw just those instead of rebuilding itself.
+    """
+
+    def __init__(self, fetch: Callable[[str, int, int], list[dict]], count: Callable[[str], int], page_size: int = 100, max_pages: int = 20):
+        """
+        Args:
+            fetch (Callable[[str, int, int], list[dict]]): Returns the rows matching a search text, from an offset, up to a limit.
+            count (Callable[[str], int]): Returns how many rows match a search text.
+            page_size (int): Rows fetched at a time.
+            max_pages (int): Pages kept, least recently used ones dropped first.
+        """
+
+        self.fetch = fetch
+        self.count = count
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.search = ''
+        self._count = None
+        self._pages: OrderedDict[int, list[dict]] = OrderedDict()
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = self.count(self.search)
+        return self._count
+
+    def set_search(self, text: str) -> None:
+        """Filters the rows by a search text, as the query understands it. Everything is fetched again."""
+
+        self.search = text
+        self._pages.clear()
+        self._count = None
+
+    def row(self, index: int) -> dict | None:
+        """Returns a row, fetching its page if it isn't kept. None if the index is past the end."""
+
+        page, position = divmod(index, self.page_size)
+        if page in self._pages:
+            self._pages.move_to_end(page)
+        else:
+            self._pages[page] = self.fetch(self.search, page * self.page_size, self.page_size)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+        rows = self._pages[page]
+        return rows[position] if position < len(rows) else None
+
+    def _kept_row(self, index: int) -> dict | None:
+        page, position = divmod(index, self.page_size)
+        rows = self._pages.get(page)
+        return rows[position] if rows is not None and position < len(rows) else None
+
+    def refresh(self, first: int, last: int) -> tuple[int, list[int]]:
+        """Fetches the rows again, for when the data changed.
+
+        Args:
+            first (int): First visible row.
+            last (int): Last visible row.
+
+        Returns:
+            tuple[int, list[int]]: The new number of rows, and the visible rows that are different now.
+                Rows out of sight are fetched again when they are shown.
+        """
+
+        old = {index: self._kept_row(index) for index in range(first, last + 1)}
+        self._pages.clear()
+        self._count = None
+        count = len(self)
+        changed = [index for index in range(first, last + 1) if (self.row(index) if index < count else None) != old[index]]
+        return count, changed
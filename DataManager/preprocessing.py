@@ -0,0 +1,88 @@
+import os
+import numpy as np
+import librosa
+from faster_whisper import decode_audio
+from DataManager.instrumentation import metrics
+
+SAMPLE_RATE = 16000
+
+
+class TimestampMap():
+    """Maps times in the compacted audio back to times in the original file.
+
+    The compacted audio is a sequence of kept regions. Each one starts at `compact_starts[i]` in the compacted
+    audio and at `original_starts[i]` in the original, and inside a region time runs at the same speed in both.
+    """
+
+    def __init__(self, compact_starts: np.ndarray, original_starts: np.ndarray, original_duration: float):
+        self.compact_starts = compact_starts
+        self.original_starts = original_starts
+        self.original_duration = original_duration
+
+    def to_original(self, seconds: float) -> float:
+        """Converts a time in the compacted audio to the same moment in the original file."""
+
+        if len(self.compact_starts) == 0:
+            return seconds
+
+        i = max(0, int(np.searchsorted(self.compact_starts, seconds, side='right')) - 1)
+        return float(self.original_starts[i] + seconds - self.compact_starts[i])
+
+
+def load_mono_16k(path: str) -> np.ndarray:
+    """Loads an audio file downmixed to mono and resampled to 16 kHz. Falls back to PyAV for containers librosa can't read."""
+
+    with metrics.span('decode', file=os.path.basename(path)):
+        try:
+            audio, _ = librosa.load(path, sr=SAMPLE_RATE, mono=True)
+            return audio
+        except Exception:
+            return decode_audio(path, sampling_rate=SAMPLE_RATE)
+
+
+def compact_silences(audio: np.ndarray, top_db: float = 35.0, min_silence: float = 0.5, keep_silence: float = 0.2) -> tuple[np.ndarray, TimestampMap]:
+    """Removes the long silences of an audio, keeping a little of each so words aren't glued together.
+
+    Args:
+        audio (np.ndarray): Mono audio samples at 16 kHz.
+        top_db (float): How far below the loudest part, in dB, audio counts as silence.
+        min_silence (float): Silences shorter than this, in seconds, are kept whole.
+        keep_silence (float): How much of each removed silence is kept on both sides, in seconds.
+
+    Returns:
+        tuple[np.ndarray, TimestampMap]: The compacted audio and the map back to the original times.
+    """
+
+    duration = len(audio) / SAMPLE_RATE
+    intervals = librosa.effects.split(audio, top_db=top_db, frame_length=1024, hop_length=256)
+    if len(intervals) == 0:
+        return np.zeros(0, dtype=np.float32), TimestampMap(np.zeros(0), np.zeros(0), duration)
+
+    pad = int(keep_silence * SAMPLE_RATE)
+    starts = np.maximum(intervals[:, 0] - pad, 0)
+    ends = np.minimum(intervals[:, 1] + pad, len(audio))
+
+    # Joins the regions separated by a gap too short to be worth removing.
+    gaps = starts[1:] - ends[:-1]
+    breaks = np.flatnonzero(gaps >= int(min_silence * SAMPLE_RATE))
+    region_starts = np.concatenate(([starts[0]], starts[breaks + 1]))
+    region_ends = np.concatenate((ends[breaks], [ends[-1]]))
+
+    lengths = region_ends - region_starts
+    compact_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) / SAMPLE_RATE
+    compacted = np.concatenate([audio[start:end] for start, end in zip(region_starts, region_ends)])
+    return compacted.astype(np.float32), TimestampMap(compact_starts, region_starts / SAMPLE_RATE, duration)
+
+
+def preprocess_audio(path: str, top_db: float = 35.0, min_silence: float = 0.5, keep_silence: float = 0.2) -> tuple[np.ndarray, TimestampMap]:
+    """Loads an audio file as 16 kHz mono and compacts its silences, ready for whisper.
+
+    Returns:
+        tuple[np.ndarray, TimestampMap]: The audio to be transcribed and the map back to the original times.
+    """
+
+    audio = load_mono_16k(path)
+    compacted, timestamp_map = compact_silences(audio, top_db, min_silence, keep_silence)
+    removed = timestamp_map.original_duration - len(compacted) / SAMPLE_RATE
+    print(f"Pre-processing removed {removed:.1f}s of silence from {timestamp_map.original_duration:.1f}s")
+    return compacted, timestamp_map
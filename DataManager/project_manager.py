@@ -1,13 +1,30 @@
 import fnmatch
+import hashlib
 import json
 import os
-import io
-from langchain.chains import RetrievalQA
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from faster_whisper import WhisperModel
+import shutil
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Callable
 import yt_dlp as yt
+from DataManager.batched_transcriber import BatchedTranscriber
+from DataManager.catalog import get_catalog
+from DataManager.download_manager import DownloadManager, DownloadProgress, remove_from_archive
+from DataManager.embedding_cache import get_default_cache
+from DataManager.instrumentation import MemorySampler, metrics
+from DataManager.job_scheduler import Job, JobContext
+from DataManager.manifest import Manifest
+from DataManager.live_transcriber import LiveTranscriber
+from DataManager.model_registry import model_registry
+from DataManager.streaming import StreamingChunker, StreamingIndexer
+from DataManager.long_audio import transcribe_long_audio, transcribe_long_file
+from DataManager.media import AUDIO_EXTENSIONS, SAMPLE_RATE, decode_to_pcm, select_audio_stream
+from DataManager.settings import get_long_file_workers, get_model_settings, get_transcription_settings
+from DataManager.transcription_pool import TranscriptionPool, get_audio_duration, transcribe_to_file
+from DataManager.vector_index import VectorIndex
+
 
 class ProjectManager():
     def __init__(self, app_path: str, project_name: str):
@@ -21,20 +38,30 @@ class ProjectManager():
         self.app_data = {}
         self.load_configuration(app_path)
         self.project_name = project_name
-        self.project_path = os.path.join(app_path, self.project_name)
+        self.project_path = os.path.join(app_path, 'projects', self.project_name)
         self.models_path = os.path.join(app_path, 'models')
         self.audio_path = os.path.join(self.project_path, 'audios')
         self.text_path = os.path.join(self.project_path, 'texts')
         self.db_path = os.path.join(self.project_path, 'databases')
         self.project_settings = {}
+        self.manifest = Manifest(self.project_path)
+        self.catalog = get_catalog(app_path)
+        self.last_transcription_report = {}
+        self.vector_index = None
+        # Transcription, indexing and live sessions change the same index files, so they take turns.
+        self.index_lock = threading.Lock()
+        # The original audio stream is kept as it is (m4a/opus/webm), whisper decodes it directly.
         self.ydl_opts = {
-            "format": "m4a/bestaudio/best",
+            "format": "bestaudio[ext=m4a]/bestaudio/best",
             "noplaylist": True,
             "outtmpl": f"{self.audio_path}/%(title)s.%(ext)s",
-            "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": "mp3"}],
-            "progress_hooks": [self.get_audio_download_status],
             }
         
+        self._load_project_file()
+        if not self.catalog.project_exists(self.project_name):
+            self.catalog.add_project({**self.project_settings, 'name': self.project_name, 'path': self.project_path})
+        # Files transcribed before the catalog existed only have their manifest entry.
+        self.catalog.backfill_files(self.project_name, self.manifest.entries)
         self.process_files()
 
     def load_configuration(self, app_path: str) -> None:
@@ -54,9 +81,14 @@ class ProjectManager():
         text_file = os.path.join(self.project_path, 'text')
         text_file = os.path.join(self.project_path, 'text')
 
-    def get_audio_download_status(self, d):
-        if d['status'] == 'downloading':
-            print(d['eta'])
+    def get_audio_download_status(self, progress: DownloadProgress) -> None:
+        if progress.status == 'downloading':
+            fraction = f"{progress.fraction:.0%}" if progress.fraction is not None else '?'
+            print(f"[{progress.job_id}] {fraction} eta {progress.eta}")
+        elif progress.status == 'error':
+            print(f"[{progress.job_id}] failed: {progress.error}")
+        else:
+            print(f"[{progress.job_id}] {progress.status} {progress.title}")
 
     def get_audio_from_video(self):
         pass
@@ -65,73 +97,513 @@ class ProjectManager():
         pass
 
     def delete_audio_text_files(self, audio_filaneme: str) -> None:
-        """Deletes a corresponding audio and text file.
+        """Deletes a corresponding audio and text file, and removes the text chunks from the vector store.
+        A downloaded file is also removed from the download archive, so it can be downloaded again.
 
         Args:
             audio_filaneme (str): The filename for the audio file.
-        """        
+        """
+
+        text_filename = f"{os.path.splitext(audio_filaneme)[0]}.txt"
+        for path in [os.path.join(self.audio_path, audio_filaneme), os.path.join(self.text_path, text_filename)]:
+            if os.path.isfile(path):
+                os.remove(path)
+
+        # Forgotten by the download archive too, or the same media could never be downloaded again.
+        row = self.catalog.get_file(self.project_name, audio_filaneme)
+        media_id = (row or {}).get('media_id') or self.manifest.entries.get(audio_filaneme, {}).get('media_id')
+        if media_id:
+            remove_from_archive(os.path.join(self.project_path, 'downloads.txt'), [media_id])
+
+        self.manifest.remove(audio_filaneme)
+        self.catalog.remove_files(self.project_name, [audio_filaneme])
+        vector_index = self.get_vector_index()
+        with self.index_lock:
+            if vector_index.remove_source(text_filename):
+                vector_index.save()
 
     def get_audio_online(self, url: str) -> str:
-        """Extracts the audio from an online media, given the `url`."""
+        """Extracts the audio from an online media, given the `url`.
+
+        Returns:
+            str: The filename of the downloaded audio, without extension. Empty if nothing was downloaded.
+        """
+
+        finished = [job for job in self.download_online(url) if job.status == 'finished']
+        if not finished:
+            return ''
+        return os.path.splitext(os.path.basename(finished[0].filename))[0]
+
+    def get_download_manager(self, on_progress=None) -> DownloadManager:
+        """Returns a download manager for this project, which skips the media already in it.
+
+        Args:
+            on_progress (Callable[[DownloadProgress], None] | None): Called on every progress update.
+                Defaults to printing it.
+        """
+
+        return DownloadManager(self.ydl_opts,
+                               os.path.join(self.project_path, 'downloads.txt'),
+                               max_concurrent=self.app_data['user_config'].get('concurrent_downloads', 4),
+                               is_known=self.manifest.has_media,
+                               on_progress=on_progress or self.get_audio_download_status)
+
+    def download_online(self, url: str, on_progress=None) -> list[DownloadProgress]:
+        """Downloads the audio of a video, playlist or channel to `audios`, several videos at a time.
+        Videos already in the project are skipped, and interrupted downloads are resumed.
+
+        Args:
+            url (str): A video, playlist or channel URL.
+            on_progress (Callable[[DownloadProgress], None] | None): Called on every progress update.
+                Defaults to printing it.
+
+        Returns:
+            list[DownloadProgress]: The final state of each video.
+        """
+
+        manager = self.get_download_manager(on_progress)
+        with metrics.span('download', url=url) as labels:
+            jobs = manager.download(url)
+            labels['files'] = sum(job.status == 'finished' for job in jobs)
+
+        with self.catalog.transaction():
+            for job in jobs:
+                if job.status == 'finished':
+                    self.catalog.record_file(self.project_name, os.path.basename(job.filename), source_url=job.url, media_id=job.job_id, status='downloaded')
+        return jobs
+
+    def import_files(self, paths: list[str], cancel: threading.Event | None = None) -> list[str]:
+        """Copies media files into `audios`. Each copy is written to a `.part` file and moved in place once it's
+        complete, so a transcription never reads a partial file.
+
+        Args:
+            paths (list[str]): The files to copy. The ones that don't exist anymore are skipped.
+            cancel (threading.Event | None): When set, the files not copied yet are left out.
+
+        Returns:
+            list[str]: The paths of the copies.
+        """
 
+        os.makedirs(self.audio_path, exist_ok=True)
+        copied = []
+        for path in paths:
+            if cancel is not None and cancel.is_set():
+                break
+            if not os.path.isfile(path):
+                print(f"Skipping missing file: {path}")
+                continue
+            target = os.path.join(self.audio_path, os.path.basename(path))
+            shutil.copy2(path, f"{target}.part")
+            os.replace(f"{target}.part", target)
+            self.catalog.record_file(self.project_name, os.path.basename(target))
+            copied.append(target)
+        return copied
+
+    def ingest_online(self, url: str, on_progress=None, cancel: threading.Event | None = None, lock=None) -> list[str]:
+        """Adds the media of a video, playlist or channel to the project and transcribes it.
+
+        If the project setting `keep_original_media` is True, the original audio streams are downloaded to `audios`
+        and transcribed from there. Otherwise each one is decoded straight from the network to 16 kHz PCM in memory,
+        so nothing is re-encoded or written to disk besides the transcript.
+
+        Args:
+            url (str): A video, playlist or channel URL.
+            on_progress (Callable[[DownloadProgress], None] | None): Called when each media starts and ends.
+                Defaults to printing it.
+            cancel (threading.Event | None): When set, the media not started yet are left out.
+            lock (threading.Lock | None): Held while transcribing and indexing, which change the same files as
+                `process_audios` and `build_vector_store`. Decoding runs outside of it.
+
+        Returns:
+            list[str]: The names of the media added, without extension. Media already in the project is skipped.
+        """
+
+        lock = lock or nullcontext()
+        on_progress = on_progress or self.get_audio_download_status
+        if self.project_settings.get('keep_original_media', False):
+            jobs = self.download_online(url, on_progress)
+            with lock:
+                self.process_audios(cancel)
+            return [os.path.splitext(os.path.basename(job.filename))[0] for job in jobs if job.status == 'finished']
+
+        manager = self.get_download_manager(on_progress)
         try:
-            yt_handler = yt.YoutubeDL(self.ydl_opts)
+            videos = manager.expand(url)
+        except yt.utils.DownloadError as e:
+            on_progress(DownloadProgress(job_id=url, url=url, status='error', error=str(e)))
+            return []
+
+        added = []
+        for video in videos:
+            if cancel is not None and cancel.is_set():
+                break
+            progress = DownloadProgress(job_id=video['id'] or video['url'], url=video['url'], title=video['title'])
+            if video['id'] and self.manifest.has_media(video['id']):
+                progress.status = 'skipped'
+                on_progress(progress)
+                continue
+
+            progress.status = 'downloading'
+            on_progress(progress)
+            try:
+                progress.filename = self._ingest_stream(video['url'], lock)
+                progress.status = 'finished' if progress.filename else 'skipped'
+            except (yt.utils.DownloadError, OSError) as e:
+                progress.status = 'error'
+                progress.error = str(e)
+            on_progress(progress)
+            if progress.status == 'finished':
+                added.append(progress.filename)
+
+        if added:
+            with lock:
+                self.build_vector_store()
+        return added
+
+    def _ingest_stream(self, url: str, lock) -> str:
+        """Decodes and transcribes one online media in memory, for `ingest_online`.
+
+        Returns:
+            str: The name of the media, without extension. Empty if it was already in the project.
+        """
+
+        with yt.YoutubeDL({**self.ydl_opts, 'quiet': True}) as yt_handler:
             info = yt_handler.extract_info(url, download=False)
-            file_path = yt_handler.prepare_filename(info)
-            filename_ext = os.path.basename(file_path)
-            filename = os.path.splitext(filename_ext)[0]
-            yt_handler.process_info(info)
-            print('filename is ', filename)
-            return filename
-        except:
+            filename = os.path.splitext(os.path.basename(yt_handler.prepare_filename(info)))[0]
+
+        if self.manifest.has_media(info['id']):
+            print(f"{filename} is already in the project")
             return ''
 
+        stream_url, headers = select_audio_stream(info)
+        audio = decode_to_pcm(stream_url, headers)
+
+        user_config = self.app_data['user_config']
+        text_path = os.path.join(self.text_path, f"{filename}.txt")
+        with lock:
+            start = time.perf_counter()
+            if len(audio) / SAMPLE_RATE > user_config.get('long_file_seconds', 1800):
+                long_workers = get_long_file_workers(user_config)
+                segments, language = transcribe_long_audio(self.get_model(long_workers), audio, long_workers)
+                with open(text_path, 'w', encoding='utf-8') as f:
+                    f.write(''.join(segment.text for segment in segments))
+            else:
+                indexer = StreamingIndexer(self.get_vector_index())
+                try:
+                    language = transcribe_to_file(self.get_model(), audio, text_path, indexer)['language']
+                finally:
+                    indexer.close()
+
+            model_name = self.get_model_name()
+            compute_type = self.get_transcription_settings(model_name)[0]
+            self.manifest.update_stream(f"{filename}.stream", text_path, model_name, compute_type, url, info['id'])
+            entry = self.manifest.entries[f"{filename}.stream"]
+            self.catalog.record_file(self.project_name, f"{filename}.stream", source_url=url, media_id=info['id'], duration=len(audio) / SAMPLE_RATE,
+                                     language=language or '', model=model_name, compute_type=compute_type, processing_seconds=time.perf_counter() - start,
+                                     transcript=entry['transcript'], transcript_hash=entry['transcript_hash'], status='transcribed')
+        return filename
+
+    def get_model(self, workers: int = 1):
+        """Gets the transcription model from the shared registry, loading it only the first time.
+
+        A single transcription, like a batch of short clips or a streamed media, gets all the threads. When `workers`
+        transcriptions run at the same time, like in the file pool or the windows of a long file, the model is loaded
+        with that many workers and the threads are split between them. Each size is kept as a separate model.
+
+        Args:
+            workers (int): How many transcriptions the model runs at the same time.
+
+        Returns:
+            WhisperModel: The model set in the user configuration.
+        """
+
+        user_config = self.app_data['user_config']
+        model_registry.max_memory_mb = user_config.get('models_memory_mb', model_registry.max_memory_mb)
+        model_name, compute_type, cpu_threads, workers = get_model_settings(self.app_data, self.get_model_name(), workers)
+        return model_registry.get(model_name, compute_type, cpu_threads, self.models_path, num_workers=workers)
+
+    def get_model_name(self) -> str:
+        """Returns the project default transformer, or the one in the user configuration if the project has none."""
+
+        return self.project_settings.get('transformer') or self.app_data['user_config']['model']
 
-    def process_audios(self) -> bool:
-        exts = ['*.m4a', '*.mp3', '*.wav', '*.flac', '*.mp4', '*.wma', '*.aac', '*.ogg']
+    def get_transcription_settings(self, model: str) -> tuple[str, int]:
+        """Gets the compute type and number of threads for a model (see `DataManager.settings.get_transcription_settings`).
 
-        print(os.listdir(self.audio_path))
+        Args:
+            model (str): The model size.
+
+        Returns:
+            tuple[str, int]: The compute type and the number of threads.
+        """
+
+        return get_transcription_settings(self.app_data, model)
+
+    def process_audios(self, cancel: threading.Event | None = None) -> bool:
+        """Transcribes the audio files that are new, changed or were transcribed with other settings,
+        then rebuilds the vector store. Unchanged files are skipped, according to the project manifest.
+        With `workers` greater than 1 in the user configuration, that many files are transcribed in parallel.
+        Files longer than `long_file_seconds` are split into windows that are transcribed in parallel instead,
+        and clips shorter than `batch_max_seconds` are transcribed together in batches of `batch_size`.
+
+        The memory is sampled meanwhile, and the metrics are exported if `metrics_path` is set in the user configuration.
+
+        Args:
+            cancel (threading.Event | None): When set, files not started yet are left for the next call.
+
+        Returns:
+            bool: True if any file was transcribed. False otherwise.
+        """
 
-        for filename in os.listdir(self.audio_path):
-            if any(fnmatch.fnmatch(filename, extension) for extension in exts):
-                cur_file = os.path.join(self.audio_path, filename)
-                filename_extensionless = os.path.splitext(filename)[0]
-                print('cur_file is: ', cur_file) 
-                print('is valid: ', os.path.isfile(cur_file))
+        try:
+            with MemorySampler(metrics):
+                return self._transcribe_audios(cancel)
+        finally:
+            self.export_metrics()
 
-                model = WhisperModel(model_size_or_path=self.app_data['user_config']['model'],
-                                     cpu_threads=self.app_data['user_config']['cpu_threads'],
-                                     download_root=self.models_path)
-                segments, info = model.transcribe(cur_file)
-                print("Detected language '%s' with probability %f" % (info.language, info.language_probability))
+    def export_metrics(self) -> bool:
+        """Writes the pipeline metrics to the `metrics_path` of the user configuration, as JSON, or as Prometheus
+        text if it ends with `.prom`. Meant for headless runs.
 
-                buffer = io.StringIO()
-                for segment in segments:
-                    print("[%.2fm -> %.2fm] %s"% (segment.start / 60, segment.end / 60, segment.text))
-                    buffer.write(segment.text)
+        Returns:
+            bool: True if the metrics were written. False if no path is set.
+        """
 
-                transcribed_text_path = os.path.join(self.text_path, f"{filename_extensionless}.txt")
-                with open(transcribed_text_path, 'w', encoding='utf-8') as f:
-                    f.write(buffer.getvalue())
+        path = self.app_data['user_config'].get('metrics_path', '')
+        if not path:
+            return False
+        metrics.export(path)
+        return True
+
+    def _transcribe_audios(self, cancel: threading.Event | None = None) -> bool:
+        """Does the work of `process_audios`."""
+
+        exts = AUDIO_EXTENSIONS
+        model_name = self.get_model_name()
+        compute_type, _ = self.get_transcription_settings(model_name)
+        workers = self.app_data['user_config'].get('workers', 1)
+        preprocess = self.app_data['user_config'].get('preprocess_audio', True)
+
+        audio_files = [filename for filename in os.listdir(self.audio_path) if any(fnmatch.fnmatch(filename, extension) for extension in exts)]
+        self.manifest.prune(audio_files)
+        self.catalog.prune_files(self.project_name, [*audio_files, *self.manifest.entries])
+        with self.catalog.transaction():
+            for filename in audio_files:
+                if self.catalog.get_file(self.project_name, filename) is None:
+                    self.catalog.record_file(self.project_name, filename)
+
+        pending = []
+        for filename in audio_files:
+            cur_file = os.path.join(self.audio_path, filename)
+            transcribed_text_path = os.path.join(self.text_path, f"{os.path.splitext(filename)[0]}.txt")
+            if self.manifest.needs_transcription(cur_file, transcribed_text_path, model_name, compute_type):
+                pending.append((cur_file, transcribed_text_path))
+            else:
+                print('Skipping unchanged file: ', filename)
+
+        if not pending:
+            return False
+
+        # Recordings longer than `long_file_seconds` are split at silences and their windows transcribed in parallel.
+        long_file_seconds = self.app_data['user_config'].get('long_file_seconds', 1800)
+        durations = {cur_file: get_audio_duration(cur_file) for cur_file, _ in pending}
+        long_files = [job for job in pending if durations[job[0]] > long_file_seconds]
+        pending = [job for job in pending if job not in long_files]
+
+        # (audio, error) of the files that couldn't be transcribed, from every path below.
+        self.last_transcription_report = {'failed': []}
+
+        # Short clips are packed together in encoder/decoder batches instead of one transcribe call each.
+        batch_size = self.app_data['user_config'].get('batch_size', 8)
+        short_clips = [job for job in pending if durations[job[0]] <= self.app_data['user_config'].get('batch_max_seconds', 60)]
+        if batch_size > 1 and len(short_clips) > 1:
+            pending = [job for job in pending if job not in short_clips]
+            transcriber = BatchedTranscriber(self.get_model(), batch_size, language=self.project_settings.get('language'), preprocess=preprocess)
+            results = transcriber.transcribe_files([cur_file for cur_file, _ in short_clips], cancel)
+            self.last_transcription_report['failed'].extend(transcriber.last_failed)
+            with self.catalog.transaction():
+                for cur_file, transcribed_text_path in short_clips:
+                    if cur_file not in results:
+                        continue
+                    with open(transcribed_text_path, 'w', encoding='utf-8') as f:
+                        f.write(results[cur_file]['text'])
+                    self._record_transcription(cur_file, transcribed_text_path, model_name, compute_type, results[cur_file])
+            print(f"Transcribed {len(results)} short clips in batches of {batch_size}")
+
+        if long_files:
+            long_workers = get_long_file_workers(self.app_data['user_config'])
+            for cur_file, transcribed_text_path in long_files:
+                if cancel is not None and cancel.is_set():
+                    break
+                stats = transcribe_long_file(self.get_model(long_workers), cur_file, transcribed_text_path, long_workers, preprocess=preprocess)
+                print(f"Transcribed {os.path.basename(cur_file)} in {long_workers} windows at a time ({stats['duration']:.1f}s of audio in {stats['processing_time']:.1f}s)")
+                self._record_transcription(cur_file, transcribed_text_path, model_name, compute_type, stats)
+
+        if pending and not (cancel is not None and cancel.is_set()):
+            # Transcripts are indexed while they are written, so each file is searchable before the batch ends.
+            indexer = StreamingIndexer(self.get_vector_index()) if self.app_data['user_config'].get('streaming_index', True) else None
+            workers = min(workers, len(pending))
+            pool = TranscriptionPool(self.get_model(workers), workers, indexer, preprocess)
+            try:
+                report = pool.run(
+                    pending,
+                    lambda audio, text, stats: self._record_transcription(audio, text, model_name, compute_type, stats),
+                    durations,
+                    cancel)
+                self.last_transcription_report = {**report, 'failed': self.last_transcription_report['failed'] + report['failed']}
+            finally:
+                if indexer:
+                    indexer.close()
 
         self.build_vector_store()
-        
+        return True
+
+    def _record_transcription(self, audio_path: str, transcript_path: str, model: str, compute_type: str, stats: dict) -> None:
+        """Records a transcribed file in the manifest and the catalog.
+
+        Args:
+            audio_path (str): Path of the audio file.
+            transcript_path (str): Path of its transcript.
+            model (str): Model used.
+            compute_type (str): Compute type used.
+            stats (dict): The `language`, `duration` and `processing_time` of the transcription.
+        """
+
+        self.manifest.update(audio_path, transcript_path, model, compute_type)
+        entry = self.manifest.entries[os.path.basename(audio_path)]
+        self.catalog.record_file(self.project_name, os.path.basename(audio_path), duration=stats['duration'], language=stats['language'] or '',
+                                 model=model, compute_type=compute_type, processing_seconds=stats['processing_time'], audio_hash=entry['hash'],
+                                 transcript=entry['transcript'], transcript_hash=entry['transcript_hash'], status='transcribed')
 
     def build_vector_store(self) -> bool:
-        exts = ['*.txt']
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=32)
+        """Updates the project vector store with the transcripts that are new or changed since the last build,
+        and removes the chunks of transcripts that were deleted.
+
+        Returns:
+            bool: True if the index changed. False otherwise.
+        """
+
+        report = self.get_vector_index().sync(self.text_path)
+        print(f"Vector store: {report['updated']} files updated, {report['removed']} removed, {report['embedded']} chunks embedded")
+        print(f"Embedding cache: {get_default_cache().stats()}")
+        return bool(report['updated'] or report['removed'])
+
+    def get_job_handlers(self) -> dict[str, Callable[[Job, JobContext], object]]:
+        """Returns the handlers of this project's background jobs, for a `JobScheduler`.
+
+        - 'download' copies the local files in `payload['paths']` into the project, or adds the media of `payload['url']`,
+          reporting its progress. If the project keeps the original media,
+          it's downloaded and a 'transcribe' job is queued if anything came. Otherwise it's transcribed from the
+          network with `ingest_online`.
+        - 'transcribe' runs `process_audios`, which also updates the vector store.
+        - 'index' runs `build_vector_store`.
+
+        Transcription and indexing change the same files, so they take turns on `index_lock` even when both are allowed
+        to run. Live sessions take the same lock each time they index.
+        """
+
+        index_lock = self.index_lock
+
+        def download(job: Job, context: JobContext) -> list[str]:
+            def on_progress(progress: DownloadProgress) -> None:
+                # Raising from the progress hook makes yt_dlp abort the download.
+                context.check()
+                context.report(progress.fraction, f"{progress.title or progress.url}: {progress.status}")
+
+            if 'paths' in job.payload:
+                copied = self.import_files(job.payload['paths'], context.cancel_event)
+                context.check()
+                if copied:
+                    context.submit('transcribe')
+                return copied
+
+            if not self.project_settings.get('keep_original_media', False):
+                added = self.ingest_online(job.payload['url'], on_progress, context.cancel_event, index_lock)
+                context.check()
+                return added
+
+            jobs = self.download_online(job.payload['url'], on_progress)
+            context.check()
+            finished = [download.filename for download in jobs if download.status == 'finished']
+            if finished:
+                context.submit('transcribe')
+            return finished
+
+        def transcribe(job: Job, context: JobContext) -> bool:
+            with index_lock:
+                transcribed = self.process_audios(context.cancel_event)
+            context.check()
+            return transcribed
+
+        def index(job: Job, context: JobContext) -> bool:
+            with index_lock:
+                return self.build_vector_store()
+
+        return {'download': download, 'transcribe': transcribe, 'index': index}
+
+    def start_live_transcription(self, source, on_partial=None, on_final=None) -> tuple[LiveTranscriber, threading.Thread]:
+        """Starts transcribing a live source in a background thread, where the live model is loaded first. Each final
+        utterance is appended to a new `live-<date>.txt` transcript and indexed right away, taking turns with the
+        transcription and indexing jobs on `index_lock`. Call `stop` on the returned transcriber to end it.
+
+        Args:
+            source (WavFileSource | MicrophoneSource): Where the audio comes from.
+            on_partial (Callable[[str], None] | None): Called with the partial text of the current utterance.
+            on_final (Callable[[str, float, float], None] | None): Called with each final text and its start and end, in seconds.
+
+        Returns:
+            tuple[LiveTranscriber, threading.Thread]: The transcriber and the thread running it.
+        """
+
+        user_config = self.app_data['user_config']
+        live_model = user_config.get('live_model', 'base')
+
+        source_name = datetime.now().strftime('live-%Y-%m-%d-%H%M%S.txt')
+        text_path = os.path.join(self.text_path, source_name)
+        vector_index = self.get_vector_index()
+        # `sync` leaves the transcript to this session until it's finished.
+        vector_index.live_sources.add(source_name)
+        indexer = StreamingIndexer(vector_index, save_interval=5.0, lock=self.index_lock)
+        chunker = StreamingChunker()
+        text_hash = hashlib.sha256()
+        indexer.begin_source(source_name)
+
+        def finalized(text: str, start: float, end: float) -> None:
+            piece = f" {text}"
+            with open(text_path, 'a', encoding='utf-8') as f:
+                f.write(piece)
+            text_hash.update(piece.encode('utf-8'))
+            indexer.add(source_name, chunker.feed(piece))
+            if on_final:
+                on_final(text, start, end)
+
+        # The model is loaded in the thread, so the caller, usually the GUI thread, doesn't wait for it.
+        transcriber = LiveTranscriber(None, on_partial, finalized, latency_target=user_config.get('live_latency_target', 1.5))
+
+        def run() -> None:
+            try:
+                model_name, compute_type, cpu_threads, _ = get_model_settings(self.app_data, live_model)
+                transcriber.model = model_registry.get(model_name, compute_type, cpu_threads, self.models_path)
+                transcriber.run(source)
+            finally:
+                indexer.add(source_name, chunker.flush())
+                indexer.finish_source(source_name, text_hash.hexdigest())
+                try:
+                    indexer.close()
+                finally:
+                    vector_index.live_sources.discard(source_name)
+                print(f"Live transcription latency: {transcriber.latency_report()}")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return transcriber, thread
 
-        for filename in os.listdir(self.text_path):
-            if any(fnmatch.fnmatch(filename, extension) for extension in exts):
-                cur_file = os.path.join(self.text_path, filename)
+    def get_vector_index(self) -> VectorIndex:
+        """Returns the project vector index, created on first use."""
 
-                with open(cur_file, 'r', encoding='utf-8') as f:
-                    text = f.read()
-                    splits = text_splitter.split_text(text)
-            
-        embeddings = OpenAIEmbeddings()
-        vectordb = FAISS.from_texts(splits, embeddings)
-        vectordb.save_local(self.db_path, self.project_name)
+        if self.vector_index is None:
+            self.vector_index = VectorIndex(self.db_path, self.project_name, pipeline_options=self.app_data.get('embedding_pipeline'))
+        return self.vector_index
 
     def _load_project_file(self) -> bool:
         """Loads the project settings to self.project_settings.
@@ -146,13 +618,13 @@ class ProjectManager():
         if not os.path.isfile(path):
             return False
         else:
-            self.project_settings = json.load(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                self.project_settings = json.load(f)
             return True
 
 
-from storage_manager import StorageManager
-#info = StorageManager().create_project_files('testing', 'aaaaaaaaaa', 'medium')
-m = ProjectManager('/Users/lmonteir/.HandySpeechBot', '/Users/lmonteir/.HandySpeechBot/projects/testing')
-m.get_audio_online('https://www.youtube.com/watch?v=_5u6XokSq4M')
-m.process_audios()
-m.build_vector_store()
\ No newline at end of file
+if __name__ == '__main__':
+    m = ProjectManager('/Users/lmonteir/.HandySpeechBot', 'testing')
+    m.get_audio_online('https://www.youtube.com/watch?v=_5u6XokSq4M')
+    m.process_audios()
+    m.build_vector_store()
@@ -0,0 +1,73 @@
+"""How the transcription settings of the app configuration turn into the models that are loaded.
+
+Kept free of heavy imports, so the service process can find the same model keys as the projects without
+loading the transcription and indexing libraries.
+"""
+
+
+def split_threads(cpu_threads: int, workers: int) -> int:
+    """Splits the core budget between the workers.
+
+    Args:
+        cpu_threads (int): Total number of threads available for transcription.
+        workers (int): Number of files transcribed at the same time.
+
+    Returns:
+        int: How many threads each worker gets. Always at least 1.
+    """
+
+    return max(1, cpu_threads // max(1, workers))
+
+
+def get_long_file_workers(user_config: dict) -> int:
+    """Returns how many windows of a long file are transcribed at the same time."""
+
+    return user_config.get('long_file_workers', max(1, user_config['cpu_threads'] // 4))
+
+
+def get_tuned_settings(app_data: dict, model: str) -> dict | None:
+    """Returns what `DataManager.calibration` found for a model on this machine. None if it wasn't calibrated,
+    or the user configuration sets a compute type other than `default`."""
+
+    tuned = app_data.get('tuned', {}).get(model)
+    return tuned if tuned and app_data['user_config']['compute_type'] == 'default' else None
+
+
+def get_transcription_settings(app_data: dict, model: str) -> tuple[str, int]:
+    """Gets the compute type and number of threads for a model. The ones found by `DataManager.calibration`
+    for this machine are used when present, otherwise the user configuration.
+
+    Args:
+        app_data (dict): The app configuration.
+        model (str): The model size.
+
+    Returns:
+        tuple[str, int]: The compute type and the number of threads. Calibrated threads are for each transcription,
+            the ones of the user configuration are shared by every transcription running at the same time.
+    """
+
+    tuned = get_tuned_settings(app_data, model)
+    if tuned:
+        return tuned['compute_type'], tuned['cpu_threads']
+    return app_data['user_config']['compute_type'], app_data['user_config']['cpu_threads']
+
+
+def get_model_settings(app_data: dict, model: str, workers: int = 1) -> tuple[str, str, int, int]:
+    """Gets how a model is loaded to run `workers` transcriptions at the same time.
+
+    Args:
+        app_data (dict): The app configuration.
+        model (str): The model size.
+        workers (int): How many transcriptions the model runs at the same time.
+
+    Returns:
+        tuple[str, str, int, int]: The model, compute type, threads of each worker and number of workers,
+            as `ModelRegistry.get` takes them.
+    """
+
+    compute_type, cpu_threads = get_transcription_settings(app_data, model)
+    workers = max(1, workers)
+    if get_tuned_settings(app_data, model):
+        # Calibration times a single transcription, so each worker runs with the threads that were measured.
+        return model, compute_type, cpu_threads, workers
+    return model, compute_type, split_threads(cpu_threads, workers), workers
@@ -1,7 +1,9 @@
 import json
 import os
 import re
+import shutil
 from datetime import datetime
+from DataManager.catalog import get_catalog
 
 class StorageManager():
     """Class responsible for loading and storing the documents."""
@@ -9,6 +11,9 @@ class StorageManager():
     def __init__(self):
         self.check_folders()
         self.load_app_config()
+        self.catalog = get_catalog(self.app_path)
+        # Picks up project folders copied in or removed by hand since the last run.
+        self.catalog.sync(self.projects_path)
 
     def check_folders(self):
         """Check if the working folders in the app exists. If any of them don't, it creates them."""
@@ -43,8 +48,29 @@ class StorageManager():
         sanitized_name = re.sub(invalid_chars, '_', name)
         return sanitized_name
 
-    def update_app_settings(self, dict_path: list[str]) -> bool:
-        pass
+    def update_app_settings(self, dict_path: list[str], value) -> bool:
+        """Sets a value in the app configuration and saves it to app_config.json.
+
+        Args:
+            dict_path (list[str]): Keys leading to the value, like ['user_config', 'model']. Missing ones are created.
+            value: The new value.
+
+        Returns:
+            bool: True if saved successfully. False otherwise.
+        """
+
+        node = self.app_data
+        for key in dict_path[:-1]:
+            node = node.setdefault(key, {})
+        node[dict_path[-1]] = value
+
+        try:
+            path = os.path.join(self.app_path, "app_config.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.app_data, f, indent=4)
+            return True
+        except OSError:
+            return False
 
     def create_project_files(self, sanitized_name: str, description: str, transformer: str) -> tuple[str, str] | None:
         """Create the project files, given a name as typed by the user.
@@ -72,6 +98,7 @@ class StorageManager():
                 "transformer": transformer,
                 "llm": "llama-3",
                 "database": "faiss",
+                "keep_original_media": False,
                 "path": path,
                 "created_at": datetime.now().strftime("%Y-%m-%d")
             }
@@ -79,22 +106,24 @@ class StorageManager():
             
             with open(settings_file_path, 'w', encoding='utf-8') as f:
                 json.dump(settings_file, f, indent=4)
+            self.catalog.add_project(settings_file)
             
             return (sanitized_name, path)
         except:
             return None
         
     def delete_project_dir(self, name: str) -> None:
-        """Deletes a project folder.
+        """Deletes a project folder, with everything in it.
 
         Args:
             name (str): The name of the project to be deleted, sanitized.
         """        
 
-        os.removedirs(os.path.join(self.projects_path, name))
+        shutil.rmtree(os.path.join(self.projects_path, name))
+        self.catalog.remove_project(name)
 
     def check_project_existence(self, project_name: str) -> bool:
-        """Checks if the project exists created by checking if the folder.
+        """Checks if a project with this name, once sanitized, is in the catalog.
 
         Args:
             project_name (str): Name of the project
@@ -104,8 +133,7 @@ class StorageManager():
         """
 
         sanitized_name = self.sanitize_folder_filename(project_name)
-        path = os.path.join(self.projects_path, sanitized_name)
-        return os.path.isdir(path)
+        return self.catalog.project_exists(sanitized_name)
 
     def load_app_config(self) -> None:
         """Loads the app configuration file. If does not exists, it creates one."""
@@ -126,6 +154,29 @@ class StorageManager():
                     "compute_type": "default",
                     "model": "medium",
                     "cpu_threads": cpu_threads,
+                    "workers": 1,
+                    "preprocess_audio": True,
+                    "batch_size": 8,
+                    "batch_max_seconds": 60,
+                    "models_memory_mb": 8192,
+                    "metrics_path": "",
+                    "job_concurrency": {"download": 2, "transcribe": 1, "index": 1},
+                },
+                "service": {
+                    "job_workers": 1,
+                    "query_workers": 2,
+                    "warm_up_model": True,
+                },
+                "answer_cache": {
+                    "similarity_threshold": 0.95,
+                    "ttl_hours": 168,
+                    "max_entries": 5000,
+                },
+                "embedding_pipeline": {
+                    "batch_tokens": 8000,
+                    "concurrency": 4,
+                    "requests_per_minute": 3000,
+                    "tokens_per_minute": 1000000,
                 },
                 "compute_types": [
                         "default",
@@ -157,18 +208,32 @@ class StorageManager():
             with open(path, 'w', encoding='utf-8') as f:
                 json.dump(self.app_data, f, indent=4)
 
-    def get_projects(self) -> list[str]:
-        """Get the list of available projects. It just returns the name of the folders in the Project dir.
+    def get_projects(self, search: str = '') -> list[str]:
+        """Get the list of available projects, from the catalog.
+
+        Args:
+            search (str): Only the projects with this text in their name or description.
 
         Returns:
             list[str]: List with the name of the projects, sanitized.
         """        
 
-        projects = [item for item in os.listdir(self.projects_path) if os.path.isdir(os.path.join(self.projects_path, item))]
-        return projects
+        return [project['name'] for project in self.catalog.list_projects(search)]
+
+    def get_project_info(self, name: str) -> dict | None:
+        """Gets the catalog entry of a project: its settings, `file_count` and `total_seconds`.
+
+        Args:
+            name (str): The name of the project, sanitized.
+
+        Returns:
+            dict | None: The project, or None if there isn't one with this name.
+        """
+
+        return self.catalog.get_project(name)
     
     def does_project_exists(self, name: str) -> bool:
-        """Checks if a project exists by searching the project dir for the sanitized name.
+        """Checks if a project exists by looking the sanitized name up in the catalog.
 
         Args:
             name (str): The name of the project to be looked for, sanitized.
@@ -177,5 +242,4 @@ class StorageManager():
             bool: Returns true if a project exists with the corresponding name. False otherwise.
         """        
 
-        projects = self.get_projects()
-        return True if projects.count(name) > 0 else False
\ No newline at end of file
+        return self.catalog.project_exists(name)
\ No newline at end of file
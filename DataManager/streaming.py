@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from DataManager.vector_index import VectorIndex
+
+
+class StreamingChunker():
+    """Splits text that arrives in pieces, emitting chunks as soon as there's enough text to be sure of them."""
+
+    def __init__(self, chunk_size: int = 512, chunk_overlap: int = 32):
+        self.chunk_size = chunk_size
+        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.buffer = ''
+
+    def feed(self, text: str) -> list[str]:
+        """Adds text to the buffer.
+
+        Args:
+            text (str): The new text, like a whisper segment.
+
+        Returns:
+            list[str]: The chunks that are complete. The last one is kept back, as more text may still belong to it.
+        """
+
+        self.buffer += text
+        if len(self.buffer) < 2 * self.chunk_size:
+            return []
+
+        chunks = self.text_splitter.split_text(self.buffer)
+        if len(chunks) < 2:
+            return []
+
+        # The kept text starts where the last chunk does, so it still carries the overlap with the previous one.
+        last_start = self.buffer.rfind(chunks[-1])
+        if last_start < 0:
+            return []
+        self.buffer = self.buffer[last_start:]
+        return chunks[:-1]
+
+    def flush(self) -> list[str]:
+        """Returns the chunks of whatever text is left, emptying the buffer."""
+
+        chunks = self.text_splitter.split_text(self.buffer) if self.buffer.strip() else []
+        self.buffer = ''
+        return chunks
+
+
+class StreamingIndexer():
+    """Adds chunks to a `VectorIndex` from a background thread while the transcription is still running.
+
+    Every change is a message in a queue, handled in order by one thread, so several transcriptions can feed
+    the same index safely. The index is saved at most every `save_interval` seconds, which is when new chunks
+    become visible to the `Prompter`, and once more when the indexer is closed.
+    """
+
+    def __init__(self, vector_index: VectorIndex, save_interval: float = 30.0, lock=None):
+        """
+        Args:
+            vector_index (VectorIndex): The index the chunks go to.
+            save_interval (float): Least seconds between two saves.
+            lock (threading.Lock | None): Held while the index is changed and saved, when other threads change it too
+                and aren't feeding this indexer.
+        """
+
+        self.vector_index = vector_index
+        self.save_interval = save_interval
+        self.lock = lock or nullcontext()
+        self.chunks_indexed = 0
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def begin_source(self, source: str) -> None:
+        """Removes the previous chunks of a transcript that is about to be written again."""
+
+        self._queue.put(('begin', source, None))
+
+    def add(self, source: str, chunks: list[str]) -> None:
+        if chunks:
+            self._queue.put(('add', source, chunks))
+
+    def finish_source(self, source: str, text_hash: str) -> None:
+        """Marks a transcript as complete, so `VectorIndex.sync` sees it as already indexed.
+
+        Args:
+            source (str): Name of the transcript file.
+            text_hash (str): SHA-256 of the whole transcript, as in `VectorIndex.text_hash`.
+        """
+
+        self._queue.put(('finish', source, text_hash))
+
+    def close(self) -> None:
+        """Waits for the queued chunks to be indexed and saves the index.
+
+        Raises:
+            Exception: The error that stopped the indexing thread, if any.
+        """
+
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        changed = False
+        last_save = time.monotonic()
+        while True:
+            message = self._queue.get()
+            # Takes everything already waiting, merging consecutive chunks of the same source so they are embedded in one call.
+            messages = [message]
+            while message is not None:
+                try:
+                    message = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                previous = messages[-1]
+                if message is not None and previous is not None and message[0] == previous[0] == 'add' and message[1] == previous[1]:
+                    messages[-1] = ('add', message[1], previous[2] + message[2])
+                else:
+                    messages.append(message)
+
+            with self.lock:
+                try:
+                    for item in messages:
+                        if item is None:
+                            continue
+                        changed = self._handle(*item) or changed
+                except Exception as e:
+                    self._error = e
+                    return
+
+                if changed and (messages[-1] is None or time.monotonic() - last_save >= self.save_interval):
+                    self.vector_index.save()
+                    changed = False
+                    last_save = time.monotonic()
+
+            if messages[-1] is None:
+                return
+
+    def _handle(self, kind: str, source: str, payload) -> bool:
+        sources = self.vector_index.mapping['sources']
+        if kind == 'begin':
+            self.vector_index.remove_source(source)
+            sources[source] = {'hash': '', 'ids': []}
+        elif kind == 'add':
+            self.vector_index.add_chunks(source, payload)
+            self.chunks_indexed += len(payload)
+        elif kind == 'finish':
+            sources.setdefault(source, {'hash': '', 'ids': []})['hash'] = payload
+        return True
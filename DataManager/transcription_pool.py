@@ -0,0 +1,180 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator
+import librosa
+from DataManager.instrumentation import metrics
+from DataManager.long_audio import StitchedSegment
+from DataManager.preprocessing import preprocess_audio
+from DataManager.streaming import StreamingChunker, StreamingIndexer
+
+# Used to guess the duration of files librosa can't read, assuming a 128 kbps stream.
+BYTES_PER_SECOND = 16000
+
+
+def get_audio_duration(path: str) -> float:
+    """Gets the duration of an audio file, in seconds. If the file can't be read, it's estimated from its size.
+
+    Args:
+        path (str): Path of the audio file.
+
+    Returns:
+        float: The duration in seconds.
+    """
+
+    try:
+        return librosa.get_duration(path=path)
+    except Exception:
+        return os.path.getsize(path) / BYTES_PER_SECOND
+
+
+def transcribe_segments(model, audio_path: str, preprocess: bool = False) -> tuple[Iterator[StitchedSegment], str, float]:
+    """Transcribes an audio file, optionally pre-processing it first (see `preprocess_audio`).
+
+    Args:
+        model (WhisperModel): The model used to transcribe.
+        audio_path (str): Path of the audio file. Samples already decoded to 16 kHz mono are accepted too.
+        preprocess (bool): If True, the silences are compacted before inference. Segment times still refer to the original file.
+
+    Returns:
+        tuple[Iterator[StitchedSegment], str, float]: The segments, as whisper yields them, the language and the original duration.
+    """
+
+    if preprocess and isinstance(audio_path, str):
+        audio, timestamp_map = preprocess_audio(audio_path)
+        if len(audio) == 0:
+            return iter([]), '', timestamp_map.original_duration
+
+        segments, info = model.transcribe(audio)
+        mapped = (StitchedSegment(timestamp_map.to_original(segment.start), timestamp_map.to_original(segment.end), segment.text) for segment in segments)
+        return mapped, info.language, timestamp_map.original_duration
+
+    segments, info = model.transcribe(audio_path)
+    return (StitchedSegment(segment.start, segment.end, segment.text) for segment in segments), info.language, info.duration
+
+
+def transcribe_to_file(model, audio_path: str, text_path: str, indexer: StreamingIndexer | None = None, preprocess: bool = False) -> dict:
+    """Transcribes an audio file, appending each segment to `text_path` as soon as whisper yields it.
+
+    Args:
+        model (WhisperModel): The model used to transcribe.
+        audio_path (str): Path of the audio file. Samples already decoded to 16 kHz mono are accepted too.
+        text_path (str): Path of the transcript to be written.
+        indexer (StreamingIndexer | None): If given, the transcript is chunked and indexed while it's written.
+        preprocess (bool): If True, the audio is downmixed, resampled and has its silences compacted before inference.
+
+    Returns:
+        dict: The file `language`, audio `duration` and the `processing_time`, all in seconds.
+    """
+
+    start = time.perf_counter()
+    source = os.path.basename(text_path)
+    filename = os.path.basename(audio_path) if isinstance(audio_path, str) else source
+    # Decoding is nested in this span, and whisper does most of the work while the segments are iterated.
+    with metrics.span('transcribe', file=filename):
+        segments, language, duration = transcribe_segments(model, audio_path, preprocess)
+
+        chunker = StreamingChunker()
+        text_hash = hashlib.sha256()
+        if indexer:
+            indexer.begin_source(source)
+
+        with open(text_path, 'w', encoding='utf-8') as f:
+            for segment in segments:
+                f.write(segment.text)
+                f.flush()
+                text_hash.update(segment.text.encode('utf-8'))
+                if indexer:
+                    indexer.add(source, chunker.feed(segment.text))
+    metrics.count('audio_seconds', duration)
+
+    if indexer:
+        indexer.add(source, chunker.flush())
+        indexer.finish_source(source, text_hash.hexdigest())
+
+    return {
+        'language': language,
+        'duration': duration,
+        'processing_time': time.perf_counter() - start,
+    }
+
+
+class TranscriptionPool():
+    """Transcribes several files at the same time, sharing one model between the workers.
+
+    The model must be loaded with `num_workers` equal to the pool `workers`, so CTranslate2 can run that
+    many transcriptions in parallel, each one with its share of the threads (see `DataManager.settings.split_threads`).
+    Transcription releases the GIL, so a thread pool is enough to keep every core busy.
+    """
+
+    def __init__(self, model, workers: int, indexer: StreamingIndexer | None = None, preprocess: bool = False):
+        """
+        Args:
+            model (WhisperModel): The shared model.
+            workers (int): Number of files transcribed at the same time.
+            indexer (StreamingIndexer | None): If given, transcripts are indexed while they are written.
+            preprocess (bool): If True, silences are compacted before inference.
+        """
+
+        self.model = model
+        self.workers = max(1, workers)
+        self.indexer = indexer
+        self.preprocess = preprocess
+
+    def run(self, jobs: list[tuple[str, str]], on_file_done: Callable[[str, str, dict], None] | None = None, durations: dict[str, float] | None = None,
+            cancel: threading.Event | None = None) -> dict:
+        """Transcribes the files, the longest ones first, so a long file doesn't start last and delay the whole batch.
+
+        Args:
+            jobs (list[tuple[str, str]]): List of (audio path, transcript path).
+            on_file_done (Callable[[str, str, dict], None] | None): Called from the caller's thread as soon as
+                each file is written, with the audio path, transcript path and the file stats.
+            durations (dict[str, float] | None): Known durations by audio path, so they aren't read again.
+            cancel (threading.Event | None): When set, the files not started yet are skipped. The ones already
+                being transcribed are finished.
+
+        Returns:
+            dict: Aggregate stats: number of `files`, `audio_seconds`, `wall_seconds`, the real-time factor `rtf`
+                (wall time divided by audio time, lower is faster) and the `failed` files, as (audio path, error).
+                A file that fails doesn't stop the others.
+        """
+
+        durations = durations or {}
+        ordered = sorted(jobs, key=lambda job: durations.get(job[0]) or get_audio_duration(job[0]), reverse=True)
+
+        start = time.perf_counter()
+        audio_seconds = 0.0
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(transcribe_to_file, self.model, audio, text, self.indexer, self.preprocess): (audio, text) for audio, text in ordered}
+            for future in as_completed(futures):
+                if cancel is not None and cancel.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                if future.cancelled():
+                    continue
+                audio, text = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    print(f"Error transcribing {os.path.basename(audio)}: {e}")
+                    failed.append((audio, str(e)))
+                    continue
+                audio_seconds += stats['duration']
+                print(f"Transcribed {os.path.basename(audio)} ({stats['language']}, {stats['duration']:.1f}s of audio in {stats['processing_time']:.1f}s)")
+                if on_file_done:
+                    on_file_done(audio, text, stats)
+
+        wall_seconds = time.perf_counter() - start
+        report = {
+            'files': sum(1 for future in futures if not future.cancelled()) - len(failed),
+            'workers': self.workers,
+            'audio_seconds': audio_seconds,
+            'wall_seconds': wall_seconds,
+            'rtf': wall_seconds / audio_seconds if audio_seconds else 0.0,
+            'failed': failed,
+        }
+        print(f"Transcribed {report['files']} files with {self.workers} workers: {audio_seconds:.1f}s of audio in {wall_seconds:.1f}s (RTF {report['rtf']:.3f})")
+        return report
@@ -0,0 +1,294 @@
+import fnmatch
+import hashlib
+import json
+import os
+import uuid
+from langchain_community.vectorstores import FAISS
+from langchain_openai import OpenAIEmbeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from DataManager.embedding_cache import get_default_cache
+from DataManager.embedding_pipeline import EmbeddingPipeline
+from DataManager.instrumentation import metrics
+from DataManager.lexical_index import LexicalIndex
+
+
+class VectorIndex():
+    """Keeps the FAISS index of a project in sync with its transcripts, re-embedding only what changed.
+
+    Next to the index, `<index_name>_chunks.json` maps every transcript to the hash of its text and the IDs
+    of its chunks in the index, so a changed or deleted transcript has exactly its own vectors replaced or removed.
+    The same chunks are kept in a `LexicalIndex`, for keyword search. The mapping also holds the `version` bumped by
+    every save, a random `index_id`, so the versions of a deleted and re-created index never match the old ones,
+    and the name of the `store` files the current version was saved to.
+
+    Transcripts in `live_sources` are still being written and indexed by a live session, so `sync` leaves them alone
+    while they aren't marked as finished.
+    """
+
+    def __init__(self, db_path: str, index_name: str, embeddings=None, chunk_size: int = 512, chunk_overlap: int = 32, pipeline_options: dict | None = None):
+        """
+        Args:
+            db_path (str): The project `databases` folder.
+            index_name (str): Name of the index files.
+            embeddings (Embeddings | None): The embedding model. Defaults to `OpenAIEmbeddings`.
+            chunk_size (int): Size of the chunks, in characters.
+            chunk_overlap (int): Overlap between consecutive chunks, in characters.
+            pipeline_options (dict | None): Batching, concurrency and rate limit options for the `EmbeddingPipeline`.
+        """
+
+        self.db_path = db_path
+        self.index_name = index_name
+        self.mapping_path = os.path.join(db_path, f"{index_name}_chunks.json")
+        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self._embeddings = embeddings
+        self._pipeline = None
+        self.pipeline_options = pipeline_options or {}
+        self._store = None
+        self._lexical = None
+        self.live_sources: set[str] = set()
+        self.mapping = {'index_id': uuid.uuid4().hex, 'version': 0, 'sources': {}}
+
+        if os.path.isfile(self.mapping_path):
+            with open(self.mapping_path, 'r', encoding='utf-8') as f:
+                self.mapping = json.load(f)
+            # Indexes built before there was an id get one on their next save.
+            self.mapping.setdefault('index_id', uuid.uuid4().hex)
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = OpenAIEmbeddings()
+        return self._embeddings
+
+    @property
+    def lexical(self) -> LexicalIndex:
+        """The BM25 index of the same chunks, opened on first use."""
+
+        if self._lexical is None:
+            self._lexical = LexicalIndex(self.db_path, self.index_name)
+        return self._lexical
+
+    @property
+    def pipeline(self) -> EmbeddingPipeline:
+        """Embeds the chunks in concurrent batches, through the shared embedding cache."""
+
+        if self._pipeline is None:
+            self._pipeline = EmbeddingPipeline(self.embeddings, cache=get_default_cache(), **self.pipeline_options)
+        return self._pipeline
+
+    @property
+    def store(self) -> FAISS | None:
+        """The FAISS store, loaded from disk on first use. None while nothing was indexed."""
+
+        # Indexes saved before every version had its own files are in `<index_name>.faiss`.
+        store_name = self.mapping.get('store', self.index_name)
+        if self._store is None and os.path.isfile(os.path.join(self.db_path, f"{store_name}.faiss")):
+            self._store = FAISS.load_local(folder_path=self.db_path, embeddings=self.embeddings, index_name=store_name, allow_dangerous_deserialization=True)
+        return self._store
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def is_current(self, source: str, text: str) -> bool:
+        """Checks if `source` is already indexed with exactly this text."""
+
+        entry = self.mapping['sources'].get(source)
+        return entry is not None and entry['hash'] == self.text_hash(text)
+
+    def update_source(self, source: str, text: str) -> int:
+        """Indexes the text of a transcript, replacing its previous chunks. Does nothing if the text didn't change.
+
+        Args:
+            source (str): Name of the transcript file.
+            text (str): Content of the transcript.
+
+        Returns:
+            int: The number of chunks embedded.
+        """
+
+        return self.update_sources({source: text})
+
+    def update_sources(self, texts: dict[str, str]) -> int:
+        """Indexes several transcripts at once, so their chunks share the embedding batches.
+        Each finished batch goes into the index right away.
+
+        Args:
+            texts (dict[str, str]): Content of each transcript, by name.
+
+        Returns:
+            int: The number of chunks embedded.
+        """
+
+        pending = []
+        hashes = {}
+        for source, text in texts.items():
+            if self.is_current(source, text):
+                continue
+            self.remove_source(source)
+            # The hash is only recorded once every chunk is in, so an interrupted run is redone next time.
+            self.mapping['sources'][source] = {'hash': '', 'ids': []}
+            hashes[source] = self.text_hash(text)
+            with metrics.span('chunk', file=source):
+                pending.extend((source, position, chunk) for position, chunk in enumerate(self.text_splitter.split_text(text)))
+
+        def on_batch(indices: list[int], vectors: list[list[float]]) -> None:
+            by_source = {}
+            for i, vector in zip(indices, vectors):
+                source, position, chunk = pending[i]
+                by_source.setdefault(source, []).append((position, chunk, vector))
+            for source, items in by_source.items():
+                self._add(source, items)
+
+        metrics.count('chunks', len(pending))
+        if pending:
+            self.pipeline.embed([chunk for _, _, chunk in pending], on_batch)
+        for source, text_hash in hashes.items():
+            self.mapping['sources'][source]['hash'] = text_hash
+        return len(pending)
+
+    def add_chunks(self, source: str, chunks: list[str], embeddings: list[list[float]] | None = None) -> None:
+        """Appends chunks to a source, after the ones it already has.
+
+        Args:
+            source (str): Name of the transcript file.
+            chunks (list[str]): The chunks to be added.
+            embeddings (list[list[float]] | None): Their vectors, if already calculated. Otherwise they are embedded here.
+        """
+
+        entry = self.mapping['sources'].setdefault(source, {'hash': '', 'ids': []})
+        if not chunks:
+            return
+
+        if embeddings is None:
+            embeddings = self.pipeline.embed(chunks)
+
+        start = len(entry['ids'])
+        self._add(source, [(start + i, chunk, vector) for i, (chunk, vector) in enumerate(zip(chunks, embeddings))])
+
+    def _add(self, source: str, items: list[tuple[int, str, list[float]]]) -> None:
+        """Adds (position, chunk, vector) items of a source to the store."""
+
+        ids = [f"{source}::{position}" for position, _, _ in items]
+        metadatas = [{'source': source, 'chunk': position} for position, _, _ in items]
+        text_embeddings = [(chunk, vector) for _, chunk, vector in items]
+
+        with metrics.span('index', file=source, chunks=len(items)):
+            if self.store is None:
+                self._store = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+            else:
+                self._store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+            self.lexical.add(source, [(position, chunk) for position, chunk, _ in items])
+        self.mapping['sources'][source]['ids'].extend(ids)
+
+    def remove_source(self, source: str) -> int:
+        """Removes every chunk of a transcript from the index.
+
+        Args:
+            source (str): Name of the transcript file.
+
+        Returns:
+            int: The number of chunks removed.
+        """
+
+        entry = self.mapping['sources'].pop(source, None)
+        self.lexical.remove_source(source)
+        if entry is None or not entry['ids']:
+            return 0
+
+        self.store.delete(entry['ids'])
+        return len(entry['ids'])
+
+    def sync(self, text_path: str) -> dict:
+        """Brings the index up to date with the transcripts in `text_path` and saves it if anything changed.
+
+        Args:
+            text_path (str): The project `texts` folder.
+
+        Returns:
+            dict: How many sources were `updated` and `removed`, and how many chunks were `embedded`.
+        """
+
+        # A live transcript only gets its hash once the session ends. Until then, its indexer owns it.
+        in_progress = {source for source in self.live_sources if self.mapping['sources'].get(source, {'hash': ''})['hash'] == ''}
+        filenames = [filename for filename in os.listdir(text_path) if fnmatch.fnmatch(filename, '*.txt')]
+        report = {'updated': 0, 'removed': 0, 'embedded': 0}
+        backfilled = self._backfill_lexical()
+
+        changed = {}
+        for filename in filenames:
+            if filename in in_progress:
+                continue
+            with open(os.path.join(text_path, filename), 'r', encoding='utf-8') as f:
+                text = f.read()
+
+            if not self.is_current(filename, text):
+                changed[filename] = text
+
+        report['embedded'] = self.update_sources(changed)
+        report['updated'] = len(changed)
+
+        for source in [source for source in self.mapping['sources'] if source not in filenames and source not in in_progress]:
+            self.remove_source(source)
+            report['removed'] += 1
+
+        if report['updated'] or report['removed'] or backfilled:
+            self.save()
+        return report
+
+    def _backfill_lexical(self) -> int:
+        """Fills an empty lexical index from the chunks already in the FAISS index, for projects indexed before it existed.
+
+        Returns:
+            int: The number of chunks added.
+        """
+
+        if self.store is None or self.lexical.count() > 0:
+            return 0
+
+        by_source = {}
+        for document in self.store.docstore._dict.values():
+            by_source.setdefault(document.metadata['source'], []).append((document.metadata['chunk'], document.page_content))
+        for source, items in by_source.items():
+            self.lexical.add(source, items)
+        return sum(len(items) for items in by_source.values())
+
+    def save(self) -> None:
+        """Writes the index and its chunk mapping to disk, increasing the index version.
+
+        Every version is written to its own `<index_name>.v<version>` files, which the mapping points to once they
+        are complete. A reader that memory-mapped an older version keeps a valid file, and nothing has to replace a
+        mapped file, which Windows refuses. The versions before the previous one are deleted when they aren't in use.
+        """
+
+        version = self.mapping['version'] + 1
+        previous = self.mapping.get('store', self.index_name)
+        if self._store is not None:
+            with metrics.span('index', saved=True):
+                store_name = f"{self.index_name}.v{version}"
+                self._store.save_local(self.db_path, store_name)
+                self.mapping['store'] = store_name
+
+        if self._lexical is not None:
+            self._lexical.commit()
+
+        self.mapping['version'] = version
+        tmp_path = f"{self.mapping_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.mapping, f, indent=4)
+        os.replace(tmp_path, self.mapping_path)
+        self._remove_old_stores({self.mapping.get('store'), previous})
+
+    def _remove_old_stores(self, keep: set[str | None]) -> None:
+        """Deletes the files of the older versions of the index, except the ones in `keep`. A file that can't be
+        deleted, like one a reader still has mapped on Windows, is tried again on the next save."""
+
+        for filename in os.listdir(self.db_path):
+            name, extension = os.path.splitext(filename)
+            version = name[len(self.index_name) + 2:] if name.startswith(f"{self.index_name}.v") else ''
+            if extension not in ('.faiss', '.pkl') or name in keep or not (name == self.index_name or version.isdigit()):
+                continue
+            try:
+                os.remove(os.path.join(self.db_path, filename))
+            except OSError:
+                pass
@@ -1,5 +1,4 @@
 import wx
-from DataManager.storage_manager import StorageManager
 from GUI.dialogs import show_modal_dialog
 
 class CreateProject(wx.Dialog):
@@ -88,7 +87,7 @@ class CreateProject(wx.Dialog):
             show_modal_dialog(self, 'Description cannot be more than 200 characters.', 'Length error', wx.OK | wx.ICON_ERROR)
             return
         
-        sm = StorageManager()
+        sm = self.parent.sm
         sanitized_name = sm.sanitize_folder_filename(name)
         if sm.does_project_exists(sanitized_name):
             show_modal_dialog(self, 'A project with this name already exists. Please, choose another one.', 'Project already exists', wx.OK | wx.ICON_ERROR)
@@ -1,12 +1,15 @@
 import platform
-import json
 import os
 import wx
-import wx.lib.scrolledpanel as scrolled
-from DataManager import storage_manager
+from DataManager import backend, storage_manager
+from DataManager.paged_source import PagedSource
 from GUI.create_project import CreateProject
 from GUI.project import Project
 from GUI.dialogs import show_modal_dialog
+from GUI.virtual_list import VirtualListCtrl, attach_search
+
+# Projects listed in the Projects menu, the most recently changed ones.
+RECENT_PROJECTS_IN_MENU = 10
 
 system = platform.system()
 if system == 'Darwin':   # MacOS
@@ -20,26 +23,40 @@ class MainFrame(wx.Frame):
         self.CenterOnScreen()
         self.sm = storage_manager.StorageManager()
         
-        self.project_names = self.sm.get_projects()
+        self.selected_project = ''
         self._init_gui()
         self.CreateStatusBar()
 
         if system == 'Darwin':
             self._go_foreground()
+
+        # After the window is up, so loading the backend never delays it.
+        wx.CallAfter(backend.preload)
     
 
     def _init_gui(self) -> None:
         self.panel = wx.Panel(self)
         base_box = wx.BoxSizer(wx.HORIZONTAL)
-        self.scrolled = scrolled.ScrolledPanel(self.panel)
-        self.scrolled_sizer = wx.BoxSizer(wx.HORIZONTAL)
-        self.scrolled.SetSizer(self.scrolled_sizer)
+        left_box = wx.BoxSizer(wx.VERTICAL)
         right_box = wx.BoxSizer(wx.VERTICAL)
+
+        create_btn = wx.Button(self.panel, -1, 'Create new project')
+        create_btn.Bind(wx.EVT_BUTTON, self.on_create_project)
+        self.project_search = wx.SearchCtrl(self.panel, -1)
+        self.project_search.SetDescriptiveText('Search projects')
+        # Only the rows on screen are fetched from the catalog.
+        self.projects_lc = VirtualListCtrl(self.panel, PagedSource(self.sm.catalog.list_projects, self.sm.catalog.count_projects),
+                                           [('Project', 'name', 140), ('Files', 'file_count', 50)])
+        self.projects_lc.Bind(wx.EVT_LIST_ITEM_SELECTED, self._on_project_selected)
+        self.projects_lc.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self._open_project)
+        attach_search(self.project_search, self.projects_lc)
+        left_box.Add(create_btn, flag=wx.EXPAND)
+        left_box.Add(self.project_search, flag=wx.TOP | wx.EXPAND, border=10)
+        left_box.Add(self.projects_lc, proportion=1, flag=wx.TOP | wx.EXPAND, border=5)
         
         self._create_project_info_sizer(right_box)
-        self.load_project_buttons()
 
-        base_box.Add(self.scrolled, proportion=1, flag=wx.ALL | wx.EXPAND, border=15)
+        base_box.Add(left_box, proportion=1, flag=wx.ALL | wx.EXPAND, border=15)
         base_box.Add(right_box, proportion=2, flag=wx.ALL | wx.EXPAND, border=15)
 
         self.panel.SetSizer(base_box)
@@ -131,11 +148,10 @@ class MainFrame(wx.Frame):
         self.SetMenuBar(self.menu)
 
     def update_projects_entry(self) -> None:
-        '''Updates the projects that appears in the app. It updates the MenuBar and the button on the main screen.'''
+        '''Updates the projects that appears in the app. It updates the MenuBar and the list on the main screen.'''
         
-        self.project_names = self.sm.get_projects()
         self.load_projects_menu()
-        self.load_project_buttons()
+        self.projects_lc.refresh()
 
     def load_projects_menu(self) -> None:
         self.menu.Remove(1)
@@ -147,48 +163,29 @@ class MainFrame(wx.Frame):
 
         self.Bind(wx.EVT_MENU, self.on_create_project, create)
 
-        for name in self.project_names:
-            projects_menu.Append(-1, name)
+        # Only the recent ones. The others are found with the search box.
+        for name in self.sm.catalog.recent_projects(RECENT_PROJECTS_IN_MENU):
+            item = projects_menu.Append(-1, name)
+            self.Bind(wx.EVT_MENU, lambda event, name=name: self._show_project(name), item)
 
         self.menu.Insert(1, projects_menu, 'Projects')
 
-    def load_project_buttons(self):
-        self.scrolled_sizer.Clear(True)
-        vbox = wx.BoxSizer(wx.VERTICAL)
+    def _on_project_selected(self, event) -> None:
+        row = self.projects_lc.get_row(event.GetIndex())
+        if row is not None:
+            self._show_project(row['name'])
 
-        create_btn = wx.Button(self.scrolled, -1, 'Create new project')
-        vbox.Add(create_btn, flag=wx.EXPAND)
-        create_btn.Bind(wx.EVT_BUTTON, self.on_create_project)
-
-        i = 0
-        for project in self.project_names:
-            border = 30 if i == 0 else 10
-            btn = wx.Button(self.scrolled, -1, project)
-            btn.Bind(wx.EVT_BUTTON, self._on_button_clicked)
-            vbox.Add(btn, flag=wx.TOP | wx.EXPAND, border=border)
-            i += 1
-
-        self.scrolled_sizer.Add(vbox)
-        self.scrolled_sizer.Add(wx.Size(5, 1))
-        self.scrolled.SetupScrolling(scroll_x=False)
-        self.Layout()
-
-    def _on_button_clicked(self, event) -> None:
-        name = event.GetEventObject().GetLabel()
-        path = os.path.join(self.sm.projects_path, name, 'project_settings.json')
-        data = {}
-        if os.path.isfile(path):
-            with open(path, "r", encoding="utf-8") as f:
-                text = f.read()
-                data = json.loads(text)
-        else:
-            show_modal_dialog(self, 'Error loading project data. File project_settings.json not found.', 'File not found', wx.OK | wx.ICON_ERROR)
+    def _show_project(self, name: str) -> None:
+        data = self.sm.get_project_info(name)
+        if data is None:
+            show_modal_dialog(self, 'Error loading project data. The project is not in the catalog.', 'Project not found', wx.OK | wx.ICON_ERROR)
             return
         
+        self.selected_project = name
         self.project_st.SetLabel(data['name'])
         self.description_st.SetLabel(data['description'])
-        self.files_number_st.SetLabel(str(data['number_files']))
-        self.transformer_name_st.SetLabel(data['model'])
+        self.files_number_st.SetLabel(str(data['file_count']))
+        self.transformer_name_st.SetLabel(data['transformer'])
         self.date_value_st.SetLabel(data['created_at'])
 
 
@@ -197,7 +194,11 @@ class MainFrame(wx.Frame):
         create_window.ShowModal()
         
     def _open_project(self, event) -> None:
-        window = Project(self, '', '')
+        if not self.selected_project:
+            return
+
+        path = os.path.join(self.sm.projects_path, self.selected_project)
+        window = Project(self, self.selected_project, path)
         window.Show()
         self.Hide()
     
@@ -1,5 +1,44 @@
+import os
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING
 import wx
 import wx.richtext as rt
+from DataManager import backend
+from DataManager.instrumentation import metrics
+from DataManager.job_scheduler import Job, JobScheduler
+from DataManager.paged_source import PagedSource
+from GUI.dialogs import show_modal_dialog
+from GUI.virtual_list import VirtualListCtrl, attach_search, format_seconds
+
+if TYPE_CHECKING:
+    from DataManager.live_transcriber import LiveTranscriber
+    from DataManager.project_manager import ProjectManager
+    from Prompter.prompter import Prompter
+
+
+class TokenBatcher():
+    """Hands streamed tokens to the GUI thread in batches, at most every `interval` seconds, so a fast stream
+    doesn't queue one `wx.CallAfter` per token. Used from a single worker thread."""
+
+    def __init__(self, write, interval: float = 0.05):
+        self.write = write
+        self.interval = interval
+        self._pending = []
+        self._last_flush = 0.0
+
+    def add(self, text: str) -> None:
+        self._pending.append(text)
+        # The first token goes right away, since that's the latency the user notices.
+        if self._last_flush == 0.0 or time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if self._pending:
+            wx.CallAfter(self.write, ''.join(self._pending))
+            self._pending = []
 
 class Project(wx.Frame):
     def __init__(self, parent: wx.Window, sanitized_name: str, path: str):
@@ -13,10 +52,320 @@ class Project(wx.Frame):
         super().__init__(parent, title=sanitized_name, size=(900, 700))
 
         self.parent = parent
+        self.sanitized_name = sanitized_name
+        self.path = path
+        self.pm = None
+        self._pm_lock = threading.Lock()
+        self.prompter = None
+        self.live_transcriber = None
+        self._recording_starting = False
+        self.answer_thread = None
+        self.answer_cancel = threading.Event()
+        self._answer_started = False
+        self.scheduler = None
         self.CreateStatusBar()
         self._init_ui()
         self.SetMinSize((900, 700))
         self.CenterOnScreen()
+        self._open_in_background()
+
+        metrics.subscribe(self._on_metric)
+        self.Bind(wx.EVT_CLOSE, self._on_close)
+
+    def _on_close(self, event) -> None:
+        metrics.unsubscribe(self._on_metric)
+        self.answer_cancel.set()
+        if self.scheduler is not None:
+            # Unfinished jobs stay queued and resume the next time the project is opened. Not waited for here:
+            # a scheduler opened again for the project waits for them to stop before it reads the queue.
+            self.scheduler.shutdown(wait=False)
+        if self.live_transcriber is not None:
+            self.live_transcriber.stop()
+        event.Skip()
+
+    def _get_prompter(self) -> 'Prompter':
+        # Called from the answer thread: it may wait for the project to open, and imports langchain the first time.
+        if self.prompter is None:
+            self.prompter = backend.open_prompter(self._get_project_manager())
+        return self.prompter
+
+    def _on_input_key(self, event) -> None:
+        '''Sends the question on Enter (Shift+Enter breaks the line) and stops the answer on Escape.'''
+
+        if event.GetKeyCode() in (wx.WXK_RETURN, wx.WXK_NUMPAD_ENTER) and not event.ShiftDown():
+            question = self.input_tc.GetValue().strip()
+            if question:
+                self._ask(question)
+            return
+        if event.GetKeyCode() == wx.WXK_ESCAPE:
+            self._on_stop_answer(event)
+            return
+        event.Skip()
+
+    def _ask(self, question: str) -> None:
+        '''Answers a question in a worker thread, streaming the answer into the chat.'''
+
+        if self.answer_thread is not None and self.answer_thread.is_alive():
+            self.SetStatusText('Wait for the current answer, or press Esc to stop it.')
+            return
+
+        self.input_tc.Clear()
+        self._append_chat(f"You: {question}\n")
+        self._answer_started = False
+        self.answer_cancel = threading.Event()
+        cancel = self.answer_cancel
+        self.SetStatusText('Thinking...')
+
+        def run() -> None:
+            batcher = TokenBatcher(self._append_answer)
+            try:
+                prompter = self._get_prompter()
+                result = prompter.stream_answer(question, batcher.add, on_sources=lambda documents: wx.CallAfter(self._show_sources, documents), cancel=cancel)
+                batcher.flush()
+                wx.CallAfter(self._on_answer_done, result)
+            except Exception as e:
+                batcher.flush()
+                wx.CallAfter(self._on_answer_done, {'error': str(e)})
+
+        self.answer_thread = threading.Thread(target=run, daemon=True)
+        self.answer_thread.start()
+
+    def _on_stop_answer(self, event) -> None:
+        if self.answer_thread is not None and self.answer_thread.is_alive():
+            self.answer_cancel.set()
+            self.SetStatusText('Stopping the answer...')
+
+    def _append_chat(self, text: str) -> None:
+        # The window may have been closed while the call was queued.
+        if not self:
+            return
+
+        self.chat_rt.SetInsertionPointEnd()
+        self.chat_rt.WriteText(text)
+        self.chat_rt.ShowPosition(self.chat_rt.GetLastPosition())
+
+    def _append_answer(self, text: str) -> None:
+        if not self._answer_started:
+            self._answer_started = True
+            text = f"Bot: {text}"
+        self._append_chat(text)
+
+    def _show_sources(self, documents: list) -> None:
+        if not documents:
+            return
+        sources = ', '.join(f"{document.metadata.get('source', '?')} #{document.metadata.get('chunk', '?')}" for document in documents)
+        self._append_chat(f"Sources: {sources}\n")
+
+    def _on_answer_done(self, result: dict) -> None:
+        if not self:
+            return
+
+        self._append_chat('\n\n')
+        if 'error' in result:
+            self.SetStatusText(f"The question failed: {result['error']}")
+        elif result['cancelled']:
+            self.SetStatusText('Answer stopped.')
+        elif result['cached']:
+            self.SetStatusText('Answered from the cache.')
+        elif result['first_token_seconds'] is not None:
+            self.SetStatusText(f"First token in {result['first_token_seconds']:.2f}s")
+
+    def _on_metric(self, kind: str, name: str, value: float, labels: dict) -> None:
+        '''Receives the pipeline metrics, from any thread, and shows the finished spans on the GUI thread.'''
+
+        if kind == 'span':
+            wx.CallAfter(self._show_span, name, value, labels)
+
+    def _show_span(self, name: str, seconds: float, labels: dict) -> None:
+        # The window may have been closed while the call was queued.
+        if not self:
+            return
+
+        subject = labels.get('file') or labels.get('url')
+        self.log_rt.WriteText(f"{name} {subject}: {seconds:.2f}s\n" if subject else f"{name}: {seconds:.2f}s\n")
+        self.log_rt.ShowPosition(self.log_rt.GetLastPosition())
+
+        if name == 'transcribe' and 'file' in labels:
+            self.info_lc.SetItem(0, 1, labels['file'])
+            self.info_lc.SetItem(3, 1, f"{seconds:.1f}s")
+            self.files_lc.refresh()
+        self.SetStatusText(f"Peak memory: {metrics.peak_memory_mb:.0f} MB")
+
+    def _on_file_selected(self, event) -> None:
+        '''Shows what the catalog knows about the selected file.'''
+
+        row = self.files_lc.get_row(event.GetIndex())
+        if row is None:
+            return
+
+        project = self.parent.sm.get_project_info(self.sanitized_name) or {}
+        values = [
+            row['filename'],
+            format_seconds(row['duration']),
+            datetime.fromtimestamp(row['added_at']).strftime('%Y-%m-%d %H:%M'),
+            f"{row['processing_seconds']:.1f}s" if row['processing_seconds'] is not None else '',
+            row['language'],
+            row['source_url'] or 'Local file',
+            row['model'],
+            project.get('llm', ''),
+            project.get('database', ''),
+        ]
+        for i, value in enumerate(values):
+            self.info_lc.SetItem(i, 1, value)
+
+    def _open_in_background(self) -> None:
+        '''Builds the project manager in a background thread, so the window shows right away, then starts the
+        scheduler on the GUI thread and preloads the project's default transformer, so the first transcription
+        doesn't wait for it.'''
+
+        if not os.path.isfile(os.path.join(self.path, 'project_settings.json')):
+            return
+
+        self.SetStatusText('Opening the project...')
+
+        def run() -> None:
+            try:
+                pm = self._get_project_manager()
+            except Exception as e:
+                wx.CallAfter(self._on_open_failed, str(e))
+                return
+            wx.CallAfter(self._start_scheduler)
+            try:
+                # Loaded through the project manager, with the same registry key its transcriptions use.
+                pm.get_model()
+            except Exception as e:
+                print(f"Couldn't preload the model of {self.sanitized_name}: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _on_open_failed(self, error: str) -> None:
+        if not self:
+            return
+        self.SetStatusText(f"Couldn't open the project: {error}")
+
+    def _start_scheduler(self) -> None:
+        '''Starts running the project background jobs, resuming the ones left unfinished.'''
+
+        # The window may have been closed while the project was opening.
+        if not self:
+            return
+
+        pm = self._get_project_manager()
+        self.scheduler = JobScheduler(pm.project_path, pm.get_job_handlers(), pm.app_data['user_config'].get('job_concurrency'),
+                                      on_event=lambda job: wx.CallAfter(self._on_job_event, job))
+        self.scheduler.start()
+        self.SetStatusText('Ready.')
+
+    def _on_job_event(self, job: Job) -> None:
+        # The window may have been closed while the call was queued.
+        if not self:
+            return
+
+        if job.status == 'running' and job.progress is not None:
+            self.SetStatusText(f"{job.kind}: {job.progress:.0%} {job.message}")
+        elif job.status == 'running':
+            self.SetStatusText(f"{job.kind}: {job.message or 'running'}")
+        elif job.finished:
+            self.files_lc.refresh()
+            text = f"{job.kind} job {job.status}" + (f": {job.error}" if job.error else '')
+            self.log_rt.WriteText(f"{text}\n")
+            self.log_rt.ShowPosition(self.log_rt.GetLastPosition())
+            self.SetStatusText(text)
+
+    def _submit_job(self, kind: str, payload: dict | None = None) -> None:
+        if self.scheduler is None:
+            if os.path.isfile(os.path.join(self.path, 'project_settings.json')):
+                message = 'The project is still opening, try again in a moment.'
+            else:
+                message = 'Configure the project before adding media.'
+            show_modal_dialog(self, message, 'Project not ready', wx.OK | wx.ICON_ERROR)
+            return
+        self.scheduler.submit(kind, payload)
+        self.SetStatusText(f"{kind} job queued.")
+
+    def _on_add_link(self, event) -> None:
+        '''Asks for a link and downloads it in the background. The transcription is queued when it arrives.'''
+
+        with wx.TextEntryDialog(self, 'Video, playlist or channel link:', 'Add a link') as dialog:
+            if dialog.ShowModal() != wx.ID_OK or not dialog.GetValue().strip():
+                return
+            self._submit_job('download', {'url': dialog.GetValue().strip()})
+
+    def _on_add_file(self, event) -> None:
+        '''Copies media files into the project and transcribes them, both in the background.'''
+
+        with wx.FileDialog(self, 'Add a file', style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST | wx.FD_MULTIPLE) as dialog:
+            if dialog.ShowModal() != wx.ID_OK:
+                return
+            paths = dialog.GetPaths()
+
+        self._submit_job('download', {'paths': paths})
+
+    def _on_cancel_jobs(self, event) -> None:
+        if self.scheduler is None:
+            return
+        cancelled = sum(self.scheduler.cancel(job.job_id) for job in self.scheduler.jobs())
+        self.SetStatusText(f"{cancelled} background jobs cancelled." if cancelled else 'No background jobs.')
+
+    def _get_project_manager(self) -> 'ProjectManager':
+        # Built once, by the opening thread or by whatever needs it first.
+        with self._pm_lock:
+            if self.pm is None:
+                self.pm = backend.open_project(self.parent.sm.app_path, self.sanitized_name)
+            return self.pm
+
+    def _on_record_microphone(self, event) -> None:
+        '''Starts live transcription from the microphone, or stops it if it's already running.'''
+
+        if self._recording_starting:
+            self.SetStatusText('The recording is still starting.')
+            return
+        if self.live_transcriber is not None:
+            self.live_transcriber.stop()
+            self.live_transcriber = None
+            self.mic_live_recording.SetItemLabel('Record from microphone')
+            self.SetStatusText('Recording stopped.')
+            return
+
+        try:
+            import sounddevice  # noqa: F401
+        except ImportError:
+            show_modal_dialog(self, 'Recording from a microphone requires the sounddevice package.', 'Missing package', wx.OK | wx.ICON_ERROR)
+            return
+
+        self._recording_starting = True
+        self.SetStatusText('Starting the recording...')
+
+        def run() -> None:
+            # The project may still be opening, and its vector index is loaded here the first time.
+            try:
+                from DataManager.live_transcriber import MicrophoneSource
+
+                transcriber, _ = self._get_project_manager().start_live_transcription(
+                    MicrophoneSource(),
+                    on_partial=lambda text: wx.CallAfter(self.SetStatusText, text),
+                    on_final=lambda text, start, end: wx.CallAfter(self.log_rt.WriteText, f"[{start:.1f}s] {text}\n"))
+            except Exception as e:
+                wx.CallAfter(self._on_recording_started, None, str(e))
+                return
+            wx.CallAfter(self._on_recording_started, transcriber)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _on_recording_started(self, transcriber: 'LiveTranscriber | None', error: str = '') -> None:
+        # The window may have been closed while the recording was starting.
+        if not self:
+            if transcriber is not None:
+                transcriber.stop()
+            return
+
+        self._recording_starting = False
+        if transcriber is None:
+            self.SetStatusText(f"Couldn't start the recording: {error}")
+            return
+        self.live_transcriber = transcriber
+        self.mic_live_recording.SetItemLabel('Stop recording')
+        self.SetStatusText('Recording...')
 
     def _init_ui(self):
         '''Initializes the UI.'''
@@ -27,7 +376,16 @@ class Project(wx.Frame):
 
         self.chat_rt = rt.RichTextCtrl(panel, -1, style=wx.TE_READONLY)
         self.input_tc = wx.TextCtrl(panel, -1, style=wx.TE_MULTILINE)
-        self.files_lc = wx.ListCtrl(panel, -1)
+        self.input_tc.Bind(wx.EVT_KEY_DOWN, self._on_input_key)
+        catalog = self.parent.sm.catalog
+        self.files_search = wx.SearchCtrl(panel, -1)
+        self.files_search.SetDescriptiveText('Search files')
+        files_source = PagedSource(lambda search, offset, limit: catalog.list_files(self.sanitized_name, search, offset, limit),
+                                   lambda search: catalog.count_files(self.sanitized_name, search))
+        self.files_lc = VirtualListCtrl(panel, files_source, [('File', 'filename', 150), ('Duration', 'duration', 60), ('Status', 'status', 80)],
+                                        {'duration': format_seconds})
+        self.files_lc.Bind(wx.EVT_LIST_ITEM_SELECTED, self._on_file_selected)
+        attach_search(self.files_search, self.files_lc)
         self.log_rt = rt.RichTextCtrl(panel, -1, style=wx.TE_READONLY)
 
         self.info_lc = wx.ListCtrl(panel, -1, size=(310, 220), style=wx.LC_REPORT)
@@ -50,7 +408,8 @@ class Project(wx.Frame):
         chat_box.Add(self.input_tc, proportion=0, flag=wx.TOP | wx.EXPAND, border=5)
         
         files_box = wx.BoxSizer(wx.VERTICAL)
-        files_box.Add(self.files_lc, proportion=3, flag=wx.EXPAND)
+        files_box.Add(self.files_search, proportion=0, flag=wx.EXPAND)
+        files_box.Add(self.files_lc, proportion=3, flag=wx.TOP | wx.EXPAND, border=5)
         files_box.Add(self.info_lc, proportion=0, flag=wx.TOP | wx.EXPAND, border=10)
 
         top_box = wx.BoxSizer(wx.HORIZONTAL)   
@@ -79,16 +438,19 @@ class Project(wx.Frame):
         # -- Project menu -- #
         settings = projects.Append(-1, 'Settings', 'Open this project settings.')
         close_project = projects.Append(-1, 'Close the project', 'Close this project and return to the main screen.')
+        projects.AppendSeparator()
+        cancel_jobs = projects.Append(-1, 'Cancel background jobs', 'Cancel the downloads, transcriptions and indexing in progress.')
 
         # -- Chat menu -- #
         new_conversation = chat.Append(-1, 'New chat', 'Start a new conversation')
         save_conversation = chat.Append(-1, 'Save chat', 'Save this chat')
         delete_conversation = chat.Append(-1, 'Delete chat', 'Delete this chat')
         chat.AppendSeparator()
+        stop_answer = chat.Append(-1, 'Stop answer', 'Stop the answer being written.')
 
         # -- Add menu -- #
         add_live_recording = add.Append(-1, 'Record from system', 'Record the system audio.')
-        mic_live_recording = add.Append(-1, 'Record from microphone', 'Record from a microphone.')
+        self.mic_live_recording = add.Append(-1, 'Record from microphone', 'Record from a microphone.')
         media_files = add.Append(-1, 'Add a file', 'Add a audio or video file.')
         online_link = add.Append(-1, 'Add a link', 'Add a link from a internet content.')
 
@@ -113,5 +475,11 @@ class Project(wx.Frame):
         menu.Append(model, 'Model')
         menu.Append(log, 'Log')
 
+        self.Bind(wx.EVT_MENU, self._on_record_microphone, self.mic_live_recording)
+        self.Bind(wx.EVT_MENU, self._on_stop_answer, stop_answer)
+        self.Bind(wx.EVT_MENU, self._on_add_file, media_files)
+        self.Bind(wx.EVT_MENU, self._on_add_link, online_link)
+        self.Bind(wx.EVT_MENU, self._on_cancel_jobs, cancel_jobs)
+
         self.SetMenuBar(menu)
 
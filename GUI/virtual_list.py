@@ -0,0 +1,98 @@
+from typing import Callable
+import wx
+from DataManager.paged_source import PagedSource
+
+
+def format_seconds(seconds: float | None) -> str:
+    """Formats a duration as `m:ss`, or `h:mm:ss` from an hour on. Empty if it's unknown."""
+
+    if seconds is None:
+        return ''
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class VirtualListCtrl(wx.ListCtrl):
+    """A report list that holds no items. It asks its `PagedSource` for the text of the rows being drawn,
+    so it's as fast to build and as light with thousands of rows as with a few."""
+
+    def __init__(self, parent: wx.Window, source: PagedSource, columns: list[tuple[str, str, int]],
+                 formatters: dict[str, Callable[[object], str]] | None = None):
+        """
+        Args:
+            parent (wx.Window): Parent of this control.
+            source (PagedSource): Where the rows come from.
+            columns (list[tuple[str, str, int]]): (title, row key, width) of each column.
+            formatters (dict[str, Callable[[object], str]] | None): Turns the values of some keys into text.
+                Other values are shown with `str`.
+        """
+
+        super().__init__(parent, -1, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_SINGLE_SEL)
+        self.source = source
+        self.columns = columns
+        self.formatters = formatters or {}
+        for i, (title, _, width) in enumerate(columns):
+            self.InsertColumn(i, title, width=width)
+        self.SetItemCount(len(source))
+
+    def OnGetItemText(self, item: int, column: int) -> str:
+        row = self.source.row(item)
+        if row is None:
+            return ''
+        key = self.columns[column][1]
+        value = row.get(key)
+        if key in self.formatters:
+            return self.formatters[key](value)
+        return '' if value is None else str(value)
+
+    def get_row(self, index: int) -> dict | None:
+        return self.source.row(index) if 0 <= index < self.GetItemCount() else None
+
+    def selected_row(self) -> dict | None:
+        return self.get_row(self.GetFirstSelected())
+
+    def _clear_selection(self) -> None:
+        while (index := self.GetFirstSelected()) != -1:
+            self.Select(index, False)
+
+    def set_search(self, text: str) -> None:
+        """Shows only the rows matching a search text."""
+
+        self._clear_selection()
+        self.source.set_search(text)
+        self.SetItemCount(len(self.source))
+        self.Refresh()
+
+    def refresh(self) -> None:
+        """Picks up changes of the data, redrawing only the visible rows that changed."""
+
+        first = self.GetTopItem()
+        last = first + self.GetCountPerPage()
+        count, changed = self.source.refresh(first, last)
+        if count != self.GetItemCount():
+            if self.GetFirstSelected() >= count:
+                self._clear_selection()
+            self.SetItemCount(count)
+        for index in changed:
+            if index < count:
+                self.RefreshItem(index)
+
+
+def attach_search(search: wx.SearchCtrl, list_ctrl: VirtualListCtrl, delay_ms: int = 150) -> None:
+    """Filters a list as the user types in a search box, once typing pauses for `delay_ms`."""
+
+    timer = wx.CallLater(delay_ms, lambda: list_ctrl.set_search(search.GetValue().strip()))
+    timer.Stop()
+
+    def on_text(event) -> None:
+        timer.Restart(delay_ms)
+
+    def on_cancel(event) -> None:
+        search.ChangeValue('')
+        timer.Stop()
+        list_ctrl.set_search('')
+
+    search.ShowCancelButton(True)
+    search.Bind(wx.EVT_TEXT, on_text)
+    search.Bind(wx.EVT_SEARCHCTRL_CANCEL_BTN, on_cancel)
@@ -0,0 +1,199 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """Lowercases a question and drops extra spaces and the ending punctuation, so trivially different
+    spellings of the same question share an entry."""
+
+    return re.sub(r'\s+', ' ', question).strip().rstrip('?!. ').lower()
+
+
+class AnswerCache():
+    """Disk-backed cache of answers, keyed by (project, index version, question).
+
+    A question matches an entry if it's the same after `normalize_question`, or if its embedding has a cosine
+    similarity of at least `similarity_threshold` with the embedding of a cached question. Entries of an older index
+    version are dropped the first time the project is queried with a newer one, and entries older than `ttl_seconds`
+    or over `max_entries` are removed, least recently used first.
+    """
+
+    def __init__(self, path: str, similarity_threshold: float = 0.95, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 5000):
+        """
+        Args:
+            path (str): Path of the SQLite file, usually `~/.HandySpeechBot/answers.sqlite`.
+            similarity_threshold (float): Minimum cosine similarity for a different question to reuse an answer.
+                1.0 or more turns similarity matching off, leaving only exact matches.
+            ttl_seconds (float): How long an answer is kept.
+            max_entries (int): Maximum number of answers kept.
+        """
+
+        self.path = path
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS answers (
+                                  project TEXT NOT NULL,
+                                  version TEXT NOT NULL,
+                                  question TEXT NOT NULL,
+                                  vector BLOB,
+                                  answer TEXT NOT NULL,
+                                  seconds REAL NOT NULL,
+                                  created_at REAL NOT NULL,
+                                  last_used REAL NOT NULL,
+                                  PRIMARY KEY (project, version, question))""")
+        self._conn.execute('CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)')
+        self._conn.commit()
+
+    @property
+    def uses_similarity(self) -> bool:
+        return self.similarity_threshold < 1.0
+
+    def _check_version(self, project: str, version: str) -> None:
+        """Drops the answers of the older versions of a project index."""
+
+        if self._versions.get(project) == version:
+            return
+        self._conn.execute('DELETE FROM answers WHERE project = ? AND version != ?', (project, version))
+        self._conn.commit()
+        self._versions[project] = version
+
+    def _hit(self, project: str, version: str, question: str, answer: str, seconds: float) -> dict:
+        self._conn.execute('UPDATE answers SET last_used = ? WHERE project = ? AND version = ? AND question = ?', (time.time(), project, version, question))
+        self._conn.commit()
+        self.seconds_saved += seconds
+        return json.loads(answer)
+
+    def lookup(self, project: str, version: str, question: str, embed: Callable[[], list[float]] | None = None) -> tuple[dict | None, list[float] | None]:
+        """Looks up an answer to this question, first by exact match and then by similarity.
+
+        Args:
+            project (str): The project, like the path of its index.
+            version (str): Version of the project index, as `RetrieverCache.version` reads it.
+            question (str): The question.
+            embed (Callable[[], list[float]] | None): Returns the embedding of the question. Only called if there's
+                no exact match and similarity matching is on.
+
+        Returns:
+            tuple[dict | None, list[float] | None]: The cached answer, or None, and the embedding of the question
+                if it was calculated, so it can be given to `put`.
+        """
+
+        normalized = normalize_question(question)
+        with self._lock:
+            self._check_version(project, version)
+            row = self._conn.execute('SELECT answer, seconds FROM answers WHERE project = ? AND version = ? AND question = ? AND created_at > ?',
+                                     (project, version, normalized, time.time() - self.ttl_seconds)).fetchone()
+            if row is not None:
+                self.exact_hits += 1
+                return self._hit(project, version, normalized, *row), None
+
+        if embed is None or not self.uses_similarity:
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        # Embedding the question is a network call, so it's done outside the lock.
+        vector = embed()
+        with self._lock:
+            rows = self._conn.execute('SELECT question, vector, answer, seconds FROM answers WHERE project = ? AND version = ? AND vector IS NOT NULL AND created_at > ?',
+                                      (project, version, time.time() - self.ttl_seconds)).fetchall()
+            if rows:
+                query = np.asarray(vector, dtype=np.float32)
+                matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                similarities = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-10)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    self.similar_hits += 1
+                    cached_question, _, answer, seconds = rows[best]
+                    return self._hit(project, version, cached_question, answer, seconds), vector
+
+            self.misses += 1
+            return None, vector
+
+    def put(self, project: str, version: str, question: str, answer: dict, seconds: float, vector: list[float] | None = None) -> None:
+        """Stores an answer, then removes the expired entries and the least recently used ones over `max_entries`.
+
+        Args:
+            project (str): The project, like the path of its index.
+            version (str): Version of the index the answer came from.
+            question (str): The question.
+            answer (dict): The answer. Only its text fields are kept.
+            seconds (float): How long the answer took, reported as saved on every hit.
+            vector (list[float] | None): Embedding of the question, needed for similarity matches.
+        """
+
+        # The retrieved documents aren't serializable, and the GUI only shows the text.
+        answer = {key: value for key, value in answer.items() if isinstance(value, str)}
+        blob = np.asarray(vector, dtype=np.float32).tobytes() if vector is not None else None
+        now = time.time()
+        with self._lock:
+            self._check_version(project, version)
+            self._conn.execute('INSERT OR REPLACE INTO answers (project, version, question, vector, answer, seconds, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               (project, version, normalize_question(question), blob, json.dumps(answer), seconds, now, now))
+            self._conn.execute('DELETE FROM answers WHERE created_at <= ?', (now - self.ttl_seconds,))
+            self._conn.execute('DELETE FROM answers WHERE rowid IN (SELECT rowid FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+            self._conn.commit()
+
+    def invalidate(self, project: str) -> None:
+        """Removes every answer of a project."""
+
+        with self._lock:
+            self._conn.execute('DELETE FROM answers WHERE project = ?', (project,))
+            self._conn.commit()
+            self._versions.pop(project, None)
+
+    def stats(self) -> dict:
+        """Returns the `exact_hits`, `similar_hits`, `misses`, `hit_rate` and `seconds_saved` since the cache was opened."""
+
+        hits = self.exact_hits + self.similar_hits
+        total = hits + self.misses
+        return {
+            'exact_hits': self.exact_hits,
+            'similar_hits': self.similar_hits,
+            'misses': self.misses,
+            'hit_rate': hits / total if total else 0.0,
+            'seconds_saved': self.seconds_saved,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM answers')
+            self._conn.commit()
+            self._versions.clear()
+
+
+_default_cache = None
+
+
+def get_default_answer_cache(options: dict | None = None) -> AnswerCache:
+    """Returns the cache shared by every project, in `~/.HandySpeechBot/answers.sqlite`.
+
+    Args:
+        options (dict | None): The `answer_cache` section of the app configuration, with the `similarity_threshold`,
+            `ttl_hours` and `max_entries`. Applied to the shared cache when given.
+    """
+
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = AnswerCache(os.path.join(os.path.expanduser("~"), ".HandySpeechBot", "answers.sqlite"))
+
+    if options:
+        _default_cache.similarity_threshold = options.get('similarity_threshold', _default_cache.similarity_threshold)
+        _default_cache.ttl_seconds = options.get('ttl_hours', _default_cache.ttl_seconds / 3600) * 3600
+        _default_cache.max_entries = options.get('max_entries', _default_cache.max_entries)
+    return _default_cache
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Shared by every retriever. The vector search of a query runs here while its lexical search runs in the calling thread.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='retrieval')
+
+MODES = ('hybrid', 'vector', 'lexical')
+
+
+def reciprocal_rank_fusion(rankings: list[list[Document]], k: int = 60) -> list[Document]:
+    """Merges several rankings of chunks, scoring each chunk by the sum of 1 / (k + rank) over the rankings it's in.
+
+    Args:
+        rankings (list[list[Document]]): The results of each retriever, best first.
+        k (int): Dampens the weight of the first ranks. 60 is the usual value.
+
+    Returns:
+        list[Document]: Every chunk once, best first.
+    """
+
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            key = (document.metadata['source'], document.metadata.get('chunk')) if 'source' in document.metadata else document.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            documents.setdefault(key, document)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class HybridRetriever(BaseRetriever):
+    """Retrieves chunks with the FAISS store and the BM25 `LexicalIndex` at the same time and fuses both rankings.
+
+    Dense embeddings miss names, product codes and jargon that keyword search finds, and the other way around
+    for paraphrases. With `mode` 'vector' or 'lexical' only one of them is used, and 'lexical' needs no embedding call.
+    """
+
+    vectorstore: Any = None
+    lexical: Any = None
+    mode: str = 'hybrid'
+    k: int = 4
+    fetch_k: int = 10
+    rrf_k: int = 60
+
+    def _vector_search(self, query: str, k: int) -> list[Document]:
+        return self.vectorstore.similarity_search(query, k=k)
+
+    def _lexical_search(self, query: str, k: int) -> list[Document]:
+        return [Document(page_content=match.text, metadata={'source': match.source, 'chunk': match.chunk}) for match in self.lexical.search(query, k)]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        if self.mode == 'vector' or (self.mode == 'hybrid' and self.lexical is None):
+            return self._vector_search(query, self.k)
+        if self.mode == 'lexical' or self.vectorstore is None:
+            return self._lexical_search(query, self.k)
+
+        vector = _executor.submit(self._vector_search, query, self.fetch_k)
+        lexical = self._lexical_search(query, self.fetch_k)
+        return reciprocal_rank_fusion([vector.result(), lexical], self.rrf_k)[:self.k]
@@ -1,17 +1,215 @@
+import os
+import threading
+import time
+from typing import Callable
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain.chains import RetrievalQA
+from langchain.chains.retrieval_qa.prompt import PROMPT
 from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from DataManager.instrumentation import metrics
+from DataManager.lexical_index import LexicalIndex
+from Prompter.answer_cache import AnswerCache, get_default_answer_cache
+from Prompter.hybrid_retriever import MODES, HybridRetriever
+from Prompter.retriever_cache import RetrieverCache, retriever_cache
 
 
 class Prompter:
-    def __init__(self):
-        self.save_dir = 'app/vault/'
-        self.llm = ChatOpenAI(model='gpt-3.5-turbo-0125')
+    def __init__(self, save_dir: str = 'app/vault/', index_name: str = 'index', embeddings=None, llm=None, cache: RetrieverCache | None = None,
+                 answer_cache: AnswerCache | None = None, cache_answers: bool = True, mode: str = 'hybrid'):
+        """Answers questions about a project, from its vector store.
 
-        embeddings = OpenAIEmbeddings()
-        self.vectordb = FAISS.load_local(folder_path=self.save_dir, embeddings=embeddings, allow_dangerous_deserialization=True)
-        self.qa_chain = RetrievalQA.from_chain_type(llm=ChatOpenAI(model="gpt-3.5-turbo", temperature=0), chain_type="stuff", retriever=self.vectordb.as_retriever())
+        Nothing is loaded here. The store is taken from the shared `RetrieverCache` on the first question,
+        and taken again whenever the project index gets a new version.
 
-    def ask_question(self, question: str) -> str:
-        answer = self.qa_chain.invoke(question)
-        return answer
\ No newline at end of file
+        Args:
+            save_dir (str): Folder of the FAISS index, like a project `databases` folder.
+            index_name (str): Name of the index files.
+            embeddings (Embeddings | None): Embedding model used to query the index. Defaults to `OpenAIEmbeddings`.
+            llm (BaseLanguageModel | None): Model that writes the answers. Defaults to `gpt-3.5-turbo`.
+            cache (RetrieverCache | None): Where the stores are kept. Defaults to the one shared by the process.
+            answer_cache (AnswerCache | None): Where answers are reused from. Defaults to the one shared by every project.
+            cache_answers (bool): If False, every question goes to the LLM.
+            mode (str): How chunks are retrieved: 'hybrid' (vector and BM25 search fused), 'vector' or 'lexical' (BM25 only,
+                without any embedding call).
+        """
+
+        if mode not in MODES:
+            raise ValueError(f"Unknown retrieval mode {mode}, expected one of {MODES}")
+
+        self.save_dir = save_dir
+        self.index_name = index_name
+        self.cache = cache or retriever_cache
+        self.answer_cache = (answer_cache or get_default_answer_cache()) if cache_answers else None
+        self._embeddings = embeddings
+        self._llm = llm
+        self.mode = mode
+        self._lexical = None
+        self._qa_chains = {}
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = OpenAIEmbeddings()
+        return self._embeddings
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+        return self._llm
+
+    @property
+    def vectordb(self) -> FAISS:
+        """The current store of the project index."""
+
+        store = self.cache.get(self.save_dir, self.index_name, self.embeddings)
+        if store is None:
+            raise FileNotFoundError(f"No vector store named {self.index_name} in {self.save_dir}")
+        return store
+
+    @property
+    def lexical(self) -> LexicalIndex | None:
+        """The BM25 index of the project, or None if it was never built."""
+
+        if self._lexical is None and os.path.isfile(os.path.join(self.save_dir, f"{self.index_name}_bm25.sqlite")):
+            self._lexical = LexicalIndex(self.save_dir, self.index_name)
+        return self._lexical
+
+    def get_retriever(self, mode: str, k: int = 4) -> HybridRetriever:
+        """A retriever over the current store and BM25 index. 'hybrid' falls back to the vector store alone
+        when the project has no BM25 index.
+
+        Raises:
+            FileNotFoundError: If `mode` is 'lexical' and the project has no BM25 index.
+        """
+
+        if mode == 'lexical' and self.lexical is None:
+            raise FileNotFoundError(f"No lexical index named {self.index_name} in {self.save_dir}")
+        store = None if mode == 'lexical' else self.vectordb
+        return HybridRetriever(vectorstore=store, lexical=self.lexical, mode=mode, k=k)
+
+    def get_qa_chain(self, mode: str | None = None) -> RetrievalQA:
+        """The question answering chain of a retrieval mode, built again only when the store changed."""
+
+        mode = mode or self.mode
+        store = None if mode == 'lexical' else self.vectordb
+        if mode not in self._qa_chains or self._qa_chains[mode][0] is not store:
+            retriever = self.get_retriever(mode)
+            self._qa_chains[mode] = (store, RetrievalQA.from_chain_type(llm=self.llm, chain_type="stuff", retriever=retriever))
+        return self._qa_chains[mode][1]
+
+    @property
+    def qa_chain(self) -> RetrievalQA:
+        return self.get_qa_chain()
+
+    def search(self, query: str, k: int = 4, mode: str = 'lexical') -> list[Document]:
+        """Retrieves the chunks that best match `query`, without asking the LLM. In 'lexical' mode it makes no
+        network call at all, so it's fast enough to run while the user types.
+
+        Args:
+            query (str): Free text, like a question or a few keywords.
+            k (int): Maximum number of chunks.
+            mode (str): 'lexical', 'vector' or 'hybrid'.
+
+        Returns:
+            list[Document]: The chunks, best first, with their `source` and `chunk` position in the metadata.
+
+        Raises:
+            FileNotFoundError: If `mode` is 'lexical' and the project has no BM25 index.
+        """
+
+        with metrics.span('query', mode=mode, llm=False):
+            return self.get_retriever(mode, k).invoke(query)
+
+    def ask_question(self, question: str, mode: str | None = None) -> str:
+        """Answers a question, reusing the answer of the same or a very similar question asked since the index last changed.
+
+        Args:
+            question (str): The question.
+            mode (str | None): Retrieval mode for this question. Defaults to the one of the `Prompter`.
+        """
+
+        mode = mode or self.mode
+        with metrics.span('query', mode=mode) as labels:
+            if self.answer_cache is None:
+                return self.get_qa_chain(mode).invoke(question)
+
+            # Answers depend on what was retrieved, so each mode has its own entries.
+            project = f"{os.path.abspath(os.path.join(self.save_dir, self.index_name))}#{mode}"
+            version = self.cache.version(self.save_dir, self.index_name)
+            # Lexical questions skip the similarity match, which would need an embedding call.
+            embed = None if mode == 'lexical' else lambda: self.embeddings.embed_query(question)
+            answer, vector = self.answer_cache.lookup(project, version, question, embed)
+            labels['cached'] = answer is not None
+            if answer is not None:
+                metrics.count('answer_cache_hits')
+                # A similar question may have been cached, so the answer is given for this one.
+                return {**answer, 'query': question}
+
+            metrics.count('answer_cache_misses')
+            start = time.perf_counter()
+            answer = self.get_qa_chain(mode).invoke(question)
+            self.answer_cache.put(project, version, question, answer, time.perf_counter() - start, vector)
+        return answer
+
+    def stream_answer(self, question: str, on_token: Callable[[str], None], on_sources: Callable[[list[Document]], None] | None = None,
+                      cancel: threading.Event | None = None, mode: str | None = None) -> dict:
+        """Answers a question like `ask_question`, but hands over the retrieved chunks as soon as they are found
+        and the answer token by token, as the LLM writes it. Meant to run outside the GUI thread.
+
+        Args:
+            question (str): The question.
+            on_token (Callable[[str], None]): Called with each piece of the answer. A cached answer comes in one piece.
+            on_sources (Callable[[list[Document]], None] | None): Called with the retrieved chunks, before the LLM is asked.
+            cancel (threading.Event | None): When set, the answer stops at the next token.
+            mode (str | None): Retrieval mode for this question. Defaults to the one of the `Prompter`.
+
+        Returns:
+            dict: The `query`, the `result` written so far, whether it was `cancelled` or `cached`, and the
+                `first_token_seconds`, the time until the first piece of the answer.
+        """
+
+        mode = mode or self.mode
+        start = time.perf_counter()
+        with metrics.span('query', mode=mode, streamed=True) as labels:
+            project = f"{os.path.abspath(os.path.join(self.save_dir, self.index_name))}#{mode}"
+            version = self.cache.version(self.save_dir, self.index_name)
+            vector = None
+            if self.answer_cache is not None:
+                embed = None if mode == 'lexical' else lambda: self.embeddings.embed_query(question)
+                answer, vector = self.answer_cache.lookup(project, version, question, embed)
+                if answer is not None:
+                    metrics.count('answer_cache_hits')
+                    on_token(answer.get('result', ''))
+                    labels['cached'] = True
+                    return {**answer, 'query': question, 'cancelled': False, 'cached': True, 'first_token_seconds': time.perf_counter() - start}
+                metrics.count('answer_cache_misses')
+
+            documents = self.get_retriever(mode).invoke(question)
+            if on_sources:
+                on_sources(documents)
+
+            prompt = PROMPT.format(context='\n\n'.join(document.page_content for document in documents), question=question)
+            pieces = []
+            first_token_seconds = None
+            cancelled = False
+            for chunk in self.llm.stream(prompt):
+                if cancel is not None and cancel.is_set():
+                    cancelled = True
+                    break
+                # Chat models stream message chunks, plain LLMs stream strings.
+                text = getattr(chunk, 'content', chunk)
+                if not text:
+                    continue
+                if first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - start
+                pieces.append(text)
+                on_token(text)
+
+            answer = {'query': question, 'result': ''.join(pieces)}
+            labels['first_token_seconds'] = first_token_seconds
+            labels['cancelled'] = cancelled
+            if self.answer_cache is not None and not cancelled:
+                self.answer_cache.put(project, version, question, answer, time.perf_counter() - start, vector)
+        return {**answer, 'cancelled': cancelled, 'cached': False, 'first_token_seconds': first_token_seconds}
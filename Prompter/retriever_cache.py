@@ -0,0 +1,149 @@
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from langchain_community.vectorstores import FAISS
+
+
+def read_index_version(db_path: str, index_name: str) -> tuple[str, str, int]:
+    """Reads the version `VectorIndex.save` publishes with every build.
+
+    Returns:
+        tuple[str, str, int]: The version of the index, as `<index id>:<build number>`, the name of the FAISS files
+            of that version, and the modification time of its mapping file, in nanoseconds. The id is random for every
+            index, so a project deleted and created again doesn't repeat the versions of the old one. Empty, empty
+            and 0 if the index was never built.
+    """
+
+    mapping_path = os.path.join(db_path, f"{index_name}_chunks.json")
+    try:
+        mtime = os.stat(mapping_path).st_mtime_ns
+        with open(mapping_path, 'r', encoding='utf-8') as f:
+            mapping = json.load(f)
+        # Indexes saved before every version had its own files are in `<index_name>.faiss`.
+        return f"{mapping.get('index_id', '')}:{mapping.get('version', 0)}", mapping.get('store', index_name), mtime
+    except (OSError, ValueError):
+        return '', '', 0
+
+
+def load_faiss(db_path: str, store_name: str, embeddings) -> FAISS:
+    """Loads a FAISS store like `FAISS.load_local`, but memory-maps the index file when its type allows it,
+    so a large index isn't read into memory up front. Falls back to a normal read otherwise."""
+
+    import faiss
+
+    index_path = os.path.join(db_path, f"{store_name}.faiss")
+    try:
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        index = faiss.read_index(index_path)
+
+    # Written by `FAISS.save_local` next to the index, from this app's own `VectorIndex`.
+    with open(os.path.join(db_path, f"{store_name}.pkl"), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+class RetrieverCache():
+    """Keeps the vector stores of the most recently queried projects loaded, so switching between projects doesn't
+    read their indexes from disk again.
+
+    Stores are loaded on first use and keyed by (db_path, index_name). Before a store is returned, the version of its
+    index on disk is checked, and the store is reloaded if `build_vector_store` published a new one meanwhile.
+    """
+
+    def __init__(self, max_projects: int = 4):
+        self.max_projects = max_projects
+        self._stores: OrderedDict[tuple, tuple[str, FAISS]] = OrderedDict()
+        self._mtimes: dict[tuple, tuple[str, str, int]] = {}
+        self._lock = threading.RLock()
+        self._key_locks: dict[tuple, threading.Lock] = {}
+
+    def version(self, db_path: str, index_name: str) -> str:
+        """Returns the version of an index on disk (see `read_index_version`). The mapping is only read again when its file changes."""
+
+        return self._read_mapping(db_path, index_name)[0]
+
+    def _read_mapping(self, db_path: str, index_name: str) -> tuple[str, str]:
+        """Returns the version of an index on disk and the name of its FAISS files, reading them only when the mapping changed."""
+
+        key = (os.path.abspath(db_path), index_name)
+        mapping_path = os.path.join(db_path, f"{index_name}_chunks.json")
+        try:
+            mtime = os.stat(mapping_path).st_mtime_ns
+        except OSError:
+            return '', ''
+
+        with self._lock:
+            cached = self._mtimes.get(key)
+            if cached and cached[2] == mtime:
+                return cached[0], cached[1]
+
+        version, store_name, mtime = read_index_version(db_path, index_name)
+        with self._lock:
+            self._mtimes[key] = (version, store_name, mtime)
+        return version, store_name
+
+    def get(self, db_path: str, index_name: str, embeddings) -> FAISS | None:
+        """Returns the store of an index, loading it only if it isn't loaded yet or its version changed.
+
+        Args:
+            db_path (str): The project `databases` folder.
+            index_name (str): Name of the index files.
+            embeddings (Embeddings): Embedding model used to query the index.
+
+        Returns:
+            FAISS | None: The store, or None if the index was never built.
+        """
+
+        key = (os.path.abspath(db_path), index_name)
+        version, store_name = self._read_mapping(db_path, index_name)
+        if not store_name or not os.path.isfile(os.path.join(db_path, f"{store_name}.faiss")):
+            return None
+
+        with self._lock:
+            if key in self._stores and self._stores[key][0] == version:
+                self._stores.move_to_end(key)
+                return self._stores[key][1]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given index, the others wait for it instead of loading a copy.
+        with key_lock:
+            with self._lock:
+                if key in self._stores and self._stores[key][0] == version:
+                    self._stores.move_to_end(key)
+                    return self._stores[key][1]
+
+            print(f"Loading vector store {index_name} (version {version})")
+            store = load_faiss(db_path, store_name, embeddings)
+
+            with self._lock:
+                self._stores[key] = (version, store)
+                self._stores.move_to_end(key)
+                while len(self._stores) > self.max_projects:
+                    evicted, _ = self._stores.popitem(last=False)
+                    print(f"Unloading vector store {evicted[1]}")
+                self._key_locks.pop(key, None)
+            return store
+
+    def invalidate(self, db_path: str, index_name: str) -> bool:
+        """Drops a store, so the next query loads it again.
+
+        Returns:
+            bool: True if the store was loaded. False otherwise.
+        """
+
+        key = (os.path.abspath(db_path), index_name)
+        with self._lock:
+            self._mtimes.pop(key, None)
+            return self._stores.pop(key, None) is not None
+
+    def loaded_stores(self) -> list[tuple]:
+        """Returns the keys of the loaded stores, from least to most recently used."""
+
+        with self._lock:
+            return list(self._stores.keys())
+
+
+retriever_cache = RetrieverCache()
@@ -0,0 +1,15 @@
+import argparse
+import uvicorn
+from Service.app import create_app
+from Service.service import HeadlessService
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves the Handy Speech Bot projects over HTTP, without a GUI.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--job-workers', type=int, help='Processes for downloads, transcription and indexing.')
+    parser.add_argument('--query-workers', type=int, help='Processes answering questions.')
+    args = parser.parse_args()
+
+    # A single event loop process: the work is spread over the service worker processes instead.
+    uvicorn.run(create_app(HeadlessService(job_workers=args.job_workers, query_workers=args.query_workers)), host=args.host, port=args.port)
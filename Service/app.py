@@ -0,0 +1,119 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from DataManager.job_scheduler import Job
+from Service.service import HeadlessService
+
+
+class ProjectIn(BaseModel):
+    name: str
+    description: str = ''
+    transformer: str | None = None
+
+
+class LinkIn(BaseModel):
+    url: str
+
+
+class QuestionIn(BaseModel):
+    question: str
+    mode: str | None = None
+
+
+def job_to_dict(project: str, job: Job) -> dict:
+    data = asdict(job)
+    # Results are whatever the handler returned. Only plain ones are sent.
+    if not isinstance(job.result, (str, int, float, bool, list, type(None))):
+        data['result'] = None
+    return {'project': project, **data}
+
+
+def create_app(service: HeadlessService | None = None) -> FastAPI:
+    """Builds the HTTP API of a `HeadlessService`, started and stopped with the app.
+
+    Every endpoint is async. File writes and job bookkeeping run in the thread pool, and the slow work in the
+    worker processes of the service, so the event loop is free to take other requests.
+
+    Args:
+        service (HeadlessService | None): The service. Defaults to one over the projects in the user folder.
+    """
+
+    service = service or HeadlessService()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await run_in_threadpool(service.start)
+        yield
+        await run_in_threadpool(service.shutdown)
+
+    app = FastAPI(title='Handy Speech Bot', lifespan=lifespan)
+    app.state.service = service
+
+    @app.exception_handler(FileNotFoundError)
+    async def not_found(request: Request, e: FileNotFoundError) -> JSONResponse:
+        return JSONResponse({'detail': str(e)}, status_code=404)
+
+    @app.exception_handler(FileExistsError)
+    async def conflict(request: Request, e: FileExistsError) -> JSONResponse:
+        return JSONResponse({'detail': str(e)}, status_code=409)
+
+    @app.exception_handler(ValueError)
+    async def bad_request(request: Request, e: ValueError) -> JSONResponse:
+        return JSONResponse({'detail': str(e)}, status_code=400)
+
+    @app.get('/projects')
+    async def list_projects(search: str = '', offset: int = 0, limit: int = 100) -> list[dict]:
+        return await run_in_threadpool(service.list_projects, search, offset, limit)
+
+    @app.post('/projects', status_code=201)
+    async def create_project(project: ProjectIn) -> dict:
+        return await run_in_threadpool(service.create_project, project.name, project.description, project.transformer)
+
+    @app.get('/projects/{name}')
+    async def get_project(name: str) -> dict:
+        return await run_in_threadpool(service.get_project, name)
+
+    @app.get('/projects/{name}/files')
+    async def list_files(name: str, search: str = '', offset: int = 0, limit: int = 100) -> list[dict]:
+        return await run_in_threadpool(service.list_files, name, search, offset, limit)
+
+    @app.delete('/projects/{name}', status_code=204)
+    async def delete_project(name: str) -> None:
+        await run_in_threadpool(service.delete_project, name)
+
+    @app.post('/projects/{name}/media', status_code=202)
+    async def upload_media(name: str, file: UploadFile = File(...)) -> dict:
+        job = await run_in_threadpool(service.add_media, name, file.filename, file.file)
+        return job_to_dict(name, job)
+
+    @app.post('/projects/{name}/links', status_code=202)
+    async def add_link(name: str, link: LinkIn) -> dict:
+        job = await run_in_threadpool(service.add_link, name, link.url)
+        return job_to_dict(name, job)
+
+    @app.post('/projects/{name}/index', status_code=202)
+    async def index(name: str) -> dict:
+        job = await run_in_threadpool(service.index, name)
+        return job_to_dict(name, job)
+
+    @app.get('/projects/{name}/jobs')
+    async def list_jobs(name: str) -> list[dict]:
+        return [job_to_dict(name, job) for job in service.jobs(name)]
+
+    @app.get('/jobs/{job_id}')
+    async def get_job(job_id: str) -> dict:
+        return job_to_dict(*service.get_job(job_id))
+
+    @app.delete('/jobs/{job_id}')
+    async def cancel_job(job_id: str) -> dict:
+        return {'cancelled': await run_in_threadpool(service.cancel_job, job_id)}
+
+    @app.post('/projects/{name}/questions')
+    async def ask(name: str, question: QuestionIn) -> dict:
+        return await asyncio.wrap_future(service.ask(name, question.question, question.mode))
+
+    return app
@@ -0,0 +1,281 @@
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, TimeoutError
+from contextlib import nullcontext
+from typing import BinaryIO
+from DataManager.job_scheduler import Job, JobCancelled, JobContext, JobScheduler
+from DataManager.settings import get_model_settings
+from DataManager.storage_manager import StorageManager
+from Prompter.hybrid_retriever import MODES
+from Service import worker
+
+# Finished jobs whose status can still be asked for, across every project.
+MAX_FINISHED_JOBS = 1000
+
+
+class HeadlessService():
+    """Serves the projects of a `StorageManager` without a GUI.
+
+    Downloads, transcription and indexing are queued in the `JobScheduler` of each project, like in the app, but run
+    in a pool of worker processes, and questions are answered in a second pool, so a long transcription never delays
+    an answer. Worker processes live as long as the service: the transformers, vector stores and caches they load
+    stay warm for the next request. Nothing here blocks for long, except `start` and `shutdown`.
+    """
+
+    def __init__(self, sm: StorageManager | None = None, job_workers: int | None = None, query_workers: int | None = None):
+        """
+        Args:
+            sm (StorageManager | None): The app storage. Defaults to the one in the user folder.
+            job_workers (int | None): Processes running downloads, transcription and indexing.
+                Defaults to `job_workers` in the `service` configuration.
+            query_workers (int | None): Processes answering questions. Defaults to `query_workers` in the `service` configuration.
+        """
+
+        self.sm = sm or StorageManager()
+        config = self.sm.app_data.get('service', {})
+        self.job_workers = job_workers or config.get('job_workers', 1)
+        self.query_workers = query_workers or config.get('query_workers', 2)
+        self.warm_up_model = config.get('warm_up_model', True)
+        self.job_pool = None
+        self.query_pool = None
+        self._manager = None
+        self._progress = None
+        self._lock = threading.Lock()
+        self._schedulers: dict[str, JobScheduler] = {}
+        # Transcription and indexing of a project change the same files, so they take turns across processes.
+        self._index_locks: dict[str, threading.Lock] = {}
+        # Bumped when a project is deleted, so the workers drop what they kept of it.
+        self._generations: dict[str, int] = {}
+        self._contexts: dict[str, JobContext] = {}
+        self._jobs: OrderedDict[str, tuple[str, Job]] = OrderedDict()
+
+    def start(self) -> None:
+        """Starts the worker processes and resumes the unfinished jobs of every project."""
+
+        # Forking a process with loaded models and threads is unsafe, so workers start fresh.
+        context = multiprocessing.get_context('spawn')
+        self._manager = context.Manager()
+        self._progress = self._manager.Queue()
+        # Same settings as `ProjectManager.get_model` for a single transcription, so the first job finds the model
+        # loaded. New projects get the model of the user configuration.
+        warm_up = get_model_settings(self.sm.app_data, self.sm.app_data['user_config']['model']) if self.warm_up_model else None
+        self.job_pool = ProcessPoolExecutor(self.job_workers, mp_context=context, initializer=worker.init_worker, initargs=(self.sm.app_path, warm_up))
+        self.query_pool = ProcessPoolExecutor(self.query_workers, mp_context=context, initializer=worker.init_worker, initargs=(self.sm.app_path, None))
+        threading.Thread(target=self._forward_progress, daemon=True).start()
+
+        # Only projects that ever had jobs can have unfinished ones. The others get a scheduler on their first job.
+        for project in self.sm.get_projects():
+            if os.path.isfile(os.path.join(self.sm.projects_path, project, 'jobs.sqlite')):
+                self._get_scheduler(project)
+
+    def shutdown(self) -> None:
+        """Stops the workers. Unfinished jobs stay queued and resume on the next `start`."""
+
+        with self._lock:
+            schedulers = list(self._schedulers.values())
+            self._schedulers.clear()
+        for scheduler in schedulers:
+            scheduler.shutdown(wait=False)
+        for pool in (self.job_pool, self.query_pool):
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+        if self._manager is not None:
+            self._progress.put(None)
+            self._manager.shutdown()
+
+    def _forward_progress(self) -> None:
+        """Hands the progress the workers report to the contexts of their jobs, which send it to the scheduler."""
+
+        while True:
+            try:
+                item = self._progress.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            job_id, progress, message = item
+            with self._lock:
+                context = self._contexts.get(job_id)
+            if context is not None:
+                context.report(progress, message)
+
+    def _handle(self, project: str, job: Job, context: JobContext) -> object:
+        """Runs a job in the worker pool, waiting for it in the scheduler thread and passing on cancellation."""
+
+        # Downloads of projects that don't keep the original media are transcribed and indexed in the same job.
+        locked = job.kind in ('transcribe', 'index') or (job.kind == 'download' and not self._keeps_original_media(project))
+        lock = self._index_locks[project] if locked else nullcontext()
+        with lock:
+            context.check()
+            cancel_event = self._manager.Event()
+            with self._lock:
+                self._contexts[job.job_id] = context
+            try:
+                future = self.job_pool.submit(worker.run_job, self.sm.app_path, project, self._generations.get(project, 0),
+                                              job, cancel_event, self._progress)
+                while True:
+                    try:
+                        result, follow_ups = future.result(timeout=0.5)
+                        break
+                    except TimeoutError:
+                        if context.cancelled:
+                            cancel_event.set()
+                            future.cancel()
+                    except CancelledError:
+                        raise JobCancelled()
+            finally:
+                with self._lock:
+                    self._contexts.pop(job.job_id, None)
+
+        for kind, payload, priority in follow_ups:
+            context.submit(kind, payload, priority)
+        return result
+
+    def _keeps_original_media(self, project: str) -> bool:
+        with open(os.path.join(self.sm.projects_path, project, 'project_settings.json'), 'r', encoding='utf-8') as f:
+            return json.load(f).get('keep_original_media', False)
+
+    def _on_job_event(self, project: str, job: Job) -> None:
+        with self._lock:
+            self._jobs[job.job_id] = (project, job)
+            self._jobs.move_to_end(job.job_id)
+            finished = [job_id for job_id, (_, other) in self._jobs.items() if other.finished]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self._jobs[job_id]
+
+    def _get_scheduler(self, project: str) -> JobScheduler:
+        self._check_project(project)
+        with self._lock:
+            if project not in self._schedulers:
+                handler = lambda job, context: self._handle(project, job, context)
+                scheduler = JobScheduler(os.path.join(self.sm.projects_path, project), {'download': handler, 'transcribe': handler, 'index': handler},
+                                         self.sm.app_data['user_config'].get('job_concurrency'),
+                                         on_event=lambda job: self._on_job_event(project, job))
+                self._index_locks.setdefault(project, threading.Lock())
+                self._schedulers[project] = scheduler
+                scheduler.start()
+            return self._schedulers[project]
+
+    def _check_project(self, project: str) -> None:
+        if not self.sm.does_project_exists(project):
+            raise FileNotFoundError(f"No project named {project}")
+
+    def list_projects(self, search: str = '', offset: int = 0, limit: int = 100) -> list[dict]:
+        """Returns a page of the projects in the catalog, sorted by name."""
+
+        return self.sm.catalog.list_projects(search, offset, limit)
+
+    def get_project(self, project: str) -> dict:
+        """Returns the catalog entry of a project, with the number of `jobs` queued or running."""
+
+        info = self.sm.get_project_info(project)
+        if info is None:
+            raise FileNotFoundError(f"No project named {project}")
+        return {**info, 'jobs': len(self.jobs(project))}
+
+    def list_files(self, project: str, search: str = '', offset: int = 0, limit: int = 100) -> list[dict]:
+        """Returns a page of the files of a project, with what the pipeline recorded about them."""
+
+        self._check_project(project)
+        return self.sm.catalog.list_files(project, search, offset, limit)
+
+    def create_project(self, name: str, description: str = '', transformer: str | None = None) -> dict:
+        """Creates a project.
+
+        Raises:
+            FileExistsError: If there is a project with the same sanitized name.
+        """
+
+        sanitized_name = self.sm.sanitize_folder_filename(name)
+        if self.sm.check_project_existence(sanitized_name):
+            raise FileExistsError(f"There is already a project named {sanitized_name}")
+        if self.sm.create_project_files(sanitized_name, description, transformer or self.sm.app_data['user_config']['model']) is None:
+            raise OSError(f"Couldn't create the files of project {sanitized_name}")
+        self._get_scheduler(sanitized_name)
+        return self.get_project(sanitized_name)
+
+    def delete_project(self, project: str) -> None:
+        """Cancels the jobs of a project and deletes its folder."""
+
+        self._check_project(project)
+        with self._lock:
+            scheduler = self._schedulers.pop(project, None)
+        if scheduler is not None:
+            for job in scheduler.jobs():
+                scheduler.cancel(job.job_id)
+            scheduler.shutdown(wait=True)
+        with self._lock:
+            self._generations[project] = self._generations.get(project, 0) + 1
+        self.sm.delete_project_dir(project)
+
+    def add_media(self, project: str, filename: str, data: BinaryIO) -> Job:
+        """Saves an uploaded media file to the project and queues its transcription.
+
+        Args:
+            project (str): The project, sanitized.
+            filename (str): Name of the file, as uploaded. Only the base name is kept.
+            data (BinaryIO): The file content.
+        """
+
+        scheduler = self._get_scheduler(project)
+        filename = self.sm.sanitize_folder_filename(os.path.basename(filename or '')).lstrip('.')
+        if not filename:
+            raise ValueError('The file has no name')
+
+        path = os.path.join(self.sm.projects_path, project, 'audios', filename)
+        # Written aside and moved, so a transcription never reads a partial upload.
+        with open(f"{path}.part", 'wb') as f:
+            while chunk := data.read(1024 * 1024):
+                f.write(chunk)
+        os.replace(f"{path}.part", path)
+        return scheduler.submit('transcribe')
+
+    def add_link(self, project: str, url: str) -> Job:
+        """Queues the download of a video, playlist or channel, which queues its transcription when it's done."""
+
+        return self._get_scheduler(project).submit('download', {'url': url})
+
+    def index(self, project: str) -> Job:
+        """Queues an update of the project vector store."""
+
+        return self._get_scheduler(project).submit('index')
+
+    def jobs(self, project: str) -> list[Job]:
+        """Returns the queued and running jobs of a project, in the order they will run."""
+
+        with self._lock:
+            scheduler = self._schedulers.get(project)
+        return scheduler.jobs() if scheduler is not None else []
+
+    def get_job(self, job_id: str) -> tuple[str, Job]:
+        """Returns a job and its project.
+
+        Raises:
+            FileNotFoundError: If the job is unknown, or finished long ago.
+        """
+
+        with self._lock:
+            if job_id not in self._jobs:
+                raise FileNotFoundError(f"No job {job_id}")
+            return self._jobs[job_id]
+
+    def cancel_job(self, job_id: str) -> bool:
+        project, job = self.get_job(job_id)
+        with self._lock:
+            scheduler = self._schedulers.get(project)
+        return scheduler is not None and scheduler.cancel(job.job_id)
+
+    def ask(self, project: str, question: str, mode: str | None = None) -> Future:
+        """Answers a question in the query pool.
+
+        Returns:
+            Future: Resolves to the text fields of the answer, like `query` and `result`.
+        """
+
+        self._check_project(project)
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"Unknown retrieval mode {mode}, expected one of {MODES}")
+        return self.query_pool.submit(worker.ask, self.sm.app_path, project, self._generations.get(project, 0), question, mode)
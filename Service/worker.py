@@ -0,0 +1,97 @@
+import os
+import signal
+from DataManager.job_scheduler import Job, JobCancelled
+from DataManager.model_registry import model_registry
+from DataManager.project_manager import ProjectManager
+from Prompter.answer_cache import get_default_answer_cache
+from Prompter.prompter import Prompter
+
+# Kept for the life of the worker process, so models, stores and answer caches stay loaded between requests.
+# Keyed by (app_path, project, generation). The generation changes when a project is deleted, so a new project
+# with the same name doesn't get the objects of the old one.
+_project_managers: dict[tuple[str, str, int], ProjectManager] = {}
+_handlers: dict[tuple[str, str, int], dict] = {}
+_prompters: dict[tuple[str, str, int], Prompter] = {}
+
+
+class WorkerContext():
+    """Stands in for a `JobContext` inside a worker process. Cancellation and progress go through
+    `multiprocessing.Manager` proxies, and follow-up jobs are returned to the service, which queues them."""
+
+    def __init__(self, job_id: str, cancel_event, progress_queue):
+        self.job_id = job_id
+        self.cancel_event = cancel_event
+        self.follow_ups = []
+        self._progress_queue = progress_queue
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def submit(self, kind: str, payload: dict | None = None, priority: int | None = None) -> None:
+        self.follow_ups.append((kind, payload, priority))
+
+    def check(self) -> None:
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def report(self, progress: float | None = None, message: str = '') -> None:
+        self._progress_queue.put((self.job_id, progress, message))
+
+
+def init_worker(app_path: str, warm_up: tuple[str, str, int, int] | None) -> None:
+    """Runs once in every worker process.
+
+    Args:
+        app_path (str): The app folder.
+        warm_up (tuple[str, str, int, int] | None): (model, compute_type, cpu_threads, num_workers) of a transformer
+            to load right away.
+    """
+
+    # Ctrl+C reaches the whole process group. The service shuts the pool down itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if warm_up is not None:
+        model, compute_type, cpu_threads, num_workers = warm_up
+        model_registry.warm_up(model, compute_type, cpu_threads, os.path.join(app_path, 'models'), num_workers=num_workers)
+
+
+def _get_project_manager(key: tuple[str, str, int]) -> ProjectManager:
+    if key not in _project_managers:
+        for cache in (_project_managers, _handlers, _prompters):
+            for stale in [other for other in cache if other[:2] == key[:2]]:
+                del cache[stale]
+        app_path, project, _ = key
+        _project_managers[key] = ProjectManager(app_path, project)
+        _handlers[key] = _project_managers[key].get_job_handlers()
+    return _project_managers[key]
+
+
+def run_job(app_path: str, project: str, generation: int, job: Job, cancel_event, progress_queue) -> tuple[object, list]:
+    """Runs a project job with the handlers of `ProjectManager.get_job_handlers`.
+
+    Returns:
+        tuple[object, list]: The job result and the (kind, payload, priority) of the follow-up jobs it asked for.
+    """
+
+    key = (app_path, project, generation)
+    _get_project_manager(key)
+    context = WorkerContext(job.job_id, cancel_event, progress_queue)
+    result = _handlers[key][job.kind](job, context)
+    return result, context.follow_ups
+
+
+def ask(app_path: str, project: str, generation: int, question: str, mode: str | None = None) -> dict:
+    """Answers a question about a project, with a `Prompter` kept between questions.
+
+    Returns:
+        dict: The text fields of the answer, like `query` and `result`.
+    """
+
+    key = (app_path, project, generation)
+    pm = _get_project_manager(key)
+    if key not in _prompters:
+        _prompters[key] = Prompter(pm.db_path, pm.project_name, answer_cache=get_default_answer_cache(pm.app_data.get('answer_cache')))
+    answer = _prompters[key].ask_question(question, mode)
+    # Retrieved documents don't need to cross the process boundary.
+    return {name: value for name, value in answer.items() if isinstance(value, str)}
+
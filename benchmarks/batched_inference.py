@@ -0,0 +1,98 @@
+"""Compares the per-file transcription loop with `BatchedTranscriber` on a set of short clips.
+
+Usage:
+    python -m benchmarks.batched_inference --model tiny --clips 32 --batch-size 8
+    python -m benchmarks.batched_inference --audio-dir path/to/voice_notes --output batched.json
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import tempfile
+import time
+import wave
+import numpy as np
+from DataManager.batched_transcriber import BatchedTranscriber
+from DataManager.calibration import synthetic_speech
+from DataManager.media import AUDIO_EXTENSIONS
+from DataManager.model_registry import model_registry
+from DataManager.transcription_pool import get_audio_duration
+
+SAMPLE_RATE = 16000
+
+
+def generate_clips(folder: str, count: int, seconds: float) -> list[str]:
+    """Writes `count` WAV clips of synthetic speech-like audio."""
+
+    paths = []
+    for i in range(count):
+        audio = synthetic_speech(seconds, seed=i)
+        path = os.path.join(folder, f"clip_{i:03d}.wav")
+        with wave.open(path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes((audio * 32767).astype(np.int16).tobytes())
+        paths.append(path)
+    return paths
+
+
+def run(paths: list[str], model, batch_size: int, language: str | None) -> dict:
+    audio_seconds = sum(get_audio_duration(path) for path in paths)
+
+    start = time.perf_counter()
+    for path in paths:
+        segments, _ = model.transcribe(path, language=language)
+        ''.join(segment.text for segment in segments)
+    per_file = time.perf_counter() - start
+
+    start = time.perf_counter()
+    BatchedTranscriber(model, batch_size, language=language).transcribe_files(paths)
+    batched = time.perf_counter() - start
+
+    return {
+        'clips': len(paths),
+        'audio_seconds': audio_seconds,
+        'batch_size': batch_size,
+        'per_file_seconds': per_file,
+        'batched_seconds': batched,
+        'per_file_clips_per_second': len(paths) / per_file,
+        'batched_clips_per_second': len(paths) / batched,
+        'speedup': per_file / batched,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='tiny')
+    parser.add_argument('--compute-type', default='int8')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--clips', type=int, default=32, help='Number of generated clips, when --audio-dir is not given.')
+    parser.add_argument('--seconds', type=float, default=8.0, help='Length of each generated clip.')
+    parser.add_argument('--audio-dir', help='Folder with real clips to use instead of generated ones.')
+    parser.add_argument('--language', default='en', help='Fixed language. Use "" to detect it per file.')
+    parser.add_argument('--models-path', default=os.path.join(os.path.expanduser('~'), '.HandySpeechBot', 'models'))
+    parser.add_argument('--output', help='Writes the results to this JSON file.')
+    args = parser.parse_args()
+
+    model = model_registry.get(args.model, args.compute_type, args.threads, args.models_path)
+    language = args.language or None
+
+    with tempfile.TemporaryDirectory() as folder:
+        if args.audio_dir:
+            paths = [os.path.join(args.audio_dir, f) for f in sorted(os.listdir(args.audio_dir)) if any(fnmatch.fnmatch(f, ext) for ext in AUDIO_EXTENSIONS)]
+        else:
+            paths = generate_clips(folder, args.clips, args.seconds)
+
+        results = {'model': args.model, 'compute_type': args.compute_type, 'threads': args.threads, **run(paths, model, args.batch_size, language)}
+
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Measures how long the app takes to import, each time in a fresh interpreter, and checks it against the startup budget.
+
+The main window only needs wx and the storage code. The transcription and question answering backend
+(langchain, faster_whisper, yt_dlp, ...) is imported in the background once the window is up, or when a project
+is opened, so none of it may be imported on the way to the window. Exits with status 1 if a budget is exceeded,
+a heavy package was imported, or a budgeted module can't be imported at all.
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 10 --output imports.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Milliseconds a module may take to import, on top of the interpreter startup, in a fresh process.
+# GUI.gui is what __main__.py imports before showing the main window; most of its budget is wx.
+IMPORT_BUDGETS_MS = {
+    'GUI.gui': 400,
+    'DataManager.backend': 50,
+}
+
+# Measured to show what the lazy imports save, without a budget.
+REPORTED_MODULES = ('DataManager.project_manager', 'Prompter.prompter')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int, int]]:
+    """Parses the output of `python -X importtime`.
+
+    Returns:
+        dict[str, tuple[int, int, int]]: (self microseconds, cumulative microseconds, nesting depth) by module.
+    """
+
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def measure(module: str) -> dict:
+    """Imports a module in a new interpreter and returns its import time, its slowest dependencies and the heavy
+    packages it brought in."""
+
+    code = f"import {module}; from DataManager.backend import loaded_heavy_packages; print(','.join(loaded_heavy_packages()))"
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True, text=True)
+    if process.returncode != 0:
+        return {'error': process.stderr.strip().splitlines()[-1]}
+
+    modules = parse_importtime(process.stderr)
+    # `import a.b` imports the package `a`, then `a.b`, each with its own dependencies. The interpreter startup
+    # imports, like `site`, are left out.
+    parts = module.split('.')
+    total_us = sum(modules[name][1] for name in ('.'.join(parts[:i]) for i in range(1, len(parts) + 1)) if name in modules)
+    slowest = sorted(((name, cumulative_us) for name, (_, cumulative_us, _) in modules.items()), key=lambda item: -item[1])[:10]
+    return {
+        'milliseconds': total_us / 1000,
+        'slowest': {name: cumulative_us / 1000 for name, cumulative_us in slowest},
+        'heavy_packages': [name for name in process.stdout.strip().split(',') if name],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per module. The first run is the coldest.')
+    parser.add_argument('--output', help='Writes the results to this JSON file.')
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+    for module in (*IMPORT_BUDGETS_MS, *REPORTED_MODULES):
+        runs = [measure(module) for _ in range(args.repeat)]
+        if 'error' in runs[0]:
+            results[module] = runs[0]
+            print(f"{module}: can't be imported here ({runs[0]['error']})")
+            # Only the reported modules may be missing their optional dependencies. A budgeted one must import.
+            failed = failed or module in IMPORT_BUDGETS_MS
+            continue
+
+        times = [run['milliseconds'] for run in runs]
+        budget = IMPORT_BUDGETS_MS.get(module)
+        results[module] = {
+            'cold_ms': times[0],
+            'median_ms': statistics.median(times),
+            'budget_ms': budget,
+            'slowest': runs[0]['slowest'],
+            'heavy_packages': runs[0]['heavy_packages'],
+        }
+        print(f"{module}: cold {times[0]:.0f} ms, median {statistics.median(times):.0f} ms" + (f", budget {budget} ms" if budget else ''))
+
+        if budget is None:
+            continue
+        if statistics.median(times) > budget:
+            print(f"  over budget. Slowest imports: {json.dumps(runs[0]['slowest'])}")
+            failed = True
+        if runs[0]['heavy_packages']:
+            print(f"  imports heavy packages at startup: {', '.join(runs[0]['heavy_packages'])}")
+            failed = True
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
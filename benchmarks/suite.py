@@ -0,0 +1,287 @@
+"""End-to-end benchmark of ingest, transcription, indexing and retrieval. Runs offline.
+
+Audio is generated, downloads come from a local HTTP server, and the embedding model and the LLM are stubs,
+so the numbers only depend on this code and this machine. Results are written as JSON, and a previous run
+can be given with --compare to flag regressions.
+
+Usage:
+    python -m benchmarks.suite --models tiny base --output bench.json
+    python -m benchmarks.suite --models tiny --compare bench.json
+"""
+
+import argparse
+import functools
+import http.server
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# Metrics where a higher value is better. For every other one, lower is better.
+HIGHER_IS_BETTER = ('chunks_per_second',)
+
+
+def percentiles(values: list[float]) -> dict:
+    values = np.array(values)
+    return {'p50': float(np.percentile(values, 50)), 'p95': float(np.percentile(values, 95)), 'p99': float(np.percentile(values, 99)), 'mean': float(values.mean())}
+
+
+def write_wav(path: str, audio: np.ndarray) -> None:
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((audio * 32767).astype(np.int16).tobytes())
+
+
+def serve_folder(folder: str) -> tuple[http.server.ThreadingHTTPServer, str]:
+    """Serves a folder over HTTP on a free local port."""
+
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=folder)
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def folder_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def bench_download(pm, base_url: str, filename: str) -> dict:
+    start = time.perf_counter()
+    downloaded = pm.get_audio_online(f"{base_url}/{filename}")
+    return {'seconds': time.perf_counter() - start, 'ok': bool(downloaded)}
+
+
+def bench_transcription(pm, models: list[str], compute_types: list[str], audio_seconds: float) -> list[dict]:
+    """Times `process_audios` for every model and compute type. The project must have clips for each of its paths
+    (batched short clips, the file pool and long files), and a vector index with stub embeddings, which
+    the transcripts are streamed to."""
+
+    results = []
+    # Indexing is measured on its own by `bench_indexing`.
+    pm.build_vector_store = lambda: False
+    for model in models:
+        for compute_type in compute_types:
+            pm.project_settings['transformer'] = model
+            pm.app_data['user_config']['compute_type'] = compute_type
+            # Forgets previous transcriptions, so every file is transcribed again.
+            pm.manifest.entries = {}
+
+            start = time.perf_counter()
+            try:
+                pm.process_audios()
+            except Exception as e:
+                results.append({'model': model, 'compute_type': compute_type, 'error': str(e)})
+                continue
+            elapsed = time.perf_counter() - start
+            results.append({'model': model, 'compute_type': compute_type, 'seconds': elapsed, 'rtf': elapsed / audio_seconds})
+            print(f"process_audios {model} {compute_type}: RTF {elapsed / audio_seconds:.3f}")
+    del pm.build_vector_store
+    return results
+
+
+def bench_indexing(pm, embeddings) -> dict:
+    from DataManager.vector_index import VectorIndex
+
+    shutil.rmtree(pm.db_path)
+    os.makedirs(pm.db_path)
+    pm.vector_index = VectorIndex(pm.db_path, pm.project_name, embeddings=embeddings)
+
+    start = time.perf_counter()
+    report = pm.get_vector_index().sync(pm.text_path)
+    elapsed = time.perf_counter() - start
+    return {
+        'seconds': elapsed,
+        'chunks': report['embedded'],
+        'chunks_per_second': report['embedded'] / elapsed if elapsed else 0.0,
+        'index_bytes': folder_size(pm.db_path),
+    }
+
+
+def bench_retrieval(pm, embeddings, questions: int) -> dict:
+    from langchain_community.llms.fake import FakeListLLM
+    from Prompter.prompter import Prompter
+    from Prompter.retriever_cache import RetrieverCache
+
+    llm = FakeListLLM(responses=['A stub answer.'])
+    start = time.perf_counter()
+    prompter = Prompter(pm.db_path, pm.project_name, embeddings=embeddings, llm=llm, cache=RetrieverCache())
+    init_time = time.perf_counter() - start
+
+    # The store is loaded on first use.
+    start = time.perf_counter()
+    prompter.vectordb
+    load_time = time.perf_counter() - start
+
+    latencies = []
+    for i in range(questions):
+        start = time.perf_counter()
+        prompter.ask_question(f"What was said about topic number {i}?")
+        latencies.append(time.perf_counter() - start)
+
+    lexical_latencies = []
+    for i in range(questions):
+        start = time.perf_counter()
+        prompter.search(f"What was said about topic number {i}?", mode='lexical')
+        lexical_latencies.append(time.perf_counter() - start)
+
+    # The same questions again, now answered from the answer cache.
+    cached_latencies = []
+    for i in range(questions):
+        start = time.perf_counter()
+        prompter.ask_question(f"What was said about topic number {i}?")
+        cached_latencies.append(time.perf_counter() - start)
+
+    return {
+        'prompter_init_seconds': init_time,
+        'store_load_seconds': load_time,
+        'ask_question': percentiles(latencies),
+        'ask_question_cached': percentiles(cached_latencies),
+        'lexical_search': percentiles(lexical_latencies),
+        'answer_cache': prompter.answer_cache.stats(),
+    }
+
+
+def flatten(results: dict, prefix: str = '') -> dict[str, float]:
+    """Flattens the numeric results to dotted keys, like `indexing.chunks_per_second`."""
+
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict) and 'model' in item:
+                    flat.update(flatten(item, f"{name}.{item['model']}.{item.get('compute_type', '')}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current: dict, previous: dict, tolerance: float) -> list[str]:
+    """Lists the timing metrics that got worse than `tolerance` (a fraction) since the previous run."""
+
+    regressions = []
+    old = flatten(previous['results'])
+    for name, value in flatten(current['results']).items():
+        if name not in old or not old[name] or name.startswith('metrics.counters') or name.endswith(('chunks', 'index_bytes', 'count')):
+            continue
+        change = (value - old[name]) / old[name]
+        if name.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > tolerance:
+            regressions.append(f"{name}: {old[name]:.4g} -> {value:.4g} ({change:+.0%})")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        return ''
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', nargs='+', default=['tiny'])
+    parser.add_argument('--compute-types', nargs='+', default=['int8'])
+    parser.add_argument('--files', type=int, default=4, help='Number of generated audio files, transcribed by the file pool.')
+    parser.add_argument('--seconds', type=float, default=30.0, help='Length of each generated file.')
+    parser.add_argument('--short-files', type=int, default=4, help='Number of generated short clips, transcribed in batches.')
+    parser.add_argument('--short-seconds', type=float, default=5.0, help='Length of each short clip.')
+    parser.add_argument('--long-seconds', type=float, default=120.0, help='Length of the generated long file, split into windows.')
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--models-path', default=os.path.join(os.path.expanduser('~'), '.HandySpeechBot', 'models'),
+                        help='Where whisper models are cached, so they are not downloaded on every run.')
+    parser.add_argument('--output', help='Writes the results to this JSON file.')
+    parser.add_argument('--compare', help='A previous results file to check for regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Slowdown, as a fraction, reported as a regression.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        # Everything the app writes under ~/.HandySpeechBot goes to the temporary folder instead.
+        os.environ['HOME'] = home
+        os.environ['USERPROFILE'] = home
+
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+        from DataManager.calibration import synthetic_speech
+        from DataManager.instrumentation import metrics
+        from DataManager.project_manager import ProjectManager
+        from DataManager.storage_manager import StorageManager
+        from DataManager.vector_index import VectorIndex
+
+        sm = StorageManager()
+        if os.path.isdir(args.models_path):
+            os.rmdir(sm.models_path)
+            os.symlink(os.path.abspath(args.models_path), sm.models_path, target_is_directory=True)
+        sm.create_project_files('benchmark', 'Benchmark project', args.models[0])
+        pm = ProjectManager(sm.app_path, 'benchmark')
+
+        media_folder = os.path.join(home, 'media')
+        os.makedirs(media_folder)
+        write_wav(os.path.join(media_folder, 'download.wav'), synthetic_speech(10.0, seed=99))
+        server, base_url = serve_folder(media_folder)
+
+        results = {}
+        results['download'] = bench_download(pm, base_url, 'download.wav')
+        server.shutdown()
+
+        # The thresholds are lowered so short clips are batched and the long file is split, without hours of audio.
+        short_seconds = max(args.short_seconds, 10.0)
+        pool_seconds = max(args.seconds, short_seconds + 1.0)
+        long_seconds = max(args.long_seconds, pool_seconds + 1.0)
+        pm.app_data['user_config']['batch_max_seconds'] = short_seconds
+        pm.app_data['user_config']['long_file_seconds'] = pool_seconds
+        for i in range(args.files):
+            write_wav(os.path.join(pm.audio_path, f"generated_{i:02d}.wav"), synthetic_speech(pool_seconds, seed=i))
+        for i in range(args.short_files):
+            write_wav(os.path.join(pm.audio_path, f"short_{i:02d}.wav"), synthetic_speech(args.short_seconds, seed=100 + i))
+        write_wav(os.path.join(pm.audio_path, 'long.wav'), synthetic_speech(long_seconds, seed=200))
+        # The downloaded clip is 10 seconds long, and transcribed with the short ones.
+        audio_seconds = args.files * pool_seconds + args.short_files * args.short_seconds + long_seconds + 10.0
+
+        # Transcripts are streamed to the index, which must not call a real embedding API.
+        embeddings = DeterministicFakeEmbedding(size=384)
+        pm.vector_index = VectorIndex(pm.db_path, pm.project_name, embeddings=embeddings)
+        results['transcription'] = bench_transcription(pm, args.models, args.compute_types, audio_seconds)
+
+        results['indexing'] = bench_indexing(pm, embeddings)
+        results['retrieval'] = bench_retrieval(pm, embeddings, args.questions)
+        results['metrics'] = metrics.snapshot()
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpu_count': os.cpu_count()},
+        'parameters': vars(args),
+        'results': results,
+    }
+    print(json.dumps(report['results'], indent=4))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print('Regressions:')
+            print('\n'.join(f"  {line}" for line in regressions))
+            raise SystemExit(1)
+        print('No regressions.')
+
+
+if __name__ == '__main__':
+    main()
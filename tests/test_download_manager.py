@@ -0,0 +1,89 @@
+import functools
+import http.server
+import os
+import threading
+import wave
+import pytest
+
+yt = pytest.importorskip('yt_dlp')
+
+from DataManager.download_manager import DownloadManager, remove_from_archive
+
+
+@pytest.fixture
+def media_server(tmp_path):
+    """Serves a folder with a short WAV file over HTTP on a free local port."""
+
+    folder = tmp_path / 'media'
+    folder.mkdir()
+    with wave.open(str(folder / 'clip.wav'), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(b'\x00\x00' * 16000)
+
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(folder))
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def make_manager(tmp_path, **ydl_opts) -> tuple[DownloadManager, list]:
+    events = []
+    audios = tmp_path / 'audios'
+    audios.mkdir(exist_ok=True)
+    manager = DownloadManager({'outtmpl': f"{audios}/%(title)s.%(ext)s", **ydl_opts}, str(tmp_path / 'downloads.txt'),
+                              on_progress=lambda progress: events.append(progress.status))
+    return manager, events
+
+
+def test_downloads_and_skips_archived(tmp_path, media_server):
+    manager, events = make_manager(tmp_path)
+
+    [job] = manager.download(f"{media_server}/clip.wav")
+    assert job.status == 'finished', job.error
+    assert os.path.isfile(job.filename)
+    assert 'downloading' in events and events[-1] == 'finished'
+    assert job.job_id in (tmp_path / 'downloads.txt').read_text()
+
+    [again] = manager.download(f"{media_server}/clip.wav")
+    assert again.status == 'skipped'
+
+
+def test_removed_from_archive_downloads_again(tmp_path, media_server):
+    manager, _ = make_manager(tmp_path)
+    [job] = manager.download(f"{media_server}/clip.wav")
+    os.remove(job.filename)
+
+    assert remove_from_archive(str(tmp_path / 'downloads.txt'), [job.job_id]) == 1
+    [again] = manager.download(f"{media_server}/clip.wav")
+    assert again.status == 'finished', again.error
+    assert os.path.isfile(again.filename)
+
+
+def test_errors_are_reported_per_job(tmp_path, media_server):
+    manager, events = make_manager(tmp_path)
+
+    jobs = manager.download(f"{media_server}/missing.wav")
+    assert [job.status for job in jobs] == ['error']
+    assert events[-1] == 'error'
+
+
+def test_postprocessor_errors_are_reported_per_job(tmp_path, media_server):
+    manager, _ = make_manager(tmp_path, postprocessors=[{'key': 'Exec', 'exec_cmd': 'exit 1', 'when': 'after_move'}])
+
+    [job] = manager.download(f"{media_server}/clip.wav")
+    assert job.status == 'error'
+    assert job.error
+
+
+def test_os_errors_are_reported_per_job(tmp_path, media_server):
+    manager, _ = make_manager(tmp_path)
+    # The archive can't be written, which yt_dlp raises as a plain OSError once the file is downloaded.
+    manager.ydl_opts['download_archive'] = str(tmp_path / 'missing' / 'downloads.txt')
+
+    [job] = manager.download(f"{media_server}/clip.wav")
+    assert job.status == 'error'
+    assert 'downloads.txt' in job.error
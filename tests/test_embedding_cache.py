@@ -0,0 +1,48 @@
+import sqlite3
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from DataManager.embedding_cache import EmbeddingCache
+
+
+def stored_bytes(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute('SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings').fetchone()[0]
+
+
+def test_size_follows_inserts_replacements_and_evictions(tmp_path):
+    path = str(tmp_path / 'embeddings.sqlite')
+    # Each vector of 4 floats takes 16 bytes.
+    cache = EmbeddingCache(path, max_bytes=100)
+
+    cache.put_many('model', ['a', 'b'], [[1.0] * 4, [2.0] * 4])
+    assert cache.size() == stored_bytes(path) == 32
+
+    # The same chunk stored again, with a longer vector, replaces the old one.
+    cache.put_many('model', ['a'], [[3.0] * 8])
+    assert cache.size() == stored_bytes(path) == 48
+    assert cache.get_many('model', ['a']) == [[3.0] * 8]
+
+    # Over the limit: the least recently used vectors go, until the cache is back to 90% of it.
+    cache.put_many('model', ['c', 'd', 'e', 'f'], [[4.0] * 4] * 4)
+    assert cache.size() == stored_bytes(path) <= 90
+    assert cache.get_many('model', ['b', 'f']) == [None, [4.0] * 4]
+
+    cache.clear()
+    assert cache.size() == 0
+
+
+def test_size_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / 'embeddings.sqlite')
+    with sqlite3.connect(path) as conn:
+        # A cache written before its size was tracked.
+        conn.execute('CREATE TABLE embeddings (model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (model, hash))')
+        conn.execute("INSERT INTO embeddings VALUES ('model', 'old', ?, 0)", (b'\0' * 16,))
+
+    first = EmbeddingCache(path)
+    second = EmbeddingCache(path)
+    assert first.size() == 16
+
+    second.put_many('model', ['new'], [[1.0] * 4])
+    assert first.size() == stored_bytes(path) == 32
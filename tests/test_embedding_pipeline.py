@@ -0,0 +1,109 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from DataManager import embedding_pipeline
+from DataManager.embedding_pipeline import EmbeddingPipeline, RateLimiter
+
+
+class StubEmbeddings():
+    """Embeds each text as [length, position in its batch], failing the first `failures` requests."""
+
+    def __init__(self, failures: int = 0):
+        self.model = 'stub'
+        self.failures = failures
+        self.batches = []
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.batches.append(list(texts))
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('rate limited')
+        return [[float(len(text)), float(i)] for i, text in enumerate(texts)]
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """Replaces the limiter clock and `asyncio.sleep`, so waits take no real time and can be added up."""
+
+    clock = {'now': 0.0, 'slept': 0.0}
+
+    async def sleep(seconds: float) -> None:
+        clock['now'] += seconds
+        clock['slept'] += seconds
+
+    monkeypatch.setattr(embedding_pipeline, 'time', SimpleNamespace(monotonic=lambda: clock['now'], perf_counter=time.perf_counter))
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    monkeypatch.setattr(embedding_pipeline, '_rate_limiters', {})
+    return clock
+
+
+def test_batches_by_token_budget(fake_clock):
+    stub = StubEmbeddings()
+    pipeline = EmbeddingPipeline(stub, batch_tokens=10, concurrency=2)
+    texts = ['a' * 20, 'b' * 20, 'c' * 20, 'd' * 4]  # 5, 5, 5 and 1 estimated tokens
+
+    batches = []
+    vectors = pipeline.embed(texts, lambda indices, batch_vectors: batches.append(indices))
+
+    assert sorted(sorted(batch) for batch in stub.batches) == [['a' * 20, 'b' * 20], ['c' * 20, 'd' * 4]]
+    assert sorted(batches) == [[0, 1], [2, 3]]
+    assert [vector[0] for vector in vectors] == [20.0, 20.0, 20.0, 4.0]
+    assert pipeline.last_stats['batches'] == 2
+    assert pipeline.last_stats['retries'] == 0
+
+
+def test_retries_failed_batches(fake_clock):
+    stub = StubEmbeddings(failures=2)
+    pipeline = EmbeddingPipeline(stub, batch_tokens=100, max_retries=3, backoff=1.0)
+
+    vectors = pipeline.embed(['hello', 'world'])
+
+    assert len(stub.batches) == 3
+    assert vectors == [[5.0, 0.0], [5.0, 1.0]]
+    assert pipeline.last_stats['retries'] == 2
+    # Backed off about 1 then 2 seconds.
+    assert 2.4 <= fake_clock['slept'] <= 3.6
+
+
+def test_gives_up_after_max_retries(fake_clock):
+    pipeline = EmbeddingPipeline(StubEmbeddings(failures=5), max_retries=1)
+
+    with pytest.raises(RuntimeError):
+        pipeline.embed(['hello'])
+
+
+def test_rate_limit_is_shared_between_calls_and_pipelines(fake_clock):
+    first = EmbeddingPipeline(StubEmbeddings(), batch_tokens=1, requests_per_minute=60, tokens_per_minute=1000000)
+    second = EmbeddingPipeline(StubEmbeddings(), batch_tokens=1, requests_per_minute=60, tokens_per_minute=1000000)
+    assert first.limiter is second.limiter
+
+    # The bucket starts full with 60 requests, and refills one a second.
+    first.embed([f"text {i}" for i in range(40)])
+    assert fake_clock['slept'] == 0
+    second.embed([f"text {i}" for i in range(30)])
+    assert 9.5 <= fake_clock['slept'] <= 11
+
+
+def test_rate_limiter_tokens(fake_clock):
+    limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=600)
+
+    async def acquire_all() -> None:
+        for _ in range(3):
+            await limiter.acquire(300)
+
+    asyncio.run(acquire_all())
+    # 600 tokens right away, then 300 more at 10 tokens a second.
+    assert 29 <= fake_clock['slept'] <= 31
+
+
+def test_embed_inside_running_loop(fake_clock):
+    pipeline = EmbeddingPipeline(StubEmbeddings())
+
+    async def main() -> list[list[float]]:
+        return pipeline.embed(['inside a loop'])
+
+    assert asyncio.run(main()) == [[13.0, 0.0]]
@@ -0,0 +1,89 @@
+import time
+import wave
+from types import SimpleNamespace
+import numpy as np
+from DataManager.live_transcriber import SAMPLE_RATE, LiveTranscriber, WavFileSource
+
+
+class StubModel():
+    """Stands in for a `WhisperModel`: the text tells the beam size and the length of the audio, in seconds."""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, language=None, beam_size=5, **kwargs):
+        self.calls.append((len(audio), beam_size))
+        kind = 'final' if beam_size > 1 else 'partial'
+        return iter([SimpleNamespace(text=f"{kind} {len(audio) / SAMPLE_RATE:.1f}")]), SimpleNamespace(language='en')
+
+
+def write_utterances(path: str, layout: list[tuple[str, float]]) -> None:
+    """Writes a WAV of tone bursts ('speech') and digital silence ('silence'), in the given order and seconds."""
+
+    pieces = []
+    for kind, seconds in layout:
+        samples = int(seconds * SAMPLE_RATE)
+        if kind == 'speech':
+            pieces.append(0.3 * np.sin(2 * np.pi * 220 * np.arange(samples) / SAMPLE_RATE))
+        else:
+            pieces.append(np.zeros(samples))
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((np.concatenate(pieces) * 32767).astype(np.int16).tobytes())
+
+
+LAYOUT = [('silence', 0.3), ('speech', 0.6), ('silence', 0.8), ('speech', 0.6), ('silence', 0.8)]
+
+
+def test_partials_and_finals(tmp_path):
+    path = str(tmp_path / 'speech.wav')
+    write_utterances(path, LAYOUT)
+    partials = []
+    finals = []
+    model = StubModel()
+    transcriber = LiveTranscriber(model, on_partial=partials.append, on_final=lambda text, start, end: finals.append((text, start, end)),
+                                  language='en', partial_interval=0.0)
+
+    transcriber.run(WavFileSource(path, realtime=False))
+
+    assert len(finals) == 2
+    assert all(text.startswith('final') for text, _, _ in finals)
+    # Each utterance starts a little before its speech, and ends after the silence that ended it.
+    (_, first_start, first_end), (_, second_start, second_end) = finals
+    assert 0.0 <= first_start <= 0.3 <= first_end
+    assert 0.9 <= first_end <= second_start <= 1.7 <= second_end
+    assert partials and all(text.startswith('partial') for text in partials)
+    assert {beam_size for _, beam_size in model.calls} == {1, 5}
+
+    report = transcriber.latency_report()
+    assert report['utterances'] == 2
+    assert report['p50'] <= report['p95'] <= report['max']
+    assert 0.0 <= report['within_target'] <= 1.0
+
+
+def test_latency_counts_from_the_end_of_speech(tmp_path):
+    path = str(tmp_path / 'speech.wav')
+    write_utterances(path, LAYOUT)
+    transcriber = LiveTranscriber(StubModel(), language='en', partial_interval=10.0)
+
+    start = time.monotonic()
+    transcriber.run(WavFileSource(path, realtime=True))
+    assert time.monotonic() - start >= 3.0
+
+    # The VAD waits 500 ms of silence before ending an utterance, and that wait counts.
+    report = transcriber.latency_report()
+    assert report['utterances'] == 2
+    assert 0.45 <= report['p50'] <= 1.0
+
+
+def test_stop_before_run(tmp_path):
+    path = str(tmp_path / 'speech.wav')
+    write_utterances(path, LAYOUT)
+    transcriber = LiveTranscriber(StubModel(), language='en')
+
+    transcriber.stop()
+    transcriber.run(WavFileSource(path, realtime=True))
+
+    assert transcriber.latency_report() == {'utterances': 0}